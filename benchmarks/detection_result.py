@@ -0,0 +1,106 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+# Measures the construction time and memory of DetectionResult against the same
+# dataclass with a per-instance __dict__, which it was before its fields moved to __slots__.
+#
+# Usage:
+#   python benchmarks/detection_result.py
+#   python benchmarks/detection_result.py --count 1000000
+
+import argparse
+import dataclasses
+import os
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from panther_core.detection import DetectionResult
+
+DEFAULT_COUNT = 100000
+DEFAULT_REPEAT = 5
+
+
+def dict_based_result_type() -> Any:
+    return dataclasses.make_dataclass(
+        "DictDetectionResult",
+        [
+            (each_field.name, each_field.type, each_field)
+            for each_field in dataclasses.fields(DetectionResult)
+        ],
+    )
+
+
+def new_results(result_type: Any, count: int) -> List[Any]:
+    # Mostly non alerting results, as in log analysis
+    return [
+        result_type(
+            detection_id="AWS.S3.GetObject",
+            detection_severity="LOW",
+            detection_type="RULE",
+            trigger_alert=index % 100 == 0,
+            detection_output=index % 100 == 0,
+        )
+        for index in range(count)
+    ]
+
+
+def allocated_bytes(function: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        kept = function()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    result_types = (("__dict__", dict_based_result_type()), ("__slots__", DetectionResult))
+    for name, result_type in result_types:
+        seconds = min(
+            timeit.repeat(
+                lambda result_type=result_type: new_results(result_type, args.count),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        memory = allocated_bytes(
+            lambda result_type=result_type: new_results(result_type, args.count)
+        )
+        print(
+            f"{name:>9}: {seconds / args.count * 1e9:7.0f}ns per result, "
+            f"{memory / args.count:6.0f} bytes per result"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Measures the import time of the panther_core entry points with `python -X importtime`
+# and compares it against the stored baseline.
+#
+# The baseline doesn't store absolute times, which depend on the machine, but the time of each
+# entry point relative to the import of REFERENCE_MODULE in the same interpreter. It also stores
+# the modules each entry point imports, so that a new eager import is reported even if it's fast.
+# Standard library modules are only compared with a baseline recorded by the same Python version.
+#
+# Usage:
+#   python benchmarks/import_time.py            # fails on a regression
+#   python benchmarks/import_time.py --update   # stores a new baseline
+
+import argparse
+import json
+import os
+import statistics
+import subprocess  # nosec
+import sys
+from typing import Dict, List, Set, Tuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_time_baseline.json")
+
+ENTRY_POINTS = [
+    "panther_core.enriched_event",
+    "panther_core.rule",
+    "panther_core.policy",
+    "panther_core.exec.task",
+    "panther_core.data_model",
+]
+
+# Standard library package the import times are relative to
+REFERENCE_MODULE = "logging"
+
+# Import time is noisy, the median ratio of the runs is kept
+DEFAULT_RUNS = 5
+
+# Relative slowdown tolerated before reporting a regression
+DEFAULT_TOLERANCE = 1.5
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PYTHON_VERSION = "{}.{}".format(*sys.version_info[:2])
+
+
+def _is_stdlib(module: str) -> bool:
+    stdlib = getattr(sys, "stdlib_module_names", ())
+    return module.split(".")[0] in stdlib
+
+
+def measure(module: str) -> Tuple[int, Set[str]]:
+    """Returns the cumulative import time of the module in microseconds
+    and the modules its import loaded"""
+    # Print the loaded modules, -X importtime also reports the failed imports,
+    # e.g. the optional dependencies probed by the standard library
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    process = subprocess.run(  # nosec
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(process.stdout.split())
+    total = 0
+    # Modules are reported after the ones they import, the modules imported
+    # by the interpreter startup come before the block of the module
+    block: Set[str] = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        block.add(name.strip())
+        if not name.startswith("  "):
+            if name.strip() == module:
+                total = int(cumulative)
+                break
+            block = set()
+    return total, block & loaded
+
+
+def run(runs: int) -> Dict:
+    ratios: Dict[str, List[float]] = {entry_point: [] for entry_point in ENTRY_POINTS}
+    modules: Dict[str, Set[str]] = {}
+    for _ in range(runs):
+        # The reference is measured in each run, so that the ratios aren't skewed
+        # by the load of the machine changing between runs
+        reference = measure(REFERENCE_MODULE)[0]
+        for entry_point in ENTRY_POINTS:
+            total, modules[entry_point] = measure(entry_point)
+            ratios[entry_point].append(total / reference)
+    entry_points = {
+        entry_point: {
+            "relative_time": round(statistics.median(ratios[entry_point]), 2),
+            "modules": sorted(modules[entry_point]),
+        }
+        for entry_point in ENTRY_POINTS
+    }
+    return {"python": PYTHON_VERSION, "reference": REFERENCE_MODULE, "entry_points": entry_points}
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    same_python = baseline.get("python") == results["python"]
+    for entry_point, result in results["entry_points"].items():
+        expected = baseline["entry_points"].get(entry_point)
+        if expected is None:
+            continue
+        new_modules = sorted(
+            module
+            for module in set(result["modules"]) - set(expected["modules"])
+            if same_python or not _is_stdlib(module)
+        )
+        if new_modules:
+            regressions.append(f"{entry_point} now imports {', '.join(new_modules)}")
+        if result["relative_time"] > expected["relative_time"] * tolerance:
+            regressions.append(
+                f"{entry_point} took {result['relative_time']}x the import of {REFERENCE_MODULE}, "
+                f"baseline is {expected['relative_time']}x"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--update", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    for entry_point, result in results["entry_points"].items():
+        print(f"{entry_point}: {result['relative_time']}x {REFERENCE_MODULE}")
+
+    if args.update:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        return 0
+
+    with open(BASELINE_PATH, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION: " + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
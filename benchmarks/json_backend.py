@@ -0,0 +1,170 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+# Compares the installed JSON backends on realistic ExecutionResult payloads.
+# Alert contexts are shown to users, so they are always serialized with json.dumps.
+#
+# Usage:
+#   python benchmarks/json_backend.py
+#   python benchmarks/json_backend.py --events 500 --repeat 20
+
+import argparse
+import os
+import sys
+import timeit
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from panther_core.exec.common import ExecutionMatch, ExecutionMode
+from panther_core.exec.results import (
+    ExecutionAuxFunctionDetails,
+    ExecutionDetails,
+    ExecutionDetailsAuxFunctions,
+    ExecutionDetailsPrimaryFunctions,
+    ExecutionOutput,
+    ExecutionPrimaryFunctionDetails,
+    ExecutionResult,
+)
+from panther_core.json_backend import (
+    BACKEND_ORJSON,
+    BACKEND_STDLIB,
+    BACKEND_UJSON,
+    JSONBackend,
+    load_backend,
+)
+
+DEFAULT_EVENTS = 200
+DEFAULT_REPEAT = 10
+
+
+def cloudtrail_event(index: int) -> Dict[str, Any]:
+    return {
+        "eventVersion": "1.08",
+        "eventTime": "2022-01-01T00:00:%02dZ" % (index % 60),
+        "eventSource": "s3.amazonaws.com",
+        "eventName": "GetObject",
+        "awsRegion": "us-east-1",
+        "sourceIPAddress": "10.0.%d.%d" % (index // 256 % 256, index % 256),
+        "userAgent": "aws-cli/2.4.6 Python/3.8.8 Linux/5.10.0 exe/x86_64.amzn.2 prompt/off",
+        "userIdentity": {
+            "type": "AssumedRole",
+            "principalId": "AROAEXAMPLE:session-%d" % index,
+            "arn": "arn:aws:sts::123456789012:assumed-role/Admin/session-%d" % index,
+            "accountId": "123456789012",
+            "sessionContext": {
+                "attributes": {"creationDate": "2022-01-01T00:00:00Z", "mfaAuthenticated": "false"},
+                "sessionIssuer": {"type": "Role", "userName": "Admin"},
+            },
+        },
+        "requestParameters": {"bucketName": "bucket-%d" % (index % 10), "key": "é/%d.json" % index},
+        "resources": [
+            {"type": "AWS::S3::Object", "ARN": "arn:aws:s3:::bucket/%d.json" % index},
+            {"type": "AWS::S3::Bucket", "ARN": "arn:aws:s3:::bucket"},
+        ],
+        "readOnly": True,
+        "p_log_type": "AWS.CloudTrail",
+        "p_any_ip_addresses": ["10.0.0.%d" % (index % 256)],
+    }
+
+
+def execution_result(count: int) -> Dict[str, Any]:
+    """An ExecutionResult payload with a match and its details for every event"""
+    aux = ExecutionAuxFunctionDetails(defined=True, output="output")
+    outputs = []
+    for index in range(count):
+        event = cloudtrail_event(index)
+        outputs.append(
+            ExecutionOutput(
+                input_id=str(index),
+                match=ExecutionMatch(
+                    alert_type="RULE",
+                    detection_type="RULE",
+                    detection_id="AWS.S3.GetObject",
+                    detection_version="v1",
+                    detection_tags=["S3"],
+                    detection_reports={"MITRE ATT&CK": ["TA0010:T1567"]},
+                    detection_severity="LOW",
+                    dedup_string="session-%d" % index,
+                    dedup_period_mins=60,
+                    event=event,
+                    event_id=str(index),
+                    title="GetObject by session-%d" % index,
+                ),
+                details=ExecutionDetails(
+                    aux_functions=ExecutionDetailsAuxFunctions(
+                        dedup=aux,
+                        title=aux,
+                        runbook=aux,
+                        severity=aux,
+                        reference=aux,
+                        description=aux,
+                        destinations=aux,
+                        alert_context=aux,
+                    ),
+                    primary_functions=ExecutionDetailsPrimaryFunctions(
+                        detection=ExecutionPrimaryFunctionDetails(output=True),
+                    ),
+                ),
+            )
+        )
+    return asdict(ExecutionResult(output_mode=ExecutionMode.INLINE, data=outputs))
+
+
+def installed_backends() -> List[JSONBackend]:
+    backends = []
+    for name in (BACKEND_STDLIB, BACKEND_ORJSON, BACKEND_UJSON):
+        try:
+            backends.append(load_backend(name))
+        except ImportError:
+            print(f"{name}: not installed")
+    return backends
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=DEFAULT_EVENTS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    payload = execution_result(args.events)
+    baseline: Dict[str, float] = {}
+    for backend in installed_backends():
+        encoded_payload = backend.dumps(payload)
+        cases = {
+            "ExecutionResult dumps": lambda backend=backend: backend.dumps_bytes(payload),
+            "ExecutionResult loads": lambda backend=backend, data=encoded_payload: backend.loads(
+                data
+            ),
+        }
+        for case, function in cases.items():
+            seconds = best_time(function, args.repeat)
+            speedup = baseline.setdefault(case, seconds) / seconds
+            print(f"{backend.name:>6} {case:<24} {seconds * 1000:8.2f}ms  x{speedup:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
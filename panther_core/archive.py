@@ -0,0 +1,157 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import marshal
+import os
+import sys
+import zipfile
+import zipimport
+from collections.abc import Mapping
+from importlib.util import MAGIC_NUMBER, source_hash
+from typing import Any, Dict, List, Sequence
+
+from .loader import detection_from_config
+from .rule import _DETECTION_FOLDER, Detection
+from .util import id_to_path
+
+ARCHIVE_FORMAT_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+# Config keys holding the detection source, which is stored as a separate archive entry
+_SOURCE_KEYS = ("body", "path")
+
+# Manifest entry keys which are not part of the detection config
+_ENTRY_KEYS = ("module", "compiled", "functions")
+
+# Flags of an unchecked hash-based pyc (PEP 552), which is never validated against its source
+_UNCHECKED_HASH_PYC_FLAGS = 0b01
+
+
+def _module_name(index: int) -> str:
+    # Detection ids aren't valid module names, e.g. they contain dots
+    return f"detection_{index}"
+
+
+def _pyc(source: bytes, code: Any) -> bytes:
+    data = bytearray(MAGIC_NUMBER)
+    data.extend(_UNCHECKED_HASH_PYC_FLAGS.to_bytes(4, "little"))
+    data.extend(source_hash(source))
+    data.extend(marshal.dumps(code))
+    return bytes(data)
+
+
+def _read_source(config: Mapping) -> str:
+    if config.get("body"):
+        return config["body"]
+    with open(config["path"], "r", encoding="utf-8") as source_file:
+        return source_file.read()
+
+
+def build_archive(configs: Sequence[Mapping], path: str) -> Dict[str, Any]:
+    """Build a detection pack archive from detection configs.
+
+    For each detection, the archive holds its source code, the code compiled
+    with the running interpreter and a manifest entry with its metadata
+    and the auxiliary functions it defines. Detections are loaded and validated
+    while building, but invalid ones are still included, so that loading
+    the archive reports their errors through `setup_exception`.
+
+    Returns:
+        The manifest stored in the archive
+    """
+    manifest: Dict[str, Any] = {
+        "formatVersion": ARCHIVE_FORMAT_VERSION,
+        "magicNumber": MAGIC_NUMBER.hex(),
+        # Code compiled with -O or -OO has no asserts or docstrings
+        "optimize": sys.flags.optimize,
+        "detections": [],
+    }
+    tmp_path = path + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, config in enumerate(configs):
+            source = _read_source(config)
+            detection_config = {key: val for key, val in config.items() if key not in _SOURCE_KEYS}
+            detection_config["body"] = source
+            detection = detection_from_config(detection_config)
+
+            module_name = _module_name(index)
+            archive.writestr(module_name + ".py", source)
+            module_path = id_to_path(_DETECTION_FOLDER, detection.detection_id)
+            try:
+                code = compile(source, module_path, "exec")
+            except SyntaxError:
+                code = None
+            if code is not None:
+                archive.writestr(module_name + ".pyc", _pyc(source.encode("utf-8"), code))
+
+            entry = {key: val for key, val in detection_config.items() if key != "body"}
+            entry.update(
+                module=module_name,
+                dedupPeriodMinutes=detection.detection_dedup_period_mins,
+                tags=detection.detection_tags,
+                reports=detection.detection_reports,
+                compiled=code is not None,
+                functions=None if detection.setup_exception else detection.defined_functions,
+            )
+            manifest["detections"].append(entry)
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest))
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Read the manifest of a detection pack archive"""
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+    if manifest.get("formatVersion") != ARCHIVE_FORMAT_VERSION:
+        raise ValueError(
+            f"unsupported detection archive format version [{manifest.get('formatVersion')}]"
+        )
+    return manifest
+
+
+def load_archive(path: str, lazy: bool = False) -> List[Detection]:
+    """Create detections from a detection pack archive, in the order they were added.
+
+    Code is read through zipimport, without extracting any file. If the archive was built
+    with a different interpreter version or optimization level, the source code
+    is compiled instead. Lazy detections report the auxiliary functions they define
+    from the manifest, without loading their module.
+    """
+    manifest = read_manifest(path)
+    importer = zipimport.zipimporter(path)
+    use_compiled = (
+        manifest.get("magicNumber") == MAGIC_NUMBER.hex()
+        and manifest.get("optimize") == sys.flags.optimize
+    )
+
+    detections = []
+    for entry in manifest["detections"]:
+        module_name = entry["module"]
+        config = {key: val for key, val in entry.items() if key not in _ENTRY_KEYS}
+        config["body"] = importer.get_source(module_name)
+        code = None
+        if use_compiled and entry["compiled"]:
+            code = importer.get_code(module_name)
+        detection = detection_from_config(config, code, lazy=lazy)
+        if entry.get("functions") is not None:
+            detection.defined_functions = entry["functions"]
+        detections.append(detection)
+    return detections
@@ -0,0 +1,214 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import marshal
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from types import CodeType
+from typing import Optional
+
+# Default limit for the total size of the cached entries
+DEFAULT_MAX_CACHE_SIZE = 256 * 1024 * 1024  # 256MB
+
+_ENTRY_SUFFIX = ".bin"
+
+# Temporary alias for compatibility
+get_logger = logging.getLogger
+
+
+class BytecodeCache:
+    """Persistent, content-addressed cache of compiled Python code objects.
+
+    Entries are keyed by a hash of the interpreter bytecode version and optimization level,
+    the module path and the source code, so that a changed body never hits a stale entry.
+    Once the total size of the entries exceeds the configured limit,
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_CACHE_SIZE):
+        self.logger = get_logger()
+        self.directory = directory
+        self.max_size = max_size
+        # Entry sizes in least-recently-used order, built lazily from the directory contents
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(body: str, path: str) -> str:
+        """Returns the cache key for the given source code"""
+        import hashlib  # pylint: disable=import-outside-toplevel
+
+        digest = hashlib.sha256(MAGIC_NUMBER)
+        # Code compiled with -O or -OO has no asserts or docstrings
+        digest.update(str(sys.flags.optimize).encode("ascii"))
+        # The module path is embedded in the code object and shows up in tracebacks
+        digest.update(path.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(body.encode("utf-8"))
+        return digest.hexdigest()
+
+    @property
+    def total_size(self) -> int:
+        """Returns the total size in bytes of the cached entries"""
+        with self._lock:
+            self._ensure_entries()
+            return self._total_size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ensure_entries())
+
+    def compile(self, body: str, path: str) -> CodeType:
+        """Returns the code object for the given source code,
+        compiling and caching it only if no entry exists"""
+        key = self.key(body, path)
+        code = self.get(key)
+        if code is None:
+            code = compile(body, path, "exec")
+            self.put(key, code)
+        return code
+
+    def get(self, key: str) -> Optional[CodeType]:
+        """Returns the cached code object or None, if no valid entry exists"""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                data = entry_file.read()
+        except OSError:
+            return None
+
+        try:
+            code = marshal.loads(data)  # nosec
+        except (EOFError, TypeError, ValueError):
+            code = None
+        if not isinstance(code, CodeType):
+            self.logger.debug("removing invalid bytecode cache entry %s", entry_path)
+            self._remove(key)
+            return None
+
+        with self._lock:
+            entries = self._ensure_entries()
+            if key in entries:
+                entries.move_to_end(key)
+        try:
+            # The modification time tracks recency across processes
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return code
+
+    def put(self, key: str, code: CodeType) -> None:
+        """Stores the code object, evicting the least recently used entries if necessary"""
+        data = marshal.dumps(code)
+        try:
+            Path(self.directory).mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first, so that concurrent readers
+            # never observe a partially written entry
+            file_descriptor, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(file_descriptor, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError as err:
+            # The cache is an optimization, failing to write to it is not an error
+            self.logger.debug("failed to store bytecode cache entry %s: %s", key, err)
+            return
+
+        with self._lock:
+            entries = self._ensure_entries()
+            self._total_size += len(data) - entries.pop(key, 0)
+            entries[key] = len(data)
+            self._evict()
+
+    def clear(self) -> None:
+        """Removes all entries from the cache"""
+        with self._lock:
+            for key in list(self._ensure_entries()):
+                self._remove_entry(key)
+
+    def _evict(self) -> None:
+        entries = self._ensure_entries()
+        while self._total_size > self.max_size and entries:
+            key = next(iter(entries))
+            self._remove_entry(key)
+
+    def _remove(self, key: str) -> None:
+        with self._lock:
+            self._remove_entry(key)
+
+    def _remove_entry(self, key: str) -> None:
+        entries = self._ensure_entries()
+        self._total_size -= entries.pop(key, 0)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _ensure_entries(self) -> "OrderedDict[str, int]":
+        if self._entries is not None:
+            return self._entries
+
+        found = []
+        try:
+            with os.scandir(self.directory) as dir_entries:
+                for dir_entry in dir_entries:
+                    if not dir_entry.name.endswith(_ENTRY_SUFFIX):
+                        continue
+                    stat = dir_entry.stat()
+                    key = dir_entry.name[: -len(_ENTRY_SUFFIX)]
+                    found.append((stat.st_mtime, key, stat.st_size))
+        except OSError:
+            pass
+
+        self._entries = OrderedDict()
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+        self._total_size = sum(self._entries.values())
+        return self._entries
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+
+_DEFAULT_CACHE: Optional[BytecodeCache] = None
+
+
+def set_default_cache(cache: Optional[BytecodeCache]) -> None:
+    """Set the cache used when importing detection and data model bodies.
+    Passing None disables caching."""
+    global _DEFAULT_CACHE  # pylint: disable=global-statement
+    _DEFAULT_CACHE = cache
+
+
+def get_default_cache() -> Optional[BytecodeCache]:
+    """Returns the cache used when importing detection and data model bodies, if any"""
+    return _DEFAULT_CACHE
+
+
+def compile_source(body: str, path: str) -> CodeType:
+    """Compile source code, using the default cache if one has been set"""
+    cache = _DEFAULT_CACHE
+    if cache is None:
+        return compile(body, path, "exec")
+    return cache.compile(body, path)
@@ -19,12 +19,13 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
 import os
 import tempfile
-from typing import Any, Callable, Dict, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
 
-from jsonpath_ng import Fields
-from jsonpath_ng.ext import parse
+from .profiler import KIND_DATA_MODEL, measure_import
+from .util import id_to_path, import_string_as_module
 
-from .util import id_to_path, import_file_as_module, store_modules
+if TYPE_CHECKING:
+    from jsonpath_ng import Fields
 
 _DATAMODEL_FOLDER = os.path.join(tempfile.gettempdir(), "datamodels")
 
@@ -61,25 +62,28 @@ class DataModel:  # pylint: disable=too-few-public-methods
         # mappings are required
         if not isinstance(config.get("mappings"), list):
             raise AssertionError('Field "mappings" of type list')
-        self.paths: Dict[str, Fields] = dict()  # setup paths mappings
+        self.paths: Dict[str, "Fields"] = dict()  # setup paths mappings
         self.methods: Dict[str, Callable] = dict()  # setup method mappings
 
-        # body is optional in a data model
-        self.body = ""
-        self._module = None
-        if "body" in config:
-            if not isinstance(config.get("body"), str):
-                raise AssertionError('Field "body" of type str')
-            self.body = config["body"]
-            self._store_data_models()
-            self._module = self._import_data_model_as_module()
-
-        if not isinstance(config.get("versionId"), str):
-            raise AssertionError('Field "versionId" of type str is required field')
-        self.version = config["versionId"]
-        self._extract_mappings(config["mappings"])
+        with measure_import(KIND_DATA_MODEL, self.data_model_id):
+            # body is optional in a data model
+            self.body = ""
+            self._module = None
+            if "body" in config:
+                if not isinstance(config.get("body"), str):
+                    raise AssertionError('Field "body" of type str')
+                self.body = config["body"]
+                self._module = self._import_data_model_as_module()
+
+            if not isinstance(config.get("versionId"), str):
+                raise AssertionError('Field "versionId" of type str is required field')
+            self.version = config["versionId"]
+            self._extract_mappings(config["mappings"])
 
     def _extract_mappings(self, source_mappings: List[Dict[str, str]]) -> None:
+        # jsonpath_ng builds its parser on import, only pay for it when a data model is used
+        from jsonpath_ng.ext import parse  # pylint: disable=import-outside-toplevel
+
         for mapping in source_mappings:
             if NAME not in mapping:
                 raise AssertionError(
@@ -105,17 +109,10 @@ class DataModel:  # pylint: disable=too-few-public-methods
                 )
 
     def _import_data_model_as_module(self) -> Any:
-        """Dynamically import a Python module from a file.
-
-        See also: https://docs.python.org/3/library/importlib.html#importing-a-source-file-directly
+        """Dynamically import the data model body as a Python module.
+        Compiled code is reused from the bytecode cache, if one has been set.
         """
         path = id_to_path(_DATAMODEL_FOLDER, self.data_model_id)
-        mod = import_file_as_module(path, self.data_model_id)
-        self.logger.debug("imported module %s from path %s", self.data_model_id, path)
+        mod = import_string_as_module(self.body, self.data_model_id, path)
+        self.logger.debug("imported module %s with path %s", self.data_model_id, path)
         return mod
-
-    def _store_data_models(self) -> None:
-        """Stores data models to disk."""
-        path = id_to_path(_DATAMODEL_FOLDER, self.data_model_id)
-        self.logger.debug("storing data model in path %s", path)
-        store_modules(path, self.body)
@@ -0,0 +1,125 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# The number of distinct destination lists whose resolution is cached
+DEFAULT_CACHE_SIZE = 1024
+
+_Resolution = Tuple[Tuple[str, ...], Tuple[Any, ...]]
+
+
+class DestinationResolver:  # pylint: disable=too-few-public-methods
+    """Resolves the destinations returned by detections to destination ids.
+
+    Built once per set of outputs, it indexes the outputs by id and by display name,
+    a display name taking precedence over an id. The resolution of each distinct
+    destination list is cached, since a detection usually returns the same few lists.
+    The index is built on first use, the outputs must not be modified afterwards.
+    """
+
+    def __init__(
+        self,
+        outputs: Optional[Mapping] = None,
+        outputs_names: Optional[Mapping] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        """
+        Args:
+            outputs: Destinations loaded from the panther-outputs-api, keyed by id
+            outputs_names: Destinations mapped by their display name
+            cache_size: The number of distinct destination lists whose resolution is cached
+        """
+        self.outputs = outputs if outputs is not None else {}
+        self.outputs_names = outputs_names if outputs_names is not None else {}
+        self.cache_size = cache_size
+        self._index: Optional[Dict[Any, str]] = None
+        self._cache: Dict[Tuple[Any, ...], _Resolution] = {}
+
+    def _build_index(self) -> Dict[Any, str]:
+        index = {destination_id: destination_id for destination_id in self.outputs}
+        for display_name, output in self.outputs_names.items():
+            index[display_name] = output.destination_id
+        self._index = index
+        return index
+
+    def resolve(self, destinations: Sequence[Any]) -> Tuple[List[str], List[Any]]:
+        """Returns the ids of the destinations, in order and without duplicates,
+        and the destinations that are neither a known id nor a display name
+
+        Raises:
+            TypeError: If a destination is not hashable
+        """
+        key = tuple(destinations)
+        resolution = self._cache.get(key)
+        if resolution is None:
+            resolution = self._resolve(key)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = resolution
+        resolved, invalid = resolution
+        return list(resolved), list(invalid)
+
+    def _resolve(self, destinations: Tuple[Any, ...]) -> _Resolution:
+        index = self._index if self._index is not None else self._build_index()
+        resolved: Dict[str, None] = {}
+        invalid = []
+        for destination in destinations:
+            destination_id = index.get(destination)
+            if destination_id is None:
+                invalid.append(destination)
+            else:
+                resolved[destination_id] = None
+        return tuple(resolved), tuple(invalid)
+
+
+class _UnindexedDestinationResolver(DestinationResolver):  # pylint: disable=too-few-public-methods
+    """Resolves the destinations of a single call with the raw outputs dicts.
+    Looking up the returned destinations in the dicts directly is cheaper
+    than indexing all the outputs for one resolution."""
+
+    def resolve(self, destinations: Sequence[Any]) -> Tuple[List[str], List[Any]]:
+        resolved, invalid = self._resolve(tuple(destinations))
+        return list(resolved), list(invalid)
+
+    def _resolve(self, destinations: Tuple[Any, ...]) -> _Resolution:
+        outputs, outputs_names = self.outputs, self.outputs_names
+        resolved: Dict[str, None] = {}
+        invalid = []
+        for destination in destinations:
+            # A display name takes precedence over an id, as in the index
+            if destination in outputs_names:
+                resolved[outputs_names[destination].destination_id] = None
+            elif destination in outputs:
+                resolved[destination] = None
+            else:
+                invalid.append(destination)
+        return tuple(resolved), tuple(invalid)
+
+
+def as_resolver(
+    outputs: Union[DestinationResolver, Optional[Mapping]],
+    outputs_names: Optional[Mapping] = None,
+) -> DestinationResolver:
+    """Returns the resolver, or a new one for the raw outputs dicts,
+    which looks up the destinations without indexing all the outputs"""
+    if isinstance(outputs, DestinationResolver):
+        return outputs
+    return _UnindexedDestinationResolver(outputs, outputs_names)
@@ -16,24 +16,115 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import linecache
 import logging
 import re
-import traceback
 from abc import abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from types import ModuleType
-from typing import List, Optional, Type
+from types import CodeType, ModuleType, TracebackType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Type
 
-from .util import id_to_path, import_file_as_module, store_modules
+from .util import id_to_path, import_file_as_module, import_string_as_module
 
 # Temporary alias for compatibility
 get_logger = logging.getLogger
 
+# Attribute of the exceptions holding their CompactTraceback
+_COMPACT_TRACEBACK_ATTRIBUTE = "_panther_compact_traceback"
+
+
+class TracebackLocation(NamedTuple):
+    """The innermost frame of a traceback"""
+
+    file: str
+    line: int
+    function: str
+    source: str
+
+
+class CompactTraceback:  # pylint: disable=too-few-public-methods
+    """Kept on an exception instead of its traceback, which references the frames
+    of the call stack and their local variables, e.g. the event"""
+
+    __slots__ = ("location", "message")
+
+    def __init__(self, location: TracebackLocation):
+        self.location = location
+        # The error message, formatted on first access
+        self.message: Optional[str] = None
+
+    def format(self, exception: BaseException) -> str:
+        """Returns the exception message followed by the location it was raised from"""
+        if self.message is None:
+            location = self.location
+            file_trace = f'File "{location.file}", line {location.line}, in {location.function}'
+            if self.location.source:
+                file_trace += "    " + self.location.source
+            # this looks like: File "/tmp/rules/AlwaysFail.py", line 4, in detection 1/0 BUT
+            # we want just the file name
+            self.message = (
+                str(exception) + ": " + re.sub(r'File.*/(.*[.]py)"', r"\1", file_trace)
+            )
+        return self.message
+
+
+def _innermost_location(trace: TracebackType) -> TracebackLocation:
+    while trace.tb_next is not None:
+        trace = trace.tb_next
+    frame = trace.tb_frame
+    code = frame.f_code
+    source = linecache.getline(code.co_filename, trace.tb_lineno, frame.f_globals)
+    return TracebackLocation(code.co_filename, trace.tb_lineno, code.co_name, source.strip())
+
+
+def compact_exception(exception: Optional[BaseException]) -> Any:
+    """Record where the exception was raised and release its traceback,
+    as well as the tracebacks of the exceptions it was chained to.
+
+    Returns:
+        The same exception
+    """
+    if exception is None or exception.__traceback__ is None:
+        return exception
+    try:
+        setattr(
+            exception,
+            _COMPACT_TRACEBACK_ATTRIBUTE,
+            CompactTraceback(_innermost_location(exception.__traceback__)),
+        )
+    except AttributeError:
+        # e.g. an exception class with __slots__, keep its traceback
+        return exception
+    chained: Optional[BaseException] = exception
+    seen = set()
+    while chained is not None and id(chained) not in seen:
+        seen.add(id(chained))
+        chained.__traceback__ = None
+        chained = chained.__cause__ or chained.__context__
+    return exception
+
+
+def _with_slots(cls: Any) -> Any:
+    """Returns a copy of the dataclass storing its fields in __slots__ instead of
+    a per-instance __dict__, as dataclass(slots=True) does from Python 3.10"""
+    field_names = tuple(each_field.name for each_field in fields(cls))
+    cls_dict = dict(cls.__dict__)
+    for name in field_names + ("__dict__", "__weakref__"):
+        # Defaults are kept by the generated __init__
+        cls_dict.pop(name, None)
+    cls_dict["__slots__"] = field_names
+    slotted = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted.__qualname__ = cls.__qualname__
+    return slotted
+
+
 # pylint: disable=too-many-instance-attributes,unsubscriptable-object
+@_with_slots
 @dataclass
 class DetectionResult:
-    """Class containing the result of running a detection"""
+    """Class containing the result of running a detection.
+    Millions are created per hour, the fields are stored in __slots__ to save memory."""
 
     detection_id: str
     detection_severity: str
@@ -79,7 +170,6 @@ class DetectionResult:
 
     input_exception: Optional[Exception] = None
 
-
     @property
     def fatal_error(self) -> Optional[Exception]:
         """Provide any error that would stop evaluation
@@ -116,14 +206,17 @@ class DetectionResult:
         if exception is None:
             return None
 
-        trace = traceback.format_tb(exception.__traceback__)
-        # we only take last element of trace which will show the
-        # detection file name and line of the error, for example:
-        #    division by zero: AlwaysFail.py, line 4, in detection 1/0
-        file_trace = trace[len(trace) - 1].strip().replace("\n", "")
-        # this looks like: File "/tmp/rules/AlwaysFail.py", line 4, in detection 1/0 BUT
-        # we want just the file name
-        return str(exception) + ": " + re.sub(r'File.*/(.*[.]py)"', r"\1", file_trace)
+        compact_traceback = getattr(exception, _COMPACT_TRACEBACK_ATTRIBUTE, None)
+        if compact_traceback is None:
+            compact_exception(exception)
+            compact_traceback = getattr(exception, _COMPACT_TRACEBACK_ATTRIBUTE, None)
+        if compact_traceback is not None:
+            return compact_traceback.format(exception)
+        if exception.__traceback__ is not None:
+            # The location couldn't be recorded on the exception
+            return CompactTraceback(_innermost_location(exception.__traceback__)).format(exception)
+        # The traceback is not available, e.g. the exception was unpickled
+        return str(exception)
 
     @property
     def errored(self) -> bool:
@@ -170,6 +263,134 @@ class DetectionResult:
                 self.alert_context_exception = None
 
 
+# Auxiliary functions with _defined, _output and _exception fields in DetectionResult
+_AUXILIARY_RESULT_FUNCTIONS = (
+    "title",
+    "description",
+    "reference",
+    "severity",
+    "runbook",
+    "destinations",
+    "dedup",
+    "alert_context",
+)
+
+
+class _LazyAuxiliaryField:
+    """Runs the auxiliary function of a field on first access"""
+
+    def __init__(self, function_name: str, field_name: str):
+        self.function_name = function_name
+        self.field_name = field_name
+
+    def __get__(self, obj: Any, objtype: Any = None) -> Any:
+        if obj is None:
+            return self
+        if self.function_name in obj.pending_functions:
+            obj._run_pending(self.function_name)  # pylint: disable=protected-access
+        return obj.__dict__["_values"].get(self.field_name)
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        obj.__dict__.setdefault("_values", {})[self.field_name] = value
+
+
+class LazyDetectionResult(DetectionResult):
+    """DetectionResult whose auxiliary functions run when one of their fields
+    is first accessed, e.g. the alert context is not serialized
+    if only trigger_alert and dedup_output are read.
+    Outputs are memoized and exceptions are captured in the same fields as DetectionResult.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        self.pending_functions: Set[str] = set()
+        self._evaluate: Optional[Callable[[DetectionResult, str], None]] = None
+        super().__init__(*args, **kwargs)
+
+    def defer(self, evaluate: Callable[[DetectionResult, str], None]) -> None:
+        """Set the callback running an auxiliary function and storing its result"""
+        self.pending_functions = set(_AUXILIARY_RESULT_FUNCTIONS)
+        self._evaluate = evaluate
+
+    def _run_pending(self, function_name: str) -> None:
+        # Removed first, in case the function depends on another field of its own
+        self.pending_functions.discard(function_name)
+        if self._evaluate is not None:
+            self._evaluate(self, function_name)
+        if not self.pending_functions:
+            self._evaluate = None
+
+    def resolve(self) -> "LazyDetectionResult":
+        """Run all the pending auxiliary functions, e.g. before pickling the result"""
+        for function_name in _AUXILIARY_RESULT_FUNCTIONS:
+            if function_name in self.pending_functions:
+                self._run_pending(function_name)
+        return self
+
+
+for _function_name in _AUXILIARY_RESULT_FUNCTIONS:
+    for _suffix in ("_defined", "_output", "_exception"):
+        setattr(
+            LazyDetectionResult,
+            _function_name + _suffix,
+            _LazyAuxiliaryField(_function_name, _function_name + _suffix),
+        )
+
+
+@dataclass
+class DedupGroup:
+    """Events of a batch that triggered a detection with the same dedup string"""
+
+    dedup_output: str
+    # The result of the first event of the group
+    result: DetectionResult
+    first_index: int
+    first_event: Any
+    last_index: int
+    last_event: Any
+    count: int = 1
+    # Up to max_samples events of the group, in order, starting with the first one
+    samples: List[Any] = field(default_factory=list)
+
+    def add(self, index: int, event: Any, max_samples: int) -> None:
+        """Record a duplicate event"""
+        self.count += 1
+        self.last_index = index
+        self.last_event = event
+        if len(self.samples) < max_samples:
+            self.samples.append(event)
+
+
+@dataclass
+class BatchResult:
+    """Class containing the result of running a detection over a batch of events.
+    A DetectionResult is only created for the events that triggered an alert or errored.
+    When duplicates are grouped, only the first alert of each dedup string is in results
+    and the others are counted in its group."""
+
+    detection_id: str
+    detection_severity: str
+    detection_type: str
+
+    # The number of events the detection ran against
+    events_evaluated: int = 0
+    # Results keyed by the position of their event in the batch
+    results: Dict[int, DetectionResult] = field(default_factory=dict)
+    # Alerting events grouped by dedup string, if duplicates are grouped
+    groups: Dict[str, DedupGroup] = field(default_factory=dict)
+
+    setup_exception: Optional[Exception] = None
+
+    @property
+    def alerts(self) -> Dict[int, DetectionResult]:
+        """Returns the results of the events that triggered an alert"""
+        return {index: result for index, result in self.results.items() if result.trigger_alert}
+
+    @property
+    def errors(self) -> Dict[int, DetectionResult]:
+        """Returns the results of the events for which a detection function raised an error"""
+        return {index: result for index, result in self.results.items() if result.errored}
+
+
 class BaseImporter:
     """Base class for Python module importers"""
 
@@ -178,11 +399,15 @@ class BaseImporter:
         """Import a file as a Python module"""
         return import_file_as_module(path, identifier)
 
-    def from_string(self, identifier: str, body: str, tmp_dir: str) -> ModuleType:
-        """Write source code to a temporary file and import as Python module"""
+    @staticmethod
+    def from_string(
+            identifier: str, body: str, tmp_dir: str, code: Optional[CodeType] = None
+    ) -> ModuleType:
+        """Import source code as Python module, without writing it to disk.
+        The module file path is derived from the given directory.
+        Precompiled code for the source can optionally be provided."""
         path = id_to_path(tmp_dir, identifier)
-        store_modules(path, body)
-        return self.from_file(identifier, path)
+        return import_string_as_module(body, identifier, path, code)
 
     @abstractmethod
     def get_module(self, identifier: str, resource: str) -> ModuleType:
@@ -209,6 +434,6 @@ class RawStringImporter(BaseImporter):
         self._tmp_dir = tmp_dir
 
     def get_module(  # pylint: disable=arguments-differ
-            self, identifier: str, body: str
+            self, identifier: str, body: str, code: Optional[CodeType] = None
     ) -> ModuleType:
-        return super().from_string(identifier, body, self._tmp_dir)
+        return super().from_string(identifier, body, self._tmp_dir, code)
@@ -0,0 +1,162 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .constants import TYPE_POLICY
+from .data_model import DataModel
+from .destinations import DestinationResolver, as_resolver
+from .detection import DetectionResult
+from .enriched_event import PantherEvent
+from .prefilter import PrefilterIndex
+from .rule import Detection
+
+# Event field holding the log type
+LOG_TYPE_FIELD = "p_log_type"
+
+_Index = Dict[str, Tuple[Detection, ...]]
+
+
+def _build_index(detections: Iterable[Detection], types_attr: str) -> Tuple[_Index, Tuple]:
+    subscribed: Dict[str, List[Detection]] = {}
+    wildcard: List[Detection] = []
+    for detection in detections:
+        types = getattr(detection, types_attr)
+        if not types:
+            wildcard.append(detection)
+        for each_type in types:
+            subscribed.setdefault(each_type, []).append(detection)
+    # Detections without types are merged in every entry, so that routing is a single lookup
+    index = {each_type: tuple(each + wildcard) for each_type, each in subscribed.items()}
+    return index, tuple(wildcard)
+
+
+class DetectionEngine:
+    """Routes events to the loaded detections subscribed to them.
+
+    Rules are indexed by their LogTypes and policies by their ResourceTypes.
+    Detections that don't declare any type analyze every event or resource.
+
+    With the prefilter, the rules of each log type are also indexed by the field values
+    their rule function requires, e.g. `event.get("eventName") == "X"`,
+    and the rules that can't match an event are not run. The requirements of lazy
+    detections are derived from their source code, so building the engine doesn't load them.
+    """
+
+    def __init__(
+        self,
+        detections: Iterable[Detection],
+        data_models: Optional[Dict[str, DataModel]] = None,
+        prefilter: bool = True,
+    ):
+        """
+        Args:
+            detections: The rules and policies to route events to, e.g. a DetectionRegistry
+            data_models: Data models keyed by the log type they apply to
+            prefilter: Whether to skip the rules that can't match an event
+        """
+        self.data_models = data_models or {}
+        rules = []
+        policies = []
+        for detection in detections:
+            if detection.detection_type == TYPE_POLICY:
+                policies.append(detection)
+            else:
+                rules.append(detection)
+        self._rules, self._wildcard_rules = _build_index(rules, "detection_log_types")
+        self._policies, self._wildcard_policies = _build_index(
+            policies, "detection_resource_types"
+        )
+        self._prefilters: Dict[str, PrefilterIndex] = {}
+        self._wildcard_prefilter: Optional[PrefilterIndex] = None
+        if prefilter:
+            self._prefilters = {
+                log_type: PrefilterIndex(rules) for log_type, rules in self._rules.items()
+            }
+            self._wildcard_prefilter = PrefilterIndex(self._wildcard_rules)
+
+    @property
+    def log_types(self) -> List[str]:
+        """Returns the log types with subscribed rules"""
+        return sorted(self._rules)
+
+    @property
+    def resource_types(self) -> List[str]:
+        """Returns the resource types with subscribed policies"""
+        return sorted(self._policies)
+
+    def rules_for(self, log_type: Optional[str]) -> Sequence[Detection]:
+        """Returns the rules analyzing events of the given log type"""
+        return self._rules.get(log_type, self._wildcard_rules)  # type: ignore
+
+    def policies_for(self, resource_type: Optional[str]) -> Sequence[Detection]:
+        """Returns the policies analyzing resources of the given type"""
+        return self._policies.get(resource_type, self._wildcard_policies)  # type: ignore
+
+    def evaluate(
+        self,
+        event: Mapping,
+        outputs: Union[DestinationResolver, dict],
+        outputs_names: Optional[dict] = None,
+    ) -> List[DetectionResult]:
+        """Run the rules subscribed to the log type of the event.
+        Pass a DestinationResolver built once for the loaded outputs, rather than
+        the raw outputs dicts, to reuse its index and cache across events.
+
+        Returns:
+            The result of each rule that ran, in the order the rules were given.
+            With the prefilter, there is no result for the rules that can't match the event
+        """
+        panther_event, rules = self.route(event)
+        if not rules:
+            return []
+        resolver = as_resolver(outputs, outputs_names)
+        return [rule.run(panther_event, resolver) for rule in rules]
+
+    def route(self, event: Mapping) -> Tuple[PantherEvent, Sequence[Detection]]:
+        """Returns the event wrapped with the data model of its log type
+        and the rules to run against it"""
+        log_type = event.get(LOG_TYPE_FIELD)
+        panther_event = PantherEvent(event, self.data_models.get(log_type))  # type: ignore
+        rules = self.rules_for(log_type)
+        if not rules:
+            return panther_event, rules
+        prefilter = self._prefilters.get(log_type, self._wildcard_prefilter)  # type: ignore
+        if prefilter is not None:
+            rules = prefilter.candidates(panther_event)
+        return panther_event, rules
+
+    def evaluate_resource(
+        self,
+        resource: Mapping,
+        resource_type: str,
+        outputs: Union[DestinationResolver, dict],
+        outputs_names: Optional[dict] = None,
+    ) -> List[DetectionResult]:
+        """Run the policies subscribed to the resource type.
+
+        Returns:
+            The result of each policy that ran, in the order the policies were given
+        """
+        policies = self.policies_for(resource_type)
+        if not policies:
+            return []
+        panther_resource = PantherEvent(resource, None)
+        resolver = as_resolver(outputs, outputs_names)
+        return [policy.run(panther_resource, resolver) for policy in policies]
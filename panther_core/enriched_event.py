@@ -17,17 +17,19 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from collections.abc import Mapping
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
-from .data_model import E_NO_DATA_MODEL_FOUND, DataModel
 from .exceptions import PantherError
 from .immutable import ImmutableCaseInsensitiveDict, json_encoder
 
+if TYPE_CHECKING:
+    from .data_model import DataModel
+
 
 class PantherEvent(ImmutableCaseInsensitiveDict):  # pylint: disable=R0901
     """Panther enriched event with unified data model (udm) access."""
 
-    def __init__(self, event: Mapping, data_model: Optional[DataModel]):
+    def __init__(self, event: Mapping, data_model: Optional["DataModel"]):
         """Create data model lookups
 
         Args:
@@ -65,6 +67,10 @@ class PantherEvent(ImmutableCaseInsensitiveDict):  # pylint: disable=R0901
 
     def _validate(self) -> None:
         if not self.data_model:
+            from .data_model import (  # pylint: disable=import-outside-toplevel
+                E_NO_DATA_MODEL_FOUND,
+            )
+
             raise PantherError(E_NO_DATA_MODEL_FOUND, self._container.get("p_log_type"))
 
     def _get_json_path(self, key: str) -> Any:
@@ -0,0 +1,144 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Every occurrence of an error is logged up to this count
+DEFAULT_FIRST_OCCURRENCES = 10
+
+# After the first occurrences, one occurrence out of this many is logged
+DEFAULT_SAMPLE_INTERVAL = 1000
+
+# Errors are counted per detection, function and error type
+_ErrorKey = Tuple[str, str, str]
+
+
+@dataclass
+class ErrorCount:
+    """The occurrences of an error since the last flush"""
+
+    detection_id: str
+    function_name: str
+    error_type: str
+    count: int
+    logged: int
+
+
+class ErrorLogSampler:
+    """Logs the errors of the auxiliary functions, which are handled for every event
+    and can flood the logs, e.g. a title() function always raising on a high volume rule.
+
+    The first occurrences of an error are logged, then one out of sample_interval,
+    each followed by its occurrence count. flush() logs a summary of the counts
+    of the errors that were not all logged and resets them.
+    """
+
+    def __init__(
+        self,
+        first_occurrences: int = DEFAULT_FIRST_OCCURRENCES,
+        sample_interval: int = DEFAULT_SAMPLE_INTERVAL,
+        logger: Optional[logging.Logger] = None,
+    ):
+        """
+        Args:
+            first_occurrences: The number of occurrences of an error always logged
+            sample_interval: Log one occurrence out of this many after the first ones
+            logger: Logs the summary, defaults to the root logger
+        """
+        self.first_occurrences = first_occurrences
+        self.sample_interval = sample_interval
+        self.logger = logger or logging.getLogger()
+        self._counts: Dict[_ErrorKey, List[int]] = {}
+
+    def log(  # pylint: disable=too-many-arguments
+        self,
+        logger: logging.Logger,
+        detection_id: str,
+        function_name: str,
+        error_type: str,
+        msg: str,
+        *args: Any,
+    ) -> bool:
+        """Count an occurrence of the error and log it with logger.info if it's sampled
+
+        Returns:
+            Whether the occurrence was logged
+        """
+        key = (detection_id, function_name, error_type)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0, 0]
+        counts[0] += 1
+        count = counts[0]
+        if count > self.first_occurrences and count % self.sample_interval:
+            return False
+        counts[1] += 1
+        logger.info(msg + " (occurrence %d)", *args, count)
+        return True
+
+    def counts(self) -> List[ErrorCount]:
+        """Returns the occurrences of each error since the last flush"""
+        return [
+            ErrorCount(detection_id, function_name, error_type, count, logged)
+            for (detection_id, function_name, error_type), (count, logged) in self._counts.items()
+        ]
+
+    def flush(self) -> List[ErrorCount]:
+        """Log a summary of the errors that were not all logged and reset the counts
+
+        Returns:
+            The occurrences of each error since the last flush
+        """
+        counts = self.counts()
+        self._counts = {}
+        for error in counts:
+            if error.count == error.logged:
+                continue
+            self.logger.info(
+                "%s method for detection with id [%s] reported [%s] %d times, %d of them logged",
+                error.function_name,
+                error.detection_id,
+                error.error_type,
+                error.count,
+                error.logged,
+            )
+        return counts
+
+
+_SAMPLER = ErrorLogSampler()
+
+
+def get_sampler() -> ErrorLogSampler:
+    """Returns the sampler used by the detections"""
+    return _SAMPLER
+
+
+def set_sampler(sampler: ErrorLogSampler) -> ErrorLogSampler:
+    """Replace the sampler used by the detections, returns the previous one"""
+    global _SAMPLER  # pylint: disable=global-statement
+    previous = _SAMPLER
+    _SAMPLER = sampler
+    return previous
+
+
+def flush() -> List[ErrorCount]:
+    """Log the summary of the sampler used by the detections and reset its counts"""
+    return _SAMPLER.flush()
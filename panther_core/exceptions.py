@@ -46,3 +46,11 @@ class FunctionReturnTypeError(PantherError):
 class UnknownDestinationError(PantherError):
     def result(self) -> Any:
         return self.args[1]
+
+
+class DetectionTimeoutError(PantherError):
+    pass
+
+
+class SizeLimitExceededError(PantherError):
+    pass
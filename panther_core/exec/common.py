@@ -19,11 +19,11 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import annotations
 import json
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 from dataclasses import asdict, dataclass
 
-from ..rule import ERROR_TYPE_RULE, ERROR_TYPE_SCHEDULED_RULE
-from ..policy import ERROR_TYPE_POLICY
+from ..constants import ERROR_TYPE_POLICY, ERROR_TYPE_RULE, ERROR_TYPE_SCHEDULED_RULE
+from ..json_backend import dumps_bytes, loads
 
 
 # Aliases
@@ -81,6 +81,27 @@ class _BaseDataObject:
     def to_bytes(self) -> bytes:
         return self.to_json().encode('utf-8')
 
+    def to_bytes_fast(self) -> bytes:
+        """Returns the JSON representation encoded as UTF-8, with the active json_backend.
+
+        With orjson or ujson installed, the output differs from to_bytes: it is compact,
+        orjson doesn't escape non-ASCII characters and encodes NaN and infinite floats
+        as null. Only use it for payloads decoded by from_bytes, not for stored or shown output.
+        """
+        return dumps_bytes(asdict(self))
+
+
+@dataclass(frozen=True)
+class _DecodableDataObject(_BaseDataObject):
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    @classmethod
+    def from_bytes(cls, data: Union[str, bytes]) -> Any:
+        """Returns the object represented by the output of to_json, to_bytes or to_bytes_fast"""
+        return cls.from_json(loads(data))
+
 
 @dataclass(frozen=True)
 class ClientOptions(_BaseDataObject):
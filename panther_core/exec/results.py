@@ -21,11 +21,11 @@ from dataclasses import dataclass
 
 from typing import Dict, List, Optional, Any
 
-from .common import ExecutionMatch, ExecutionMode, _BaseDataObject
+from .common import ExecutionMatch, ExecutionMode, _DecodableDataObject
 
 
 @dataclass(frozen=True)
-class ExecutionPrimaryFunctionDetails(_BaseDataObject):
+class ExecutionPrimaryFunctionDetails(_DecodableDataObject):
     error: Optional[str] = None
     output: Optional[bool] = None
 
@@ -38,7 +38,7 @@ class ExecutionPrimaryFunctionDetails(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionDetailsPrimaryFunctions(_BaseDataObject):
+class ExecutionDetailsPrimaryFunctions(_DecodableDataObject):
     detection: ExecutionPrimaryFunctionDetails
 
     @property
@@ -53,7 +53,7 @@ class ExecutionDetailsPrimaryFunctions(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionAuxFunctionDetails(_BaseDataObject):
+class ExecutionAuxFunctionDetails(_DecodableDataObject):
     defined: bool
     error: Optional[str] = None
     output: Optional[str] = None
@@ -72,7 +72,7 @@ class ExecutionAuxFunctionDetails(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionDetailsAuxFunctions(_BaseDataObject):
+class ExecutionDetailsAuxFunctions(_DecodableDataObject):
     dedup: ExecutionAuxFunctionDetails
     title: ExecutionAuxFunctionDetails
     runbook: ExecutionAuxFunctionDetails
@@ -108,7 +108,7 @@ class ExecutionDetailsAuxFunctions(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionDetails(_BaseDataObject):
+class ExecutionDetails(_DecodableDataObject):
     aux_functions: ExecutionDetailsAuxFunctions
     primary_functions: ExecutionDetailsPrimaryFunctions
     input_error: Optional[str] = None
@@ -132,7 +132,7 @@ class ExecutionDetails(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionOutput(_BaseDataObject):
+class ExecutionOutput(_DecodableDataObject):
     input_id: str
     match: Optional[ExecutionMatch] = None
     details: Optional[ExecutionDetails] = None
@@ -155,7 +155,7 @@ class ExecutionOutput(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionResult(_BaseDataObject):
+class ExecutionResult(_DecodableDataObject):
     output_mode: ExecutionMode
     url: Optional[str] = None
     data: Optional[List[ExecutionOutput]] = None
@@ -26,12 +26,12 @@ from .common import (
     ExecutionInputData,
     ExecutionMode,
     LogEventInput,
-    _BaseDataObject,
+    _DecodableDataObject,
 )
 
 
 @dataclass(frozen=True)
-class ExecutionTaskInput(_BaseDataObject):
+class ExecutionTaskInput(_DecodableDataObject):
     _event_input_id = "p_row_id"
     _resource_input_id = "resourceId"
 
@@ -69,7 +69,7 @@ class ExecutionTaskInput(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionTaskOutput(_BaseDataObject):
+class ExecutionTaskOutput(_DecodableDataObject):
     mode: ExecutionMode
     url: Optional[str] = None
 
@@ -89,7 +89,7 @@ class ExecutionTaskOutput(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionTaskOptions(_BaseDataObject):
+class ExecutionTaskOptions(_DecodableDataObject):
     execution_details: bool
 
     @classmethod
@@ -100,7 +100,7 @@ class ExecutionTaskOptions(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionEnv(_BaseDataObject):
+class ExecutionEnv(_DecodableDataObject):
     mocks: List[ExecutionEnvComponent]
     outputs: List[ExecutionEnvComponent]
     globals: List[ExecutionEnvComponent]
@@ -119,7 +119,7 @@ class ExecutionEnv(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionTaskEnv(_BaseDataObject):
+class ExecutionTaskEnv(_DecodableDataObject):
     mode: ExecutionMode
     url: Optional[str] = None
     env: Optional[ExecutionEnv] = None
@@ -142,7 +142,7 @@ class ExecutionTaskEnv(_BaseDataObject):
 
 
 @dataclass(frozen=True)
-class ExecutionTask(_BaseDataObject):
+class ExecutionTask(_DecodableDataObject):
     env: ExecutionTaskEnv
     input: ExecutionTaskInput
     output: ExecutionTaskOutput
@@ -0,0 +1,228 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import importlib
+import linecache
+import logging
+import os
+import re
+import sys
+import tempfile
+from collections.abc import Mapping
+from importlib.machinery import ModuleSpec
+from importlib.util import find_spec, spec_from_file_location
+from typing import Any, Dict, Iterable, Optional, Sequence, Set
+
+from .util import StringLoader, id_to_path
+
+_GLOBALS_FOLDER = os.path.join(tempfile.gettempdir(), "globals")
+
+# Matches the module names in "import a.b, c as d" and "from a.b import c" statements
+_IMPORT_REGEX = re.compile(
+    r"^[ \t]*(?:from[ \t]+([\w.]+)[ \t]+import\b|import[ \t]+([\w., \t]+))", re.MULTILINE
+)
+
+# Temporary alias for compatibility
+get_logger = logging.getLogger
+
+
+def imported_modules(body: str) -> Set[str]:
+    """Returns the top-level names of the modules imported in the source code.
+
+    This is a conservative textual scan, which also includes imports
+    nested in functions and doesn't require compiling the code.
+    """
+    names = set()
+    for from_name, import_names in _IMPORT_REGEX.findall(body):
+        if from_name:
+            names.add(from_name.split(".")[0])
+            continue
+        for name in import_names.split(","):
+            name = name.strip()
+            if name:
+                names.add(name.split()[0].split(".")[0])
+    return names
+
+
+class _GlobalHelperFinder:  # pylint: disable=too-few-public-methods
+    """Resolves imports of global helpers to their in-memory source code.
+    Not derived from importlib.abc.MetaPathFinder, which is slow to import."""
+
+    def __init__(self, helpers: "GlobalHelperRegistry"):
+        self._helpers = helpers
+
+    def find_spec(  # pylint: disable=unused-argument
+            self, fullname: str, path: Any = None, target: Any = None
+    ) -> Optional[ModuleSpec]:
+        body = self._helpers.body(fullname)
+        if body is None:
+            return None
+        return spec_from_file_location(
+            fullname, id_to_path(_GLOBALS_FOLDER, fullname), loader=StringLoader(body)
+        )
+
+
+class GlobalHelperRegistry:
+    """Global helper modules shared by all detections.
+
+    Each global is imported once in `sys.modules` under its id, straight from its
+    source code, so that detections can import it by name. The registry records
+    which detections and globals import each global, so that a changed global is
+    reloaded together with the globals that depend on it, and only the
+    detections that import any of those need to be rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self.logger = get_logger()
+        self._bodies: Dict[str, str] = {}
+        self._hashes: Dict[str, str] = {}
+        # Global id -> names of the modules it imports
+        self._global_imports: Dict[str, Set[str]] = {}
+        # Detection id -> names of the modules it imports, which can include
+        # globals that don't exist yet
+        self._detection_imports: Dict[str, Set[str]] = {}
+        # Global id -> exception raised while importing it
+        self.errors: Dict[str, Exception] = {}
+        self._finder = _GlobalHelperFinder(self)
+
+    def install(self) -> None:
+        """Make the globals importable. The finder runs after the default ones,
+        so that a global never shadows an installed module with the same name"""
+        if self._finder not in sys.meta_path:
+            sys.meta_path.append(self._finder)
+
+    def uninstall(self) -> None:
+        """Unload the globals and stop resolving imports to them"""
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._unload(list(self._bodies))
+
+    def __contains__(self, global_id: object) -> bool:
+        return global_id in self._bodies
+
+    def body(self, global_id: str) -> Optional[str]:
+        """Returns the source code of a global, None if it doesn't exist"""
+        return self._bodies.get(global_id)
+
+    def dependencies(self, detection_id: str) -> Set[str]:
+        """Returns the ids of the globals imported by a detection"""
+        return self._detection_imports.get(detection_id, set()) & self._bodies.keys()
+
+    def dependents(self, global_id: str) -> Set[str]:
+        """Returns the ids of the detections depending on a global,
+        either directly or through other globals"""
+        affected = self._affected_globals([global_id])
+        return {
+            detection_id
+            for detection_id, imports in self._detection_imports.items()
+            if imports & affected
+        }
+
+    def track(self, detection_id: str, body: str) -> None:
+        """Record the globals imported by the source code of a detection"""
+        self._detection_imports[detection_id] = imported_modules(body)
+
+    def untrack(self, detection_id: str) -> None:
+        """Forget the globals imported by a removed detection"""
+        self._detection_imports.pop(detection_id, None)
+
+    def update(self, configs: Sequence[Mapping]) -> Set[str]:
+        """Replace the globals with the given configs, reloading only the changed
+        globals and the globals that depend on them.
+
+        Args:
+            configs: Global configs, in the shape of `ExecutionEnv.globals`
+        Returns:
+            The ids of the detections that import a reloaded or removed global
+            and need to be rebuilt
+        """
+        self.install()
+        bodies: Dict[str, str] = {}
+        for config in configs:
+            if not isinstance(config.get("id"), str):
+                raise AssertionError('Field "id" of type str is required field')
+            if not isinstance(config.get("body"), str):
+                raise AssertionError('Field "body" of type str is required field')
+            bodies[config["id"]] = config["body"]
+
+        import hashlib  # pylint: disable=import-outside-toplevel
+
+        hashes = {
+            global_id: hashlib.sha256(body.encode("utf-8")).hexdigest()
+            for global_id, body in bodies.items()
+        }
+        changed = [
+            global_id
+            for global_id in set(self._hashes) | set(hashes)
+            if self._hashes.get(global_id) != hashes.get(global_id)
+        ]
+        # Compute the dependents using the previous imports,
+        # since the modules that must be unloaded are the ones loaded before
+        affected = self._affected_globals(changed)
+        to_rebuild = {
+            detection_id
+            for detection_id, imports in self._detection_imports.items()
+            if imports & affected
+        }
+
+        self._unload(affected)
+        self._bodies = bodies
+        self._hashes = hashes
+        self._global_imports = {
+            global_id: imported_modules(body) for global_id, body in bodies.items()
+        }
+        self._load(global_id for global_id in affected if global_id in bodies)
+        return to_rebuild
+
+    def _affected_globals(self, global_ids: Iterable[str]) -> Set[str]:
+        affected = set(global_ids)
+        pending = list(affected)
+        while pending:
+            global_id = pending.pop()
+            for dependent_id, imports in self._global_imports.items():
+                if global_id in imports and dependent_id not in affected:
+                    affected.add(dependent_id)
+                    pending.append(dependent_id)
+        return affected
+
+    def _load(self, global_ids: Iterable[str]) -> None:
+        for global_id in sorted(global_ids):
+            self.errors.pop(global_id, None)
+            try:
+                spec = find_spec(global_id)
+                if spec is not None and not isinstance(spec.loader, StringLoader):
+                    raise ImportError(
+                        f"global [{global_id}] is shadowed by an installed module with the same name",
+                        name=global_id,
+                    )
+                importlib.import_module(global_id)
+            except Exception as err:  # pylint: disable=broad-except
+                # Detections importing the global will fail to load,
+                # and report the error through their setup exception
+                self.logger.info("failed to import global [%s]: %s", global_id, err)
+                self.errors[global_id] = err
+
+    def _unload(self, global_ids: Iterable[str]) -> None:
+        for global_id in global_ids:
+            module = sys.modules.get(global_id)
+            if module is not None and isinstance(
+                    getattr(module.__spec__, "loader", None), StringLoader
+            ):
+                del sys.modules[global_id]
+            self.errors.pop(global_id, None)
+            linecache.cache.pop(id_to_path(_GLOBALS_FOLDER, global_id), None)
@@ -0,0 +1,190 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Union
+
+# Fast JSON encoding and decoding, with orjson or ujson when installed.
+#
+# The active backend is the first one installed of orjson, ujson and the stdlib json module,
+# unless the PANTHER_JSON_BACKEND environment variable or set_backend() selects one.
+#
+# Output compatibility:
+#     - The stdlib backend produces exactly the output of json.dumps with its default options.
+#     - The other backends produce compact JSON, without spaces after separators and
+#       with non-ASCII characters as UTF-8 for orjson. It decodes to the same value as
+#       the stdlib output, except for NaN and infinite floats, which orjson encodes as null.
+#       Since the output depends on the installed libraries, only encode internal payloads
+#       with this module, e.g. with the opt-in to_bytes_fast of the execution data objects.
+#       Output shown to users, such as alert contexts and test results, uses json.dumps.
+#     - Values a fast backend can't encode, e.g. integers over 64 bits, are encoded
+#       by the stdlib instead. Types rejected by the stdlib, e.g. dataclasses or datetimes,
+#       are passed to the default callback by every backend.
+#     - loads accepts everything json.loads accepts: input rejected by a fast backend,
+#       e.g. NaN literals, is decoded by the stdlib instead.
+
+BACKEND_ORJSON = "orjson"
+BACKEND_UJSON = "ujson"
+BACKEND_STDLIB = "json"
+
+# Environment variable forcing the backend
+BACKEND_ENV_VARIABLE = "PANTHER_JSON_BACKEND"
+
+_PREFERRED_BACKENDS = (BACKEND_ORJSON, BACKEND_UJSON, BACKEND_STDLIB)
+
+Default = Optional[Callable[[Any], Any]]
+
+
+class JSONBackend:
+    """Encodes and decodes JSON with the stdlib json module"""
+
+    name = BACKEND_STDLIB
+
+    def dumps(self, obj: Any, default: Default = None) -> str:
+        """Returns the JSON representation of the object"""
+        return json.dumps(obj, default=default)
+
+    def dumps_bytes(self, obj: Any, default: Default = None) -> bytes:
+        """Returns the JSON representation of the object, encoded as UTF-8"""
+        return self.dumps(obj, default=default).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Returns the value represented by the JSON document"""
+        return json.loads(data)
+
+
+class _OrjsonBackend(JSONBackend):
+    name = BACKEND_ORJSON
+
+    def __init__(self) -> None:
+        import orjson  # pylint: disable=import-outside-toplevel,import-error
+
+        self._orjson = orjson
+        # orjson is a compiled extension pylint can't inspect
+        self._options = (
+            orjson.OPT_NON_STR_KEYS  # pylint: disable=no-member
+            | orjson.OPT_PASSTHROUGH_DATACLASS  # pylint: disable=no-member
+            | orjson.OPT_PASSTHROUGH_DATETIME  # pylint: disable=no-member
+        )
+
+    def dumps(self, obj: Any, default: Default = None) -> str:
+        return self.dumps_bytes(obj, default=default).decode("utf-8")
+
+    def dumps_bytes(self, obj: Any, default: Default = None) -> bytes:
+        try:
+            return self._orjson.dumps(  # pylint: disable=no-member
+                obj, default=default, option=self._options
+            )
+        except TypeError:
+            # Also raised for values the stdlib can encode, e.g. integers over 64 bits
+            return json.dumps(obj, default=default).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._orjson.loads(data)  # pylint: disable=no-member
+        except ValueError:
+            return json.loads(data)
+
+
+class _UjsonBackend(JSONBackend):
+    name = BACKEND_UJSON
+
+    def __init__(self) -> None:
+        import ujson  # pylint: disable=import-outside-toplevel,import-error
+
+        self._ujson = ujson
+
+    def dumps(self, obj: Any, default: Default = None) -> str:
+        try:
+            return self._ujson.dumps(obj, default=default, reject_bytes=True)
+        except (TypeError, OverflowError):
+            return json.dumps(obj, default=default)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._ujson.loads(data)
+        except ValueError:
+            return json.loads(data)
+
+
+_BACKEND_TYPES: Dict[str, Callable[[], JSONBackend]] = {
+    BACKEND_ORJSON: _OrjsonBackend,
+    BACKEND_UJSON: _UjsonBackend,
+    BACKEND_STDLIB: JSONBackend,
+}
+
+
+def load_backend(name: str) -> JSONBackend:
+    """Returns the backend with the given name
+
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If the library of the backend is not installed
+    """
+    backend_type = _BACKEND_TYPES.get(name)
+    if backend_type is None:
+        raise ValueError(f"unknown JSON backend [{name}], expected one of {list(_BACKEND_TYPES)}")
+    return backend_type()
+
+
+def _default_backend() -> JSONBackend:
+    forced = os.environ.get(BACKEND_ENV_VARIABLE)
+    if forced:
+        return load_backend(forced)
+    for name in _PREFERRED_BACKENDS:
+        try:
+            return load_backend(name)
+        except ImportError:
+            continue
+    return JSONBackend()
+
+
+# Loaded on first use, so that importing panther_core doesn't import the backend libraries
+_ACTIVE_BACKEND: Optional[JSONBackend] = None
+
+
+def get_backend() -> JSONBackend:
+    """Returns the active backend"""
+    global _ACTIVE_BACKEND  # pylint: disable=global-statement
+    if _ACTIVE_BACKEND is None:
+        _ACTIVE_BACKEND = _default_backend()
+    return _ACTIVE_BACKEND
+
+
+def set_backend(name: str) -> JSONBackend:
+    """Select the active backend, returns the previous one"""
+    global _ACTIVE_BACKEND  # pylint: disable=global-statement
+    previous = get_backend()
+    _ACTIVE_BACKEND = load_backend(name)
+    return previous
+
+
+def dumps(obj: Any, default: Default = None) -> str:
+    """Returns the JSON representation of the object, with the active backend"""
+    return (_ACTIVE_BACKEND or get_backend()).dumps(obj, default=default)
+
+
+def dumps_bytes(obj: Any, default: Default = None) -> bytes:
+    """Returns the JSON representation of the object encoded as UTF-8, with the active backend"""
+    return (_ACTIVE_BACKEND or get_backend()).dumps_bytes(obj, default=default)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Returns the value represented by the JSON document, with the active backend"""
+    return (_ACTIVE_BACKEND or get_backend()).loads(data)
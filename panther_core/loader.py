@@ -0,0 +1,92 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import marshal
+import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from types import CodeType
+from typing import List, Optional, Sequence
+
+from .bytecode_cache import compile_source
+from .policy import TYPE_POLICY, Policy
+from .rule import _DETECTION_FOLDER, Detection, Rule
+from .util import id_to_path
+
+# Below this number of detections, the cost of starting
+# a process pool outweighs the parallel compilation
+MIN_PARALLEL_DETECTIONS = 64
+
+
+def detection_from_config(
+    config: Mapping, code: Optional[CodeType] = None, lazy: bool = False
+) -> Detection:
+    """Create a Rule or a Policy, depending on the analysis type of the config"""
+    if config.get("analysisType") == TYPE_POLICY:
+        return Policy(config, code, lazy=lazy)
+    return Rule(config, code, lazy=lazy)
+
+
+def compile_detection(config: Mapping) -> Optional[bytes]:
+    """Compile the body of a detection config, returning the marshalled code object.
+
+    None is returned if the config has no valid body or the body can't be compiled.
+    In that case, the detection constructor reports the error as it does
+    when loading the detection serially.
+    """
+    identifier = config.get("id")
+    body = config.get("body")
+    if not isinstance(identifier, str) or not isinstance(body, str) or not body:
+        return None
+    try:
+        code = compile_source(body, id_to_path(_DETECTION_FOLDER, identifier))
+    except Exception:  # pylint: disable=broad-except
+        return None
+    return marshal.dumps(code)
+
+
+def load_detections(
+    configs: Sequence[Mapping], max_workers: Optional[int] = None, lazy: bool = False
+) -> List[Detection]:
+    """Create detections from their configs, compiling the bodies in parallel.
+
+    Compilation runs across a pool of processes, while the modules are executed
+    and the detections are assembled in the current process, in the order of the configs.
+    Errors raised while loading a detection are available through its `setup_exception`,
+    exactly as when constructing the detections one by one.
+
+    Args:
+        configs: Detection configs, in the shape of `ExecutionEnv.detections`
+        max_workers: The number of processes to use, defaults to the number of CPUs
+        lazy: Whether to defer executing the detection modules until they first run
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers <= 1 or len(configs) < MIN_PARALLEL_DETECTIONS:
+        return [detection_from_config(config, lazy=lazy) for config in configs]
+
+    chunksize = max(1, len(configs) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        compiled = list(executor.map(compile_detection, configs, chunksize=chunksize))
+
+    detections = []
+    for config, marshalled_code in zip(configs, compiled):
+        code = None if marshalled_code is None else marshal.loads(marshalled_code)  # nosec
+        detections.append(detection_from_config(config, code, lazy=lazy))
+    return detections
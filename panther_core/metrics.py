@@ -0,0 +1,241 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+# Values are recorded with a relative error below 1 / 2 ** (SUB_BUCKET_BITS - 1)
+SUB_BUCKET_BITS = 7
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_HALF_SUB_BUCKETS = _SUB_BUCKETS >> 1
+
+_NANOSECONDS = 1e9
+
+# The recorder the detections report to, None while metrics are disabled
+_ACTIVE_RECORDER: "Optional[MetricsRecorder]" = None
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations in nanoseconds, in the style of HdrHistogram.
+
+    Each power of two range is split in the same number of buckets,
+    so that percentiles have a bounded relative error whatever their magnitude.
+    """
+
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket(value: int) -> int:
+        """Returns the index of the bucket holding the value"""
+        if value < _SUB_BUCKETS:
+            return value
+        exponent = value.bit_length() - SUB_BUCKET_BITS
+        mantissa = value >> exponent
+        return _SUB_BUCKETS + (exponent - 1) * _HALF_SUB_BUCKETS + mantissa - _HALF_SUB_BUCKETS
+
+    @staticmethod
+    def highest_value(bucket: int) -> int:
+        """Returns the highest value held by the bucket"""
+        if bucket < _SUB_BUCKETS:
+            return bucket
+        offset = bucket - _SUB_BUCKETS
+        exponent = offset // _HALF_SUB_BUCKETS + 1
+        mantissa = offset % _HALF_SUB_BUCKETS + _HALF_SUB_BUCKETS
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, value: int) -> None:
+        index = self.bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def value_at_percentile(self, percentile: float) -> int:
+        """Returns the highest value below which the given percentage of the values fall"""
+        if not self.count:
+            return 0
+        threshold = max(1, self.count * percentile / 100)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return min(self.highest_value(index), self.max)
+        return self.max
+
+
+class _FunctionStats:  # pylint: disable=too-few-public-methods
+    __slots__ = ("histogram", "total", "exceptions")
+
+    def __init__(self) -> None:
+        self.histogram = LatencyHistogram()
+        self.total = 0
+        self.exceptions: Dict[str, int] = {}
+
+
+class _DetectionStats:  # pylint: disable=too-few-public-methods
+    __slots__ = ("events", "matches", "functions")
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.matches = 0
+        self.functions: Dict[str, _FunctionStats] = {}
+
+
+@dataclass
+class FunctionMetrics:
+    """Calls of a detection function"""
+
+    calls: int
+    total_seconds: float
+    p50_seconds: float
+    p90_seconds: float
+    p99_seconds: float
+    max_seconds: float
+    # Exceptions raised by the function, by type name
+    exceptions: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class DetectionMetrics:
+    """Runs of a detection"""
+
+    detection_id: str
+    events: int
+    matches: int
+    match_rate: float
+    functions: Dict[str, FunctionMetrics] = field(default_factory=dict)
+
+
+class MetricsRecorder:
+    """Records per detection latencies and errors of the rule and auxiliary functions,
+    and the rate at which detections match.
+
+    Usage:
+        with MetricsRecorder() as recorder:
+            results = [rule.run(event, outputs, outputs_names) for event in events]
+        metrics = recorder.snapshot(reset=True)
+
+    Only one recorder can be active at a time. Detections are not instrumented
+    while no recorder is active. Updates are not synchronized, so counts can be
+    slightly off when detections run in several threads.
+    """
+
+    def __init__(self) -> None:
+        self._detections: Dict[str, _DetectionStats] = {}
+
+    def start(self) -> None:
+        """Start recording, detections are instrumented on their next run"""
+        global _ACTIVE_RECORDER  # pylint: disable=global-statement
+        if _ACTIVE_RECORDER is not None and _ACTIVE_RECORDER is not self:
+            raise RuntimeError("another metrics recorder is already active")
+        _ACTIVE_RECORDER = self
+
+    def stop(self) -> None:
+        """Stop recording"""
+        global _ACTIVE_RECORDER  # pylint: disable=global-statement
+        if _ACTIVE_RECORDER is self:
+            _ACTIVE_RECORDER = None
+
+    def __enter__(self) -> "MetricsRecorder":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def _stats(self, detection_id: str) -> _DetectionStats:
+        stats = self._detections.get(detection_id)
+        if stats is None:
+            stats = self._detections[detection_id] = _DetectionStats()
+        return stats
+
+    def record_event(self, detection_id: str, matched: bool) -> None:
+        """Record that the detection ran against an event"""
+        stats = self._stats(detection_id)
+        stats.events += 1
+        if matched:
+            stats.matches += 1
+
+    def instrument(
+        self, detection_id: str, function_name: str, function: Callable[[Any], Any]
+    ) -> Callable[[Any], Any]:
+        """Wrap a detection function, recording its latency and exceptions"""
+        perf_counter_ns = time.perf_counter_ns
+
+        def instrumented(event: Any) -> Any:
+            # Looked up on each call, the recorder may have been reset
+            functions = self._stats(detection_id).functions
+            stats = functions.get(function_name)
+            if stats is None:
+                stats = functions[function_name] = _FunctionStats()
+            start = perf_counter_ns()
+            try:
+                return function(event)
+            except Exception as err:
+                name = type(err).__name__
+                stats.exceptions[name] = stats.exceptions.get(name, 0) + 1
+                raise
+            finally:
+                duration = perf_counter_ns() - start
+                stats.total += duration
+                stats.histogram.record(duration)
+
+        return instrumented
+
+    def snapshot(self, reset: bool = False) -> Dict[str, DetectionMetrics]:
+        """Returns the metrics recorded for each detection since the last reset"""
+        detections = self._detections
+        if reset:
+            self.reset()
+        snapshot = {}
+        for detection_id, stats in detections.items():
+            functions = {}
+            for function_name, function_stats in stats.functions.items():
+                histogram = function_stats.histogram
+                functions[function_name] = FunctionMetrics(
+                    calls=histogram.count,
+                    total_seconds=function_stats.total / _NANOSECONDS,
+                    p50_seconds=histogram.value_at_percentile(50) / _NANOSECONDS,
+                    p90_seconds=histogram.value_at_percentile(90) / _NANOSECONDS,
+                    p99_seconds=histogram.value_at_percentile(99) / _NANOSECONDS,
+                    max_seconds=histogram.max / _NANOSECONDS,
+                    exceptions=dict(function_stats.exceptions),
+                )
+            snapshot[detection_id] = DetectionMetrics(
+                detection_id=detection_id,
+                events=stats.events,
+                matches=stats.matches,
+                match_rate=stats.matches / stats.events if stats.events else 0.0,
+                functions=functions,
+            )
+        return snapshot
+
+    def reset(self) -> None:
+        """Discard the recorded metrics"""
+        self._detections = {}
+
+
+def active_recorder() -> Optional[MetricsRecorder]:
+    """Returns the active metrics recorder, None if metrics are disabled"""
+    return _ACTIVE_RECORDER
@@ -18,10 +18,9 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections.abc import Mapping
 
+from .constants import ERROR_TYPE_POLICY, TYPE_POLICY  # pylint: disable=unused-import
 from .rule import Detection
 
-TYPE_POLICY = "POLICY"
-ERROR_TYPE_POLICY = "POLICY_ERROR"
 
 class Policy(Detection):
     """Panther policy metadata and imported module."""
@@ -36,5 +35,6 @@ class Policy(Detection):
     matcher_alert_value = False
 
     def matcher_function(self, event: Mapping) -> bool:
-        command = getattr(self._module, self.matcher_function_name)
-        return self._run_command(command, event, bool)
+        if self._needs_binding():
+            self._bind_functions()
+        return self._matcher(event)
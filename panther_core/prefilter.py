@@ -0,0 +1,375 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import ast
+import inspect
+from bisect import insort
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .rule import Detection
+
+# The requirement kinds, what the value of the field must be for the rule to match
+KIND_VALUES = "values"
+KIND_TRUTHY = "truthy"
+KIND_PRESENT = "present"
+
+# Values of constants that can be compared with the event fields
+_CONSTANT_TYPES = (str, int, float, bool, type(None))
+
+# The value returned by get() when a field is missing and no default is given
+_NO_DEFAULT = None
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class FieldRequirement:
+    """A condition on a top level event field, which must hold for a rule to match"""
+
+    field: str
+    kind: str
+    # The accepted values, for the values kind
+    values: FrozenSet[Any] = frozenset()
+    # Whether the field is read with event.get(), which can't raise when the field is missing
+    uses_get: bool = True
+    default: Any = _NO_DEFAULT
+
+    def value(self, event: Mapping) -> Any:
+        """Returns the value of the field, as read by the rule.
+        When the rule reads it with a subscript, a missing field is returned as _MISSING."""
+        if self.uses_get:
+            return event.get(self.field, self.default)
+        return event.get(self.field, _MISSING)
+
+    def satisfied_by(self, event: Mapping) -> bool:
+        """Returns False only if the rule can't match the event"""
+        if self.kind == KIND_PRESENT:
+            return self.field in event
+        value = self.value(event)
+        if value is _MISSING:
+            # The rule raises a KeyError, which shouldn't be hidden
+            return True
+        if self.kind == KIND_TRUTHY:
+            return bool(value)
+        try:
+            return value in self.values
+        except TypeError:
+            # Unhashable values, e.g. lists
+            return True
+
+
+def _constant(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant) and isinstance(node.value, _CONSTANT_TYPES):
+        return node.value
+    return _MISSING
+
+
+def _constants(node: ast.AST) -> Optional[FrozenSet[Any]]:
+    if not isinstance(node, (ast.Set, ast.Tuple, ast.List)):
+        return None
+    values = [_constant(element) for element in node.elts]
+    if any(value is _MISSING for value in values):
+        return None
+    return frozenset(values)
+
+
+class _GuardParser:
+    """Extracts the field requirements of a matcher function from its leading statements.
+
+    Only conditions evaluated before any other code runs are considered,
+    so that skipping the rule can't hide a side effect or an error:
+        if event.get("eventName") != "X": return False
+        if event.get("eventName") not in {"X", "Y"}: return False
+        if not event.get("field"): return False
+        if "field" not in event: return False
+        return event.get("eventName") == "X" and ...
+        return event["eventName"] in ("X", "Y") and ...
+    """
+
+    def __init__(self, param: str):
+        self.param = param
+
+    def field_access(self, node: ast.AST) -> Optional[Tuple[str, bool, Any]]:
+        """Returns the field, whether it's read with get() and the get() default"""
+        if isinstance(node, ast.Call) and self._is_event_get(node):
+            default = _constant(node.args[1]) if len(node.args) == 2 else _NO_DEFAULT
+            if default is _MISSING:
+                return None
+            return node.args[0].value, True, default  # type: ignore
+        if isinstance(node, ast.Subscript) and self._is_event(node.value):
+            field = _constant(node.slice)
+            if isinstance(field, str):
+                return field, False, _NO_DEFAULT
+        return None
+
+    def _is_event(self, node: ast.AST) -> bool:
+        return isinstance(node, ast.Name) and node.id == self.param
+
+    def _is_event_get(self, node: ast.Call) -> bool:
+        """Whether the call is `event.get("field")` or `event.get("field", default)`"""
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and func.attr == "get"):
+            return False
+        if not self._is_event(func.value) or node.keywords or len(node.args) not in (1, 2):
+            return False
+        return isinstance(_constant(node.args[0]), str)
+
+    def value_test(self, node: ast.AST, negated: bool) -> Optional[FieldRequirement]:
+        """Parses `field == constant` or `field in constants`, or their negation"""
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            return None
+        operator, left, right = node.ops[0], node.left, node.comparators[0]
+        equal_ops, in_ops = (ast.NotEq, ast.NotIn) if negated else (ast.Eq, ast.In)
+        values = None
+        access = None
+        if isinstance(operator, equal_ops):
+            access = self.field_access(left)
+            value = _constant(right)
+            if access is None:
+                access, value = self.field_access(right), _constant(left)
+            if value is not _MISSING:
+                values = frozenset([value])
+        elif isinstance(operator, in_ops):
+            access = self.field_access(left)
+            values = _constants(right)
+        if access is None or values is None:
+            return None
+        field, uses_get, default = access
+        return FieldRequirement(field, KIND_VALUES, values, uses_get, default)
+
+    def mismatch_test(self, node: ast.AST) -> Optional[FieldRequirement]:
+        """Parses a condition which makes the rule return False when it holds"""
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            access = self.field_access(node.operand)
+            if access is not None:
+                field, uses_get, default = access
+                return FieldRequirement(field, KIND_TRUTHY, uses_get=uses_get, default=default)
+            return self.value_test(node.operand, negated=False)
+        if (
+            isinstance(node, ast.Compare)
+            and len(node.ops) == 1
+            and isinstance(node.ops[0], ast.NotIn)
+            and isinstance(_constant(node.left), str)
+            and self._is_event(node.comparators[0])
+        ):
+            return FieldRequirement(node.left.value, KIND_PRESENT)  # type: ignore
+        return self.value_test(node, negated=True)
+
+    def requirements(self, body: Sequence[ast.stmt]) -> List[FieldRequirement]:
+        requirements = []
+        for statement in body:
+            if (
+                isinstance(statement, ast.Expr)
+                and isinstance(statement.value, ast.Constant)
+                and isinstance(statement.value.value, str)
+            ):
+                continue  # docstring
+            if isinstance(statement, ast.If):
+                if statement.orelse or not _returns_false(statement.body):
+                    break
+                test = statement.test
+                complete = True
+                if isinstance(test, ast.BoolOp) and isinstance(test.op, ast.Or):
+                    # Only the first operand is always evaluated
+                    test, complete = test.values[0], False
+                requirement = self.mismatch_test(test)
+                if requirement is None:
+                    break
+                requirements.append(requirement)
+                if not (complete and requirement.uses_get):
+                    # The next statements only run if this one didn't raise
+                    break
+                continue
+            if isinstance(statement, ast.Return) and statement.value is not None:
+                test = statement.value
+                if isinstance(test, ast.BoolOp) and isinstance(test.op, ast.And):
+                    test = test.values[0]
+                requirement = self.value_test(test, negated=False)
+                if requirement is not None:
+                    requirements.append(requirement)
+            break
+        return requirements
+
+
+def _returns_false(body: Sequence[ast.stmt]) -> bool:
+    return (
+        len(body) == 1
+        and isinstance(body[0], ast.Return)
+        and body[0].value is not None
+        and _constant(body[0].value) is False
+    )
+
+
+def _function_def(tree: ast.Module, name: str) -> Optional[ast.FunctionDef]:
+    definitions = [
+        node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == name
+    ]
+    if len(definitions) != 1:
+        return None
+    definition = definitions[0]
+    args = definition.args
+    if definition.decorator_list or len(args.args) != 1 or args.vararg or args.kwonlyargs:
+        return None
+    return definition
+
+
+def source_requirements(source: str, function_name: str = "rule") -> List[FieldRequirement]:
+    """Returns the field requirements of the matcher function defined in the source"""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+    definition = _function_def(tree, function_name)
+    if definition is None:
+        return []
+    return _GuardParser(definition.args.args[0].arg).requirements(definition.body)
+
+
+def rule_requirements(detection: Detection) -> List[FieldRequirement]:
+    """Returns the field requirements of a loaded rule, none if they can't be determined.
+    Requirements are only derived for rules, which don't alert when they return False."""
+    if detection.matcher_alert_value is not True or detection.setup_exception:
+        return []
+    module = detection.module
+    matcher = getattr(module, detection.matcher_function_name, None)
+    code = getattr(matcher, "__code__", None)
+    if code is None:
+        return []
+    try:
+        source = inspect.getsource(module)
+    except (OSError, TypeError):
+        return []
+    tree = ast.parse(source)
+    definition = _function_def(tree, detection.matcher_function_name)
+    # The module function must be the one defined in the source,
+    # not e.g. a mock or a function imported from a helper
+    if definition is None or code.co_firstlineno != definition.lineno:
+        return []
+    if code.co_filename != getattr(module, "__file__", None):
+        return []
+    return _GuardParser(definition.args.args[0].arg).requirements(definition.body)
+
+
+def pending_requirements(detection: Detection) -> List[FieldRequirement]:
+    """Returns the field requirements of a rule whose module isn't loaded yet,
+    derived from its source code without loading it.
+    They must be checked against rule_requirements once the rule is loaded,
+    since the module can e.g. replace the function defined in the source."""
+    body = detection.pending_body
+    if detection.matcher_alert_value is not True or body is None:
+        return []
+    return source_requirements(body, detection.matcher_function_name)
+
+
+class PrefilterIndex:
+    """Selects the rules that can match an event, from the requirements of their rule function.
+
+    The rules are indexed by the value of the first field value they require,
+    so that finding the candidates for an event takes a lookup per indexed field
+    instead of a call per rule. The other requirements are checked for each candidate.
+
+    Rules that aren't loaded yet are indexed from their source code, without loading them.
+    They're loaded when the first candidates are selected, as they would be by running
+    them against the first event, and reindexed if their module doesn't match the source.
+    """
+
+    def __init__(self, rules: Sequence[Detection]):
+        self.rules = tuple(rules)
+        self._requirements: List[List[FieldRequirement]] = []
+        # Positions of the rules indexed from their source code, until they're loaded
+        self._unverified: List[int] = []
+        for position, rule in enumerate(self.rules):
+            if rule.loaded:
+                self._requirements.append(rule_requirements(rule))
+                continue
+            requirements = pending_requirements(rule)
+            self._requirements.append(requirements)
+            if requirements:
+                self._unverified.append(position)
+        # Positions of the rules without a value requirement
+        self._unindexed: List[int] = []
+        # (field, uses get, default) -> value -> positions of the rules requiring that value
+        self._indexes: Dict[Tuple[str, bool, Any], Dict[Any, List[int]]] = {}
+        self._checks: Dict[int, List[FieldRequirement]] = {}
+        self._build()
+
+    def _build(self) -> None:
+        self._unindexed = []
+        self._indexes = {}
+        self._checks = {}
+        for position, requirements in enumerate(self._requirements):
+            indexed = next((req for req in requirements if req.kind == KIND_VALUES), None)
+            if indexed is None:
+                self._unindexed.append(position)
+            else:
+                index = self._indexes.setdefault(
+                    (indexed.field, indexed.uses_get, indexed.default), {}
+                )
+                for value in indexed.values:
+                    index.setdefault(value, []).append(position)
+            checks = [req for req in requirements if req is not indexed]
+            if checks:
+                self._checks[position] = checks
+
+    def _verify(self) -> None:
+        """Load the rules indexed from their source code, and reindex the ones
+        whose loaded rule function doesn't have the same requirements"""
+        unverified, self._unverified = self._unverified, []
+        changed = False
+        for position in unverified:
+            requirements = rule_requirements(self.rules[position])
+            if requirements != self._requirements[position]:
+                self._requirements[position] = requirements
+                changed = True
+        if changed:
+            self._build()
+
+    @property
+    def indexed_rules(self) -> int:
+        """Returns the number of rules selected through the index"""
+        return len(self.rules) - len(self._unindexed)
+
+    def candidates(self, event: Mapping) -> List[Detection]:
+        """Returns the rules that can match the event, in their original order"""
+        if self._unverified:
+            self._verify()
+        if not self._indexes:
+            positions = self._unindexed
+        else:
+            positions = list(self._unindexed)
+            for (field, uses_get, default), index in self._indexes.items():
+                value = event.get(field, default if uses_get else _MISSING)
+                try:
+                    matched = index.get(value, ())
+                except TypeError:
+                    matched = None
+                if value is _MISSING or matched is None:
+                    # Let the rules raise on missing fields and compare unhashable values
+                    matched = sorted({pos for each in index.values() for pos in each})
+                for position in matched:
+                    insort(positions, position)
+        checks = self._checks
+        rules = self.rules
+        return [
+            rules[position]
+            for position in positions
+            if position not in checks
+            or all(requirement.satisfied_by(event) for requirement in checks[position])
+        ]
@@ -0,0 +1,192 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gc
+import multiprocessing
+import os
+import pickle  # nosec
+from collections.abc import Mapping
+from dataclasses import fields
+from multiprocessing.pool import Pool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .constants import TYPE_POLICY
+from .data_model import DataModel
+from .destinations import DestinationResolver
+from .detection import DetectionResult
+from .engine import DetectionEngine
+from .exceptions import PantherError
+from .rule import Detection
+
+# Events are sent to the workers in shards of this size
+DEFAULT_SHARD_SIZE = 256
+
+_EXCEPTION_FIELDS = tuple(
+    each_field.name
+    for each_field in fields(DetectionResult)
+    if each_field.name.endswith("_exception")
+)
+
+
+class _WorkerState:  # pylint: disable=too-few-public-methods
+    """The loaded detections, inherited by the forked workers"""
+
+    def __init__(self, engine: DetectionEngine, resolver: DestinationResolver):
+        self.engine = engine
+        self.resolver = resolver
+
+
+# Set in the parent right before forking, so that the workers
+# share the loaded detections copy-on-write instead of receiving them
+_WORKER_STATE: Optional[_WorkerState] = None
+
+
+def _worker_init() -> None:
+    # The pool only freezes the parent's objects, it never disables collections.
+    # The application may have disabled them, as the gc.freeze() documentation suggests
+    # to avoid fragmenting memory, and the workers would inherit that
+    gc.enable()
+
+
+def _portable_exception(err: Exception) -> Exception:
+    try:
+        pickle.loads(pickle.dumps(err))  # nosec
+    except Exception:  # pylint: disable=broad-except
+        # e.g. exception classes defined in detection modules,
+        # which can't be imported in the parent process
+        return PantherError(f"{type(err).__name__}: {err}")
+    return err
+
+
+def _evaluate_shard(shard: Tuple[int, Sequence[Mapping]]) -> List[List[DetectionResult]]:
+    _, events = shard
+    state = _WORKER_STATE
+    if state is None:
+        raise RuntimeError("prefork worker has not been initialized")
+
+    shard_results = []
+    for event in events:
+        event_results = []
+        for result in state.engine.evaluate(event, state.resolver):
+            if not (result.trigger_alert or result.errored):
+                continue
+            for field_name in _EXCEPTION_FIELDS:
+                err = getattr(result, field_name)
+                if err is not None:
+                    setattr(result, field_name, _portable_exception(err))
+            event_results.append(result)
+        shard_results.append(event_results)
+    return shard_results
+
+
+class PreforkPool:
+    """Evaluates log events across forked worker processes, which share
+    the rules and data models loaded once in the parent process.
+    Events are routed to the rules subscribed to their log type by a DetectionEngine.
+    Only rules are evaluated: the policies among the detections are ignored and never loaded.
+
+    The loaded objects are moved to the permanent generation with `gc.freeze()`
+    right before forking, so that garbage collections in the workers
+    don't write to their memory pages and they stay shared copy-on-write.
+
+    Only results that trigger an alert or errored are returned from the workers.
+    Exceptions lose their traceback when sent back to the parent, and exceptions
+    that can't be pickled are replaced by a PantherError with the same message.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        detections: Sequence[Detection],
+        data_models: Optional[Dict[str, DataModel]] = None,
+        outputs: Optional[dict] = None,
+        outputs_names: Optional[dict] = None,
+        *,
+        processes: Optional[int] = None,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+    ):
+        """
+        Args:
+            detections: The rules to evaluate, policies are ignored
+            data_models: Data models keyed by the log type they apply to
+            outputs: Destinations loaded from the panther-outputs-api
+            outputs_names: Destinations mapped by their display name
+            processes: The number of workers, defaults to the number of CPUs
+            shard_size: The number of events sent to a worker at once
+        """
+        self.detections = [
+            detection for detection in detections if detection.detection_type != TYPE_POLICY
+        ]
+        self._state = _WorkerState(
+            DetectionEngine(self.detections, data_models), DestinationResolver(outputs, outputs_names)
+        )
+        self.processes = processes or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self._pool: Optional[Pool] = None
+
+    def start(self) -> None:
+        """Load any deferred rule modules and fork the workers"""
+        global _WORKER_STATE  # pylint: disable=global-statement
+        if self._pool is not None:
+            return
+        if _WORKER_STATE is not None:
+            raise RuntimeError("another prefork pool is already running")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("prefork pools require the fork start method")
+
+        for detection in self.detections:
+            detection.prewarm()
+
+        _WORKER_STATE = self._state
+        gc.collect()
+        gc.freeze()
+        self._pool = multiprocessing.get_context("fork").Pool(self.processes, _worker_init)
+
+    def evaluate(self, events: Sequence[Mapping]) -> List[List[DetectionResult]]:
+        """Evaluate the events with the rules subscribed to their log type.
+
+        Returns:
+            For each event, in order, the results that triggered an alert or errored
+        """
+        if self._pool is None:
+            raise RuntimeError("prefork pool has not been started")
+        shards = [
+            (offset, events[offset : offset + self.shard_size])
+            for offset in range(0, len(events), self.shard_size)
+        ]
+        results: List[List[DetectionResult]] = []
+        for shard_results in self._pool.imap(_evaluate_shard, shards):
+            results.extend(shard_results)
+        return results
+
+    def close(self) -> None:
+        """Stop the workers and release the frozen objects"""
+        global _WORKER_STATE  # pylint: disable=global-statement
+        if self._pool is None:
+            return
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        _WORKER_STATE = None
+        gc.unfreeze()
+
+    def __enter__(self) -> "PreforkPool":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
@@ -0,0 +1,158 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, List, Optional
+
+KIND_DETECTION = "detection"
+KIND_DATA_MODEL = "data_model"
+
+# The profiler the imports are recorded to, None while profiling is disabled
+_ACTIVE_PROFILER: "Optional[ImportProfiler]" = None
+
+
+@dataclass
+class ImportCost:
+    """The cost of loading the module of a detection or a data model"""
+
+    kind: str
+    identifier: str
+    wall_time_seconds: float
+    # Memory still allocated after loading
+    allocated_bytes: int
+    # Highest memory allocated while loading
+    peak_allocated_bytes: int
+    # Modules added to sys.modules while loading, including transitive imports
+    imported_modules: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+class ImportProfiler:
+    """Records the cost of loading detections and data models.
+
+    Usage:
+        with ImportProfiler() as profiler:
+            detections = load_detections(configs)
+        profiler.dump("import_costs.json")
+
+    Only one profiler can be active at a time. Loading is not instrumented
+    while no profiler is active.
+    """
+
+    def __init__(self) -> None:
+        self.costs: List[ImportCost] = []
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        """Start recording the cost of loading detections and data models"""
+        global _ACTIVE_PROFILER  # pylint: disable=global-statement
+        if _ACTIVE_PROFILER is not None and _ACTIVE_PROFILER is not self:
+            raise RuntimeError("another import profiler is already active")
+        # Only imported when profiling, every detection import goes through this module
+        import tracemalloc  # pylint: disable=import-outside-toplevel
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        _ACTIVE_PROFILER = self
+
+    def stop(self) -> None:
+        """Stop recording"""
+        global _ACTIVE_PROFILER  # pylint: disable=global-statement
+        if _ACTIVE_PROFILER is self:
+            _ACTIVE_PROFILER = None
+        if self._started_tracemalloc:
+            import tracemalloc  # pylint: disable=import-outside-toplevel
+
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def __enter__(self) -> "ImportProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    @contextmanager
+    def measure(self, kind: str, identifier: str) -> Iterator[None]:
+        """Record the cost of the code executed in the context"""
+        import tracemalloc  # pylint: disable=import-outside-toplevel
+
+        modules_before = set(sys.modules)
+        memory_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as err:
+            error = repr(err)
+            raise
+        finally:
+            wall_time = time.perf_counter() - start
+            memory_after, memory_peak = tracemalloc.get_traced_memory()
+            self.costs.append(
+                ImportCost(
+                    kind=kind,
+                    identifier=identifier,
+                    wall_time_seconds=wall_time,
+                    allocated_bytes=memory_after - memory_before,
+                    peak_allocated_bytes=memory_peak - memory_before,
+                    imported_modules=sorted(set(sys.modules) - modules_before),
+                    error=error,
+                )
+            )
+
+    def report(
+        self, sort_by: str = "wall_time_seconds", limit: Optional[int] = None
+    ) -> List[ImportCost]:
+        """Returns the recorded costs, most expensive first
+
+        Args:
+            sort_by: The ImportCost field to sort by
+            limit: The maximum number of costs to return
+        """
+        costs = sorted(self.costs, key=lambda cost: getattr(cost, sort_by), reverse=True)
+        if limit is not None:
+            costs = costs[:limit]
+        return costs
+
+    def to_json(self, sort_by: str = "wall_time_seconds") -> str:
+        """Returns the recorded costs as JSON, most expensive first"""
+        return json.dumps([asdict(cost) for cost in self.report(sort_by=sort_by)])
+
+    def dump(self, path: str, sort_by: str = "wall_time_seconds") -> None:
+        """Write the recorded costs to a JSON file"""
+        with open(path, "w", encoding="utf-8") as report_file:
+            report_file.write(self.to_json(sort_by=sort_by))
+
+
+@contextmanager
+def measure_import(kind: str, identifier: str) -> Iterator[None]:
+    """Record the cost of the code executed in the context, if a profiler is active"""
+    profiler = _ACTIVE_PROFILER
+    if profiler is None:
+        yield
+        return
+    with profiler.measure(kind, identifier):
+        yield
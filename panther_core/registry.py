@@ -0,0 +1,170 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import linecache
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .global_helpers import GlobalHelperRegistry
+from .loader import load_detections
+from .rule import _DETECTION_FOLDER, Detection
+from .util import id_to_path
+
+# versionId, analysis type and hash of the detection body or path
+Fingerprint = Tuple[Optional[str], Optional[str], str]
+
+
+def config_fingerprint(config: Mapping) -> Fingerprint:
+    """Returns the values that identify a version of a detection config.
+    Metadata changes are expected to come with a new versionId."""
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    source = config.get("body") or config.get("path") or ""
+    digest = hashlib.sha256(str(source).encode("utf-8")).hexdigest()
+    return config.get("versionId"), config.get("analysisType"), digest
+
+
+@dataclass
+class RegistryUpdate:
+    """The detection ids affected by a registry update"""
+
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        """Whether any detection was added, updated or removed"""
+        return bool(self.added or self.updated or self.removed)
+
+
+class DetectionRegistry:
+    """Loaded detections keyed by id, which can be reloaded incrementally.
+
+    On update, only the detections whose versionId or body changed are rebuilt,
+    along with the ones importing a changed global helper.
+    References to superseded and removed detections are dropped,
+    so that their modules can be garbage-collected.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        lazy: bool = False,
+        helpers: Optional[GlobalHelperRegistry] = None,
+    ):
+        """
+        Args:
+            max_workers: The number of processes used to compile changed detections
+            lazy: Whether to defer loading the detection modules until they first run
+            helpers: The global helpers imported by the detections
+        """
+        self.max_workers = max_workers
+        self.lazy = lazy
+        self.helpers = helpers
+        self._detections: Dict[str, Detection] = {}
+        self._fingerprints: Dict[str, Fingerprint] = {}
+
+    def __len__(self) -> int:
+        return len(self._detections)
+
+    def __contains__(self, detection_id: object) -> bool:
+        return detection_id in self._detections
+
+    def __getitem__(self, detection_id: str) -> Detection:
+        return self._detections[detection_id]
+
+    def __iter__(self) -> Iterator[Detection]:
+        return iter(self._detections.values())
+
+    def get(self, detection_id: str) -> Optional[Detection]:
+        """Returns the detection with the given id, None if it doesn't exist"""
+        return self._detections.get(detection_id)
+
+    def update(
+        self, configs: Sequence[Mapping], helper_configs: Optional[Sequence[Mapping]] = None
+    ) -> RegistryUpdate:
+        """Replace the registry contents with the detections in the given configs,
+        rebuilding only the new and changed ones.
+
+        If global helper configs are given, the changed globals are reloaded first
+        and the detections importing them are rebuilt as well.
+        The detections are left untouched if creating any of them raises an error,
+        but the globals are not rolled back: they stay reloaded, while the detections
+        already loaded keep using the global modules they imported.
+        Detection ids are kept in the order of the configs,
+        a later config with the same id takes precedence.
+        """
+        if helper_configs is not None and self.helpers is None:
+            raise ValueError("the registry has not been created with global helpers")
+
+        result = RegistryUpdate()
+        fingerprints: Dict[str, Fingerprint] = {}
+        latest_configs: Dict[str, Mapping] = {}
+        for config in configs:
+            detection_id = config.get("id")
+            if not isinstance(detection_id, str):
+                raise AssertionError('Field "id" of type str is required field')
+            fingerprints[detection_id] = config_fingerprint(config)
+            latest_configs[detection_id] = config
+
+        # The configs are validated before reloading the globals
+        to_reload: Set[str] = set()
+        if helper_configs is not None and self.helpers is not None:
+            to_reload = self.helpers.update(helper_configs)
+
+        to_load = []
+        for detection_id, fingerprint in fingerprints.items():
+            if detection_id not in self._detections:
+                result.added.append(detection_id)
+                to_load.append(latest_configs[detection_id])
+            elif self._fingerprints[detection_id] != fingerprint or detection_id in to_reload:
+                result.updated.append(detection_id)
+                to_load.append(latest_configs[detection_id])
+            else:
+                result.unchanged.append(detection_id)
+        result.removed = [
+            detection_id for detection_id in self._detections if detection_id not in fingerprints
+        ]
+
+        loaded = {
+            detection.detection_id: detection
+            for detection in load_detections(to_load, max_workers=self.max_workers, lazy=self.lazy)
+        }
+
+        detections = {}
+        for detection_id in fingerprints:
+            detection = loaded.get(detection_id)
+            detections[detection_id] = (
+                detection if detection is not None else self._detections[detection_id]
+            )
+
+        for detection_id in result.removed:
+            # Release the source code registered for tracebacks
+            linecache.cache.pop(id_to_path(_DETECTION_FOLDER, detection_id), None)
+            if self.helpers is not None:
+                self.helpers.untrack(detection_id)
+        if self.helpers is not None:
+            for config in to_load:
+                self.helpers.track(config["id"], config.get("body") or "")
+
+        self._detections = detections
+        self._fingerprints = fingerprints
+        return result
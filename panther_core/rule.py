@@ -16,33 +16,46 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import functools
 import json
 import logging
 import os
 import tempfile
 from abc import ABC, abstractmethod
 from collections.abc import Mapping
-from types import ModuleType
-from typing import Any, Callable, Dict, List, Optional
-
+from types import CodeType, ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from . import error_log, metrics
+from .constants import (  # pylint: disable=unused-import
+    ERROR_TYPE_RULE,
+    ERROR_TYPE_SCHEDULED_RULE,
+    TYPE_RULE,
+    TYPE_SCHEDULED_RULE,
+)
+from .destinations import DestinationResolver, as_resolver
 from .detection import (
     BaseImporter,
+    BatchResult,
+    DedupGroup,
     DetectionResult,
     FilesystemImporter,
+    LazyDetectionResult,
     RawStringImporter,
+    compact_exception,
 )
 from .enriched_event import PantherEvent
-from .exceptions import FunctionReturnTypeError, UnknownDestinationError
+from .exceptions import (
+    FunctionReturnTypeError,
+    SizeLimitExceededError,
+    UnknownDestinationError,
+)
+from .profiler import KIND_DETECTION, measure_import
+from .serialization import TRUNCATED_STRING_SUFFIX, BoundedJSONEncoder
 
 # Temporary alias for compatibility
 get_logger = logging.getLogger
 
-TYPE_RULE = "RULE"
-TYPE_SCHEDULED_RULE = "SCHEDULED_RULE"
-
-ERROR_TYPE_RULE = "RULE_ERROR"
-ERROR_TYPE_SCHEDULED_RULE = "SCHEDULED_RULE_ERROR"
-
 _DETECTION_FOLDER = os.path.join(tempfile.gettempdir(), "detections")
 
 # Maximum size for a dedup string
@@ -61,13 +74,18 @@ MAX_ALERT_CONTEXT_SIZE = 200 * 1024  # 200kb
 
 ALERT_CONTEXT_ERROR_KEY = "_error"
 
-TRUNCATED_STRING_SUFFIX = "... (truncated)"
-
 DEFAULT_DETECTION_DEDUP_PERIOD_MINS = 60
 
+# Maximum number of events kept in a group of duplicate alerts
+DEFAULT_DEDUP_SAMPLES = 10
+
 # Used to check dynamic severity output
 SEVERITY_TYPES = ["INFO", "LOW", "MEDIUM", "HIGH", "CRITICAL"]
 
+# Error types of the logged auxiliary function outputs, which don't raise an exception
+_TRUNCATED = "Truncated"
+_INVALID_SEVERITY = "InvalidSeverity"
+
 ALERT_CONTEXT_FUNCTION = "alert_context"
 DEDUP_FUNCTION = "dedup"
 DESCRIPTION_FUNCTION = "description"
@@ -77,6 +95,30 @@ RUNBOOK_FUNCTION = "runbook"
 SEVERITY_FUNCTION = "severity"
 TITLE_FUNCTION = "title"
 
+# The order in which the auxiliary functions run, dedup falls back to the title
+_AUXILIARY_EVALUATION_ORDER = (
+    TITLE_FUNCTION,
+    DESCRIPTION_FUNCTION,
+    REFERENCE_FUNCTION,
+    SEVERITY_FUNCTION,
+    RUNBOOK_FUNCTION,
+    DESTINATIONS_FUNCTION,
+    DEDUP_FUNCTION,
+    ALERT_CONTEXT_FUNCTION,
+)
+
+# Return types expected from the auxiliary functions, a list allows None
+_AUXILIARY_RETURN_TYPES: Dict[str, Any] = {
+    ALERT_CONTEXT_FUNCTION: Mapping,
+    DEDUP_FUNCTION: str,
+    DESCRIPTION_FUNCTION: str,
+    DESTINATIONS_FUNCTION: list(),
+    REFERENCE_FUNCTION: str,
+    RUNBOOK_FUNCTION: str,
+    SEVERITY_FUNCTION: str,
+    TITLE_FUNCTION: str,
+}
+
 # Auxiliary functions are optional
 AUXILIARY_FUNCTIONS = (
     ALERT_CONTEXT_FUNCTION,
@@ -95,7 +137,14 @@ class Detection(ABC):
     """Panther detection metadata and imported module."""
 
     # pylint: disable=too-many-branches,too-many-statements
-    def __init__(self, config: Mapping):
+    def __init__(
+            self,
+            config: Mapping,
+            code: Optional[CodeType] = None,
+            lazy: bool = False,
+            timeout: Optional[float] = None,
+            truncate_alert_context: bool = False,
+    ):
         """Create new detection from a dict.
         Args:
             config: Dictionary that we expect to have the following keys:
@@ -106,6 +155,14 @@ class Detection(ABC):
                 (Optional) path: The detection module path
                 (Optional) dedupPeriodMinutes: The period during which
                 the events will be deduplicated
+            code: (Optional) code object already compiled from the body
+            lazy: Whether to defer loading the detection module until
+                the first run or an explicit prewarm
+            timeout: (Optional) seconds each call to the rule and auxiliary
+                functions may take before raising DetectionTimeoutError
+            truncate_alert_context: Whether to cut the strings and containers of an
+                alert context that don't fit in MAX_ALERT_CONTEXT_SIZE, instead of
+                replacing the whole context with an error
         """
         self.logger = get_logger()
 
@@ -160,36 +217,137 @@ class Detection(ABC):
 
         self.detection_suppressions = config.get("suppressions", [])
 
+        # Log types of the events a rule analyzes, resource types of the resources a policy analyzes
+        self.detection_log_types: List[str] = list(config.get("LogTypes") or [])
+        self.detection_resource_types: List[str] = list(config.get("ResourceTypes") or [])
+
         self._setup_exception = None
+        self._timeout = timeout
+        self.truncate_alert_context = truncate_alert_context
+        self._module: Optional[ModuleType] = None
+        # The module and metrics recorder the functions below were resolved with
+        self._bound_module: Optional[ModuleType] = None
+        self._bound_recorder: Optional[metrics.MetricsRecorder] = None
+        self._matcher: Callable[[Mapping], Any] = self._resolve_matcher
+        self._auxiliary_functions: Dict[str, Optional[Callable[[Mapping], Any]]] = {}
+        self._auxiliary_function_definitions: Dict[str, bool] = dict.fromkeys(
+            AUXILIARY_FUNCTIONS, False
+        )
+        # Whether the definitions above were given before the module is loaded
+        self._definitions_provided = False
+        self._default_dedup_string = "defaultDedupString:{}".format(self.detection_id)
+        # The config and code are only retained until the module is loaded
+        self._pending_load: Optional[Tuple[Mapping, Optional[CodeType]]] = (config, code)
+        if not lazy:
+            self._load()
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """The seconds each call to the rule and auxiliary functions may take, None if unbounded"""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, seconds: Optional[float]) -> None:
+        self._timeout = seconds
+        if self._bound_module is not None:
+            self._bind_functions()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the detection module has been loaded (or failed to load)"""
+        return self._pending_load is None
+
+    @property
+    def pending_body(self) -> Optional[str]:
+        """The source code of the detection until its module is loaded,
+        None once loaded or if the module is loaded from a path"""
+        if self._pending_load is None:
+            return None
+        return self._pending_load[0].get("body") or None
+
+    @property
+    def defined_functions(self) -> Dict[str, bool]:
+        """Whether the detection module defines each auxiliary function.
+        Loads the module if loading was deferred, unless the definitions were provided"""
+        if self._pending_load is not None and not self._definitions_provided:
+            self._load()
+        return dict(self._auxiliary_function_definitions)
+
+    @defined_functions.setter
+    def defined_functions(self, definitions: Mapping[str, bool]) -> None:
+        """Provide the definitions of a detection that isn't loaded yet, e.g. from an archive
+        manifest. They're replaced by the ones of the module once it's loaded."""
+        if self._pending_load is None:
+            return
+        self._auxiliary_function_definitions = {
+            name: bool(definitions.get(name, False)) for name in AUXILIARY_FUNCTIONS
+        }
+        self._definitions_provided = True
+
+    def prewarm(self) -> None:
+        """Load the detection module, if loading was deferred"""
+        if self._pending_load is not None:
+            self._load()
+
+    def _load(self) -> None:
+        config, code = self._pending_load  # type: ignore
+        self._pending_load = None
         try:
-            self._module = self._load_detection(self.detection_id, config)
+            with measure_import(KIND_DETECTION, self.detection_id):
+                self._module = self._load_detection(self.detection_id, config, code)
             if not self._is_function_defined(self.matcher_function_name):
                 raise AssertionError(
                     f"detection needs to have a method named '{self.matcher_function_name}'"
                 )
         except Exception as err:  # pylint: disable=broad-except
-            self._setup_exception = err
+            self._setup_exception = compact_exception(err)
             return
 
-        self._default_dedup_string = "defaultDedupString:{}".format(self.detection_id)
+        self._bind_functions()
+
+    def _bind_functions(self) -> None:
+        """Resolve the module functions once, along with their return type checks"""
+        self._bound_module = self._module
+        self._bound_recorder = metrics.active_recorder()
+        try:
+            self._matcher = self._checked_command(self._matcher_command(), bool)
+        except AttributeError:
+            # Raise when running, as if the function was looked up for each event
+            self._matcher = self._checked_command(self._resolve_matcher, bool)
         self._auxiliary_function_definitions = self._check_defined_functions()
+        self._auxiliary_functions = {
+            name: self._checked_command(getattr(self._module, name), expected_type)
+            if self._auxiliary_function_definitions[name]
+            else None
+            for name, expected_type in _AUXILIARY_RETURN_TYPES.items()
+        }
+
+    def _needs_binding(self) -> bool:
+        """Whether the module was replaced or metrics were enabled or disabled since binding"""
+        return (
+                self._module is not self._bound_module
+                or self._bound_recorder is not metrics.active_recorder()
+        )
+
+    def _resolve_matcher(self, event: Mapping) -> Any:
+        return self._matcher_command()(event)
 
     @staticmethod
-    def _load_detection(identifier: str, config: Mapping) -> ModuleType:
+    def _load_detection(
+            identifier: str, config: Mapping, code: Optional[CodeType] = None
+    ) -> ModuleType:
         """Load the detection code as Python module.
         Code can be provided as raw string or a path in the local filesystem.
         """
         has_raw_code = bool(config.get("body"))
 
-        importer: Optional[BaseImporter] = None
         if has_raw_code:
-            resource = config["body"]
-            importer = RawStringImporter(tmp_dir=_DETECTION_FOLDER)
-        else:
-            resource = config["path"]
-            importer = FilesystemImporter()
+            return RawStringImporter(tmp_dir=_DETECTION_FOLDER).get_module(
+                identifier, config["body"], code
+            )
 
-        return importer.get_module(identifier, resource)
+        importer: BaseImporter = FilesystemImporter()
+        return importer.get_module(identifier, config["path"])
 
     def _check_defined_functions(self) -> Dict[str, bool]:
         function_definitions = {}
@@ -220,186 +378,287 @@ class Detection(ABC):
     def module(self) -> Any:
         """Used to expose the loaded python module to the engine,
         solely added in to support unit test mocking"""
+        self.prewarm()
         return self._module
 
+    @module.setter
+    def module(self, val: Any) -> None:
+        """Replace the module, e.g. with a mock, and resolve its functions again"""
+        self.prewarm()
+        self._module = val
+        self._bind_functions()
+
     @property
     def setup_exception(self) -> Any:
-        """Used to expose the setup exception to the engine"""
+        """Used to expose the setup exception to the engine.
+        Loads the detection module, if loading was deferred"""
+        self.prewarm()
         return self._setup_exception
 
     @setup_exception.setter
     def setup_exception(self, val: Any) -> Any:
         """Used by the engine to set _setup_exception"""
-        self._setup_exception = val
+        self._setup_exception = compact_exception(val)
 
-    def run(
-            self, event: Mapping, outputs: dict, outputs_names: dict, batch_mode: bool = True
+    def run(  # pylint: disable=too-many-arguments
+            self,
+            event: Mapping,
+            outputs: Union[DestinationResolver, dict],
+            outputs_names: Optional[dict] = None,
+            batch_mode: bool = True,
+            lazy_auxiliary: bool = False,
     ) -> DetectionResult:
         """
         Analyze a log line with this detection and return True, False, or an error.
         :param event: The event to run the detection against
-        :param outputs: Destinations loaded from the panther-outputs-api
-        :param outputs_names: Destinations mapped by their display name
+        :param outputs: Resolves the destinations, built once for the loaded outputs,
+        or the destinations loaded from the panther-outputs-api
+        :param outputs_names: Destinations mapped by their display name, if outputs
+        is not a DestinationResolver
         :param batch_mode: Whether the detection runs as part of the log analysis
         or as part of a simple detection test. In batch mode, title/dedup functions
         are not checked if the detection won't trigger an alert and also title()/dedup()
         won't raise exceptions, so that an alert won't be missed.
+        :param lazy_auxiliary: Whether to return a LazyDetectionResult, which only runs
+        the title/dedup/etc. functions when their output or exception is accessed
         """
-        detection_result = DetectionResult(
+        result_type = LazyDetectionResult if lazy_auxiliary else DetectionResult
+        detection_result = result_type(
             detection_id=self.detection_id,
             detection_severity=self.detection_severity,
             detection_type=self.detection_type,
             # set default to not alert
             trigger_alert=False,
         )
+        if self._pending_load is not None:
+            self._load()
         # If there was an error setting up the detection
         # return early
         if self._setup_exception:
             detection_result.setup_exception = self._setup_exception
             return detection_result
+        if self._needs_binding():
+            self._bind_functions()
 
         try:
-            detection_result.detection_output = self.matcher_function(event)
+            detection_result.detection_output = self._matcher(event)
         except Exception as err:  # pylint: disable=broad-except
-            detection_result.detection_exception = err
+            detection_result.detection_exception = compact_exception(err)
 
         detection_result.trigger_alert = (
                 detection_result.detection_output is self.matcher_alert_value
         )
+        if self._bound_recorder is not None:
+            self._bound_recorder.record_event(self.detection_id, detection_result.trigger_alert)
 
         if batch_mode and not detection_result.trigger_alert:
             # In batch mode (log analysis), there is no need to run the title/dedup functions
             # if the detection isn't going to trigger an alert
             return detection_result
 
-        try:
-            detection_result.title_defined = self._auxiliary_function_definitions[TITLE_FUNCTION]
-            if detection_result.title_defined:
-                detection_result.title_output = self._get_title(
-                    event,
-                    use_default_on_exception=batch_mode,
-                )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.title_exception = err
-
-        try:
-            detection_result.description_defined = self._auxiliary_function_definitions[
-                DESCRIPTION_FUNCTION
-            ]
-            if detection_result.description_defined:
-                detection_result.description_output = self._get_description(
-                    event,
-                    use_default_on_exception=batch_mode,
-                )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.description_exception = err
+        self._run_auxiliary_functions(
+            detection_result, event, as_resolver(outputs, outputs_names), batch_mode
+        )
+        return detection_result
 
-        try:
-            detection_result.reference_defined = self._auxiliary_function_definitions[
-                REFERENCE_FUNCTION
-            ]
-            if detection_result.reference_defined:
-                detection_result.reference_output = self._get_reference(
-                    event,
-                    use_default_on_exception=batch_mode,
+    def run_batch(  # pylint: disable=too-many-arguments,too-many-locals
+            self,
+            events: Iterable[Mapping],
+            outputs: Union[DestinationResolver, dict],
+            outputs_names: Optional[dict] = None,
+            *,
+            group_duplicates: bool = False,
+            max_samples: int = DEFAULT_DEDUP_SAMPLES,
+            skip_duplicate_auxiliary: bool = False,
+    ) -> BatchResult:
+        """
+        Analyze a batch of log lines with this detection, as run() does in batch mode.
+        The matcher function is resolved once for the whole batch and a DetectionResult
+        is only created for the events that trigger an alert or raise an error.
+        :param events: The events to run the detection against
+        :param outputs: Resolves the destinations, or the destinations loaded
+        from the panther-outputs-api
+        :param outputs_names: Destinations mapped by their display name, if outputs
+        is not a DestinationResolver
+        :param group_duplicates: Whether to collapse the alerts with the same dedup string
+        into a DedupGroup, keeping only the result of the first one
+        :param max_samples: The maximum number of events kept in a group
+        :param skip_duplicate_auxiliary: Whether to only run the functions the dedup string
+        depends on for duplicate alerts, instead of all the auxiliary functions
+        """
+        batch_result = BatchResult(
+            detection_id=self.detection_id,
+            detection_severity=self.detection_severity,
+            detection_type=self.detection_type,
+        )
+        if self._pending_load is not None:
+            self._load()
+        if self._setup_exception:
+            batch_result.setup_exception = self._setup_exception
+            return batch_result
+        if self._needs_binding():
+            self._bind_functions()
+
+        matcher = self._matcher
+        alert_value = self.matcher_alert_value
+        recorder = self._bound_recorder
+        resolver = as_resolver(outputs, outputs_names)
+        results = batch_result.results
+        groups = batch_result.groups
+        if not group_duplicates:
+            dedup_functions: Tuple[str, ...] = ()
+        elif not skip_duplicate_auxiliary:
+            dedup_functions = _AUXILIARY_EVALUATION_ORDER
+        elif self._auxiliary_function_definitions[DEDUP_FUNCTION]:
+            dedup_functions = (DEDUP_FUNCTION,)
+        else:
+            # The dedup string falls back to the title
+            dedup_functions = (TITLE_FUNCTION, DEDUP_FUNCTION)
+        remaining_functions = tuple(
+            name for name in _AUXILIARY_EVALUATION_ORDER if name not in dedup_functions
+        )
+        index = -1
+        for index, event in enumerate(events):
+            try:
+                output = matcher(event)
+            except Exception as err:  # pylint: disable=broad-except
+                if recorder is not None:
+                    recorder.record_event(self.detection_id, False)
+                results[index] = DetectionResult(
+                    detection_id=self.detection_id,
+                    detection_severity=self.detection_severity,
+                    detection_type=self.detection_type,
+                    trigger_alert=False,
+                    detection_exception=compact_exception(err),
                 )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.reference_exception = err
-
-        try:
-            detection_result.severity_defined = self._auxiliary_function_definitions[
-                SEVERITY_FUNCTION
-            ]
-            if detection_result.severity_defined:
-                detection_result.severity_output = self._get_severity(
-                    event,
-                    use_default_on_exception=batch_mode,
+                continue
+            if recorder is not None:
+                recorder.record_event(self.detection_id, output is alert_value)
+            if output is not alert_value:
+                continue
+            detection_result = DetectionResult(
+                detection_id=self.detection_id,
+                detection_severity=self.detection_severity,
+                detection_type=self.detection_type,
+                trigger_alert=True,
+                detection_output=output,
+            )
+            if not group_duplicates:
+                self._run_auxiliary_functions(detection_result, event, resolver, batch_mode=True)
+                results[index] = detection_result
+                continue
+
+            for name in dedup_functions:
+                self._run_auxiliary_function(
+                    detection_result, name, event, resolver, batch_mode=True
                 )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.severity_exception = err
-
-        try:
-            detection_result.runbook_defined = self._auxiliary_function_definitions[
-                RUNBOOK_FUNCTION
-            ]
-            if detection_result.runbook_defined:
-                detection_result.runbook_output = self._get_runbook(
-                    event,
-                    use_default_on_exception=batch_mode,
+            dedup_output = detection_result.dedup_output or self._default_dedup_string
+            group = groups.get(dedup_output)
+            if group is not None:
+                group.add(index, event, max_samples)
+                continue
+            for name in remaining_functions:
+                self._run_auxiliary_function(
+                    detection_result, name, event, resolver, batch_mode=True
                 )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.runbook_exception = err
+            groups[dedup_output] = DedupGroup(
+                dedup_output=dedup_output,
+                result=detection_result,
+                first_index=index,
+                first_event=event,
+                last_index=index,
+                last_event=event,
+                samples=[event][:max_samples],
+            )
+            results[index] = detection_result
+        batch_result.events_evaluated = index + 1
+        return batch_result
 
-        try:
-            detection_result.destinations_defined = self._auxiliary_function_definitions[
-                DESTINATIONS_FUNCTION
-            ]
-            if detection_result.destinations_defined:
-                detection_result.destinations_output = self._get_destinations(
-                    event,
-                    outputs,
-                    outputs_names,
-                    use_default_on_exception=batch_mode,
+    def _run_auxiliary_functions(
+            self,
+            detection_result: DetectionResult,
+            event: Mapping,
+            resolver: DestinationResolver,
+            batch_mode: bool,
+    ) -> None:
+        if isinstance(detection_result, LazyDetectionResult):
+            detection_result.defer(
+                functools.partial(
+                    self._run_auxiliary_function,
+                    event=event,
+                    resolver=resolver,
+                    batch_mode=batch_mode,
                 )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.destinations_exception = err
+            )
+            return
+        for name in _AUXILIARY_EVALUATION_ORDER:
+            self._run_auxiliary_function(detection_result, name, event, resolver, batch_mode)
 
+    def _run_auxiliary_function(  # pylint: disable=too-many-arguments
+            self,
+            detection_result: DetectionResult,
+            name: str,
+            event: Mapping,
+            resolver: DestinationResolver,
+            batch_mode: bool,
+    ) -> None:
         try:
-            detection_result.dedup_defined = self._auxiliary_function_definitions[DEDUP_FUNCTION]
-            if not detection_result.dedup_defined:
-                detection_result.dedup_output = self._get_dedup_fallback(
-                    detection_result.title_output
+            defined = self._auxiliary_function_definitions[name]
+            setattr(detection_result, name + "_defined", defined)
+            # A string, or a list of destinations
+            output: Union[str, List[str], None]
+            if name == DEDUP_FUNCTION and not defined:
+                output = self._get_dedup_fallback(detection_result.title_output)
+            elif not defined:
+                return
+            elif name == DESTINATIONS_FUNCTION:
+                output = self._get_destinations(
+                    event, resolver, use_default_on_exception=batch_mode
                 )
             else:
-                detection_result.dedup_output = self._get_dedup(
-                    event,
-                    use_default_on_exception=batch_mode,
-                )
+                getter = getattr(self, "_get_" + name)
+                output = getter(event, use_default_on_exception=batch_mode)
+            setattr(detection_result, name + "_output", output)
         except Exception as err:  # pylint: disable=broad-except
-            detection_result.dedup_exception = err
-
-        try:
-            detection_result.alert_context_defined = self._auxiliary_function_definitions[
-                ALERT_CONTEXT_FUNCTION
-            ]
-            if detection_result.alert_context_defined:
-                detection_result.alert_context_output = self._get_alert_context(
-                    event,
-                    use_default_on_exception=batch_mode,
-                )
-        except Exception as err:  # pylint: disable=broad-except
-            detection_result.alert_context_exception = err
-
-        return detection_result
+            setattr(detection_result, name + "_exception", compact_exception(err))
 
     def _get_alert_context(
             self, event: Mapping, use_default_on_exception: bool = True
     ) -> Optional[str]:
 
+        # Stops serializing as soon as the output grows past the maximum size
+        encoder = BoundedJSONEncoder(
+            MAX_ALERT_CONTEXT_SIZE,
+            truncate=self.truncate_alert_context,
+            default=PantherEvent.json_encoder,
+        )
         try:
-            command = getattr(self._module, ALERT_CONTEXT_FUNCTION)
-            alert_context = self._run_command(command, event, Mapping)
-            serialized_alert_context = json.dumps(alert_context, default=PantherEvent.json_encoder)
+            alert_context = self._auxiliary_functions[ALERT_CONTEXT_FUNCTION](event)  # type: ignore
+            try:
+                return encoder.encode(alert_context)
+            except SizeLimitExceededError:
+                # Too big, or with truncate, not even the truncated context fits
+                pass
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
                 return json.dumps({ALERT_CONTEXT_ERROR_KEY: repr(err)})
             raise
 
-        if len(serialized_alert_context) > MAX_ALERT_CONTEXT_SIZE:
-            # If context exceeds max size, return empty one
-            alert_context_error = (
-                "alert_context size is [{}] characters,"
-                " bigger than maximum of [{}] characters".format(
-                    len(serialized_alert_context), MAX_ALERT_CONTEXT_SIZE
-                )
-            )
-            return json.dumps({ALERT_CONTEXT_ERROR_KEY: alert_context_error})
-
-        return serialized_alert_context
+        # If context exceeds max size, return empty one
+        alert_context_error = (
+            f"alert_context size is bigger than maximum of [{MAX_ALERT_CONTEXT_SIZE}] characters"
+        )
+        return json.dumps({ALERT_CONTEXT_ERROR_KEY: alert_context_error})
 
     # Returns the dedup string for this detection match
     # If the detection match had a custom title, use the title as a deduplication string
     # If no title and no dedup function is defined, return the default dedup string.
+    def _log_sampled(self, function_name: str, error_type: str, msg: str, *args: Any) -> None:
+        # Called for every event, so that only a sample of the occurrences is logged
+        error_log.get_sampler().log(
+            self.logger, self.detection_id, function_name, error_type, msg, *args
+        )
+
     def _get_dedup(
             self,
             event: Mapping,
@@ -407,11 +666,12 @@ class Detection(ABC):
     ) -> str:
 
         try:
-            command = getattr(self._module, DEDUP_FUNCTION)
-            dedup_string = self._run_command(command, event, str)
+            dedup_string = self._auxiliary_functions[DEDUP_FUNCTION](event)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    DEDUP_FUNCTION,
+                    type(err).__name__,
                     "dedup method raised exception. "
                     'Defaulting dedup string to "%s". Exception: %s',
                     self.detection_id,
@@ -426,7 +686,9 @@ class Detection(ABC):
 
         if len(dedup_string) > MAX_DEDUP_STRING_SIZE:
             # If dedup_string exceeds max size, truncate it
-            self.logger.info(
+            self._log_sampled(
+                DEDUP_FUNCTION,
+                _TRUNCATED,
                 "maximum dedup string size is [%d] characters. "
                 "Dedup string for detection with ID [%s] is [%d] characters. Truncating.",
                 MAX_DEDUP_STRING_SIZE,
@@ -451,11 +713,12 @@ class Detection(ABC):
     ) -> Optional[str]:
 
         try:
-            command = getattr(self._module, DESCRIPTION_FUNCTION)
-            description = self._run_command(command, event, str)
+            description = self._auxiliary_functions[DESCRIPTION_FUNCTION](event)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    DESCRIPTION_FUNCTION,
+                    type(err).__name__,
                     "description method for detection with id [%s] raised exception. "
                     "Using default Exception: %s",
                     self.detection_id,
@@ -466,7 +729,9 @@ class Detection(ABC):
 
         if len(description) > MAX_GENERATED_FIELD_SIZE:
             # If generated field exceeds max size, truncate it
-            self.logger.info(
+            self._log_sampled(
+                DESCRIPTION_FUNCTION,
+                _TRUNCATED,
                 "maximum field [description] length is [%d]. "
                 "[%d] for detection with ID [%s] . Truncating.",
                 MAX_GENERATED_FIELD_SIZE,
@@ -477,19 +742,22 @@ class Detection(ABC):
             return description[:num_characters_to_keep] + TRUNCATED_STRING_SUFFIX
         return description
 
-    def _get_destinations(  # pylint: disable=too-many-return-statements,too-many-arguments
+    def _get_destinations(  # pylint: disable=too-many-return-statements
             self,
             event: Mapping,
-            outputs: dict,
-            outputs_display_names: dict,
+            resolver: DestinationResolver,
             use_default_on_exception: bool = True,
     ) -> Optional[List[str]]:
         try:
-            command = getattr(self._module, DESTINATIONS_FUNCTION)
-            destinations = self._run_command(command, event, list())
+            destinations = self._auxiliary_functions[DESTINATIONS_FUNCTION](event)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info("destinations method raised exception. Exception: %s", err)
+                self._log_sampled(
+                    DESTINATIONS_FUNCTION,
+                    type(err).__name__,
+                    "destinations method raised exception. Exception: %s",
+                    err,
+                )
                 return None
             raise
         # Return early if destinations returned None
@@ -500,30 +768,14 @@ class Detection(ABC):
         if len(destinations) == 0:
             return ["SKIP"]
 
-        # Check for (in)valid destinations
-        invalid_destinations = []
-        standardized_destinations: List[str] = []
-
-        # Standardize the destinations
-        for each_destination in destinations:
-            # case for valid display name
-            if (
-                    each_destination in outputs_display_names
-                    and outputs_display_names[each_destination].destination_id
-                    not in standardized_destinations
-            ):
-                standardized_destinations.append(
-                    outputs_display_names[each_destination].destination_id
-                )
-            # case for valid UUIDv4
-            elif each_destination in outputs and each_destination not in standardized_destinations:
-                standardized_destinations.append(each_destination)
-            else:
-                invalid_destinations.append(each_destination)
+        # Standardize display names and ids to ids, and check for invalid destinations
+        standardized_destinations, invalid_destinations = resolver.resolve(destinations)
 
         if invalid_destinations:
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    DESTINATIONS_FUNCTION,
+                    UnknownDestinationError.__name__,
                     "destinations method yielded invalid destinations: %s",
                     str(invalid_destinations),
                 )
@@ -535,7 +787,9 @@ class Detection(ABC):
 
         if len(standardized_destinations) > MAX_DESTINATIONS_SIZE:
             # If generated field exceeds max size, truncate it
-            self.logger.info(
+            self._log_sampled(
+                DESTINATIONS_FUNCTION,
+                _TRUNCATED,
                 "maximum len of destinations [%d] for detection with ID "
                 "[%s] is [%d] fields. Truncating.",
                 MAX_DESTINATIONS_SIZE,
@@ -550,11 +804,12 @@ class Detection(ABC):
     ) -> Optional[str]:
 
         try:
-            command = getattr(self._module, REFERENCE_FUNCTION)
-            reference = self._run_command(command, event, str)
+            reference = self._auxiliary_functions[REFERENCE_FUNCTION](event)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    REFERENCE_FUNCTION,
+                    type(err).__name__,
                     "reference method for detection with id [%s] raised exception. "
                     "Using default. Exception: %s",
                     self.detection_id,
@@ -565,7 +820,9 @@ class Detection(ABC):
 
         if len(reference) > MAX_GENERATED_FIELD_SIZE:
             # If generated field exceeds max size, truncate it
-            self.logger.info(
+            self._log_sampled(
+                REFERENCE_FUNCTION,
+                _TRUNCATED,
                 "maximum field [reference] length is [%d]. "
                 "[%d] for detection with ID [%s] . Truncating.",
                 MAX_GENERATED_FIELD_SIZE,
@@ -579,11 +836,12 @@ class Detection(ABC):
     def _get_runbook(self, event: Mapping, use_default_on_exception: bool = True) -> Optional[str]:
 
         try:
-            command = getattr(self._module, RUNBOOK_FUNCTION)
-            runbook = self._run_command(command, event, str)
+            runbook = self._auxiliary_functions[RUNBOOK_FUNCTION](event)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    RUNBOOK_FUNCTION,
+                    type(err).__name__,
                     "runbook method for detection with id [%s] raised exception. "
                     "Using default. Exception: %s",
                     self.detection_id,
@@ -594,7 +852,9 @@ class Detection(ABC):
 
         if len(runbook) > MAX_GENERATED_FIELD_SIZE:
             # If generated field exceeds max size, truncate it
-            self.logger.info(
+            self._log_sampled(
+                RUNBOOK_FUNCTION,
+                _TRUNCATED,
                 "maximum field [runbook] length is [%d]. [%d] for detection with ID [%s]. "
                 "Truncating.",
                 MAX_GENERATED_FIELD_SIZE,
@@ -608,10 +868,11 @@ class Detection(ABC):
     def _get_severity(self, event: Mapping, use_default_on_exception: bool = True) -> Optional[str]:
 
         try:
-            command = getattr(self._module, SEVERITY_FUNCTION)
-            severity = self._run_command(command, event, str).upper()
+            severity = self._auxiliary_functions[SEVERITY_FUNCTION](event).upper()  # type: ignore
             if severity not in SEVERITY_TYPES:
-                self.logger.info(
+                self._log_sampled(
+                    SEVERITY_FUNCTION,
+                    _INVALID_SEVERITY,
                     "severity method for detection with id [%s] yielded [%s], expected [%s]",
                     self.detection_id,
                     severity,
@@ -623,7 +884,9 @@ class Detection(ABC):
                 )
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    SEVERITY_FUNCTION,
+                    type(err).__name__,
                     "severity method for detection with id [%s] raised exception. "
                     "Using default (%s). Exception: %s",
                     self.detection_id,
@@ -637,11 +900,12 @@ class Detection(ABC):
     def _get_title(self, event: Mapping, use_default_on_exception: bool) -> Optional[str]:
 
         try:
-            command = getattr(self._module, TITLE_FUNCTION)
-            title = self._run_command(command, event, str)
+            title = self._auxiliary_functions[TITLE_FUNCTION](event)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             if use_default_on_exception:
-                self.logger.info(
+                self._log_sampled(
+                    TITLE_FUNCTION,
+                    type(err).__name__,
                     "title method for detection with id [%s] raised exception. "
                     "Using default. Exception: %s",
                     self.detection_id,
@@ -652,7 +916,9 @@ class Detection(ABC):
 
         if len(title) > MAX_GENERATED_FIELD_SIZE:
             # If generated field exceeds max size, truncate it
-            self.logger.info(
+            self._log_sampled(
+                TITLE_FUNCTION,
+                _TRUNCATED,
                 "maximum field [title] length is [%d]. "
                 "[%d] for detection with ID [%s] . Truncating.",
                 MAX_GENERATED_FIELD_SIZE,
@@ -663,33 +929,70 @@ class Detection(ABC):
             return title[:num_characters_to_keep] + TRUNCATED_STRING_SUFFIX
         return title
 
-    def _run_command(self, function: Callable, event: Mapping, expected_type: Any) -> Any:
-        result = function(event)
+    def _checked_command(self, function: Callable, expected_type: Any) -> Callable[[Mapping], Any]:
+        """Wrap the function with a check of its return type, a list allows None.
+        The calls are timed out and instrumented, if enabled."""
+        detection_id = self.detection_id
+        function_name = getattr(function, "__name__", repr(function))
+        if self._timeout is not None:
+            # Imports signal, only needed once a timeout is set
+            # pylint: disable-next=import-outside-toplevel
+            from .timeout import call_with_timeout
+
+            function = functools.partial(
+                call_with_timeout,
+                function,
+                seconds=self._timeout,
+                description="detection [{}] function [{}] after [{}] seconds".format(
+                    detection_id, function_name, self._timeout
+                ),
+            )
+
         # Branch in case of list
         if not isinstance(expected_type, list):
-            if not isinstance(result, expected_type):
-                raise FunctionReturnTypeError(
-                    "detection [{}] function [{}] returned [{}], expected [{}]".format(
-                        self.detection_id,
-                        function.__name__,
-                        type(result).__name__,
-                        expected_type.__name__,
+
+            def command(event: Mapping) -> Any:
+                result = function(event)
+                if not isinstance(result, expected_type):
+                    raise FunctionReturnTypeError(
+                        "detection [{}] function [{}] returned [{}], expected [{}]".format(
+                            detection_id,
+                            function_name,
+                            type(result).__name__,
+                            expected_type.__name__,
+                        )
                     )
-                )
-        else:
-            if result is None:
                 return result
-            if not isinstance(result, list) or not all(isinstance(x, (str, bool)) for x in result):
-                raise FunctionReturnTypeError(
-                    "detection [{}] function [{}] returned [{}], expected a list".format(
-                        self.detection_id, function.__name__, type(result).__name__
+
+            checked_command = command
+        else:
+
+            def list_command(event: Mapping) -> Any:
+                result = function(event)
+                if result is None:
+                    return result
+                if not isinstance(result, list) or not all(
+                        isinstance(x, (str, bool)) for x in result
+                ):
+                    raise FunctionReturnTypeError(
+                        "detection [{}] function [{}] returned [{}], expected a list".format(
+                            detection_id, function_name, type(result).__name__
+                        )
                     )
-                )
-        return result
+                return result
+
+            checked_command = list_command
+
+        if self._bound_recorder is not None:
+            return self._bound_recorder.instrument(detection_id, function_name, checked_command)
+        return checked_command
 
     def _is_function_defined(self, name: str) -> bool:
         return hasattr(self._module, name)
 
+    def _matcher_command(self) -> Callable[[Mapping], Any]:
+        return getattr(self._module, self.matcher_function_name)
+
 
 class Rule(Detection):
     """Panther rule metadata and imported module."""
@@ -706,9 +1009,17 @@ class Rule(Detection):
     def matcher_function(self, event: Mapping) -> bool:
         # for scheduled rules the rule function is optional,
         # defaults to True and will pass the events thru
+        if self._needs_binding():
+            self._bind_functions()
+        return self._matcher(event)
+
+    def _matcher_command(self) -> Callable[[Mapping], Any]:
         if self.detection_type == TYPE_SCHEDULED_RULE and not hasattr(
                 self._module, self.matcher_function_name
         ):
-            return True
-        command = getattr(self._module, self.matcher_function_name)
-        return self._run_command(command, event, bool)
+            return _match_all
+        return getattr(self._module, self.matcher_function_name)
+
+
+def _match_all(_: Mapping) -> bool:
+    return True
@@ -0,0 +1,313 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .destinations import DestinationResolver, as_resolver
+from .detection import DetectionResult
+from .engine import LOG_TYPE_FIELD, DetectionEngine
+from .rule import SEVERITY_TYPES, Detection
+
+# Severities of the detections that can be deferred under overload, the least severe first
+DEFAULT_SHED_SEVERITIES = ("INFO", "LOW")
+
+# Percentile of the observed latencies from which a detection is expensive enough to be deferred
+DEFAULT_SHED_PERCENTILE = 0.5
+
+# Fraction of the SLO a batch runs past it before the next shed severity is deferred too
+DEFAULT_SHED_STEP_RATIO = 0.1
+
+# The number of events between two updates of the evaluation order
+DEFAULT_REORDER_INTERVAL = 1024
+
+# Weight of the latest observation in the moving averages
+DEFAULT_SMOOTHING = 0.1
+
+_SEVERITY_RANKS = {severity: rank for rank, severity in enumerate(SEVERITY_TYPES)}
+
+# Detections without a known severity are ranked as critical, so that they're never shed
+_UNKNOWN_SEVERITY_RANK = len(SEVERITY_TYPES) - 1
+
+_NANOSECONDS = 1e9
+
+# Returned by _shed_max_rank when no severity is deferred
+_NOT_SHEDDING = -1
+
+
+def severity_rank(detection: Detection) -> int:
+    """Returns the rank of the detection severity, higher is more severe"""
+    severity = detection.detection_severity
+    if not isinstance(severity, str):
+        return _UNKNOWN_SEVERITY_RANK
+    return _SEVERITY_RANKS.get(severity.upper(), _UNKNOWN_SEVERITY_RANK)
+
+
+@dataclass
+class DeferredEvaluation:
+    """A detection that wasn't run against an event to keep up with the latency SLO"""
+
+    event_index: int
+    detection_id: str
+    detection_severity: Optional[str]
+    # The observed average latency of the detection
+    estimated_seconds: float
+
+
+@dataclass
+class ScheduledBatchResult:
+    """The results of the detections that ran against each event of a batch"""
+
+    results: List[List[DetectionResult]] = field(default_factory=list)
+    deferred: List[DeferredEvaluation] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def overloaded(self) -> bool:
+        """Whether evaluations were deferred"""
+        return bool(self.deferred)
+
+
+class _Cost:  # pylint: disable=too-few-public-methods
+    __slots__ = ("latency", "match_rate")
+
+    def __init__(self, latency: float, match_rate: float):
+        self.latency = latency
+        self.match_rate = match_rate
+
+
+class DetectionScheduler:
+    """Runs the rules routed by a DetectionEngine, most valuable first.
+
+    The rules of an event are ordered by severity, then by their observed match rate
+    and latency, tracked as moving averages. If a batch runs past its latency SLO,
+    the rest of the batch is evaluated in overload mode: expensive rules of the least
+    severe shed severity are deferred and reported in the batch result, so that they
+    can be retried or accounted for. Every shed_step_seconds the batch runs further
+    past its SLO, the rules of the next shed severity are deferred too.
+
+    A rule is expensive if its average latency is at least shed_min_seconds or,
+    by default, the shed_percentile of the average latencies observed.
+    Rules that haven't run yet have no observed latency and are never deferred.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        engine: DetectionEngine,
+        *,
+        slo_seconds: Optional[float] = None,
+        shed_severities: Iterable[str] = DEFAULT_SHED_SEVERITIES,
+        shed_min_seconds: Optional[float] = None,
+        shed_percentile: float = DEFAULT_SHED_PERCENTILE,
+        shed_step_seconds: Optional[float] = None,
+        reorder_interval: int = DEFAULT_REORDER_INTERVAL,
+        smoothing: float = DEFAULT_SMOOTHING,
+    ):
+        """
+        Args:
+            engine: Routes the events to the rules
+            slo_seconds: The latency objective of a batch, None to never shed
+            shed_severities: The severities of the rules that can be deferred
+            shed_min_seconds: The average latency from which a rule can be deferred,
+                None to derive it from shed_percentile
+            shed_percentile: The percentile of the observed latencies from which
+                a rule can be deferred, between 0 and 1
+            shed_step_seconds: The delay past the SLO after which the next severity
+                is deferred too, defaults to DEFAULT_SHED_STEP_RATIO of the SLO
+            reorder_interval: The number of events between two updates of the order
+            smoothing: Weight of the latest observation in the moving averages
+        """
+        self.engine = engine
+        self.slo_seconds = slo_seconds
+        self.shed_severities = frozenset(severity.upper() for severity in shed_severities)
+        self.shed_min_seconds = shed_min_seconds
+        self.shed_percentile = shed_percentile
+        if shed_step_seconds is None and slo_seconds is not None:
+            shed_step_seconds = slo_seconds * DEFAULT_SHED_STEP_RATIO
+        self.shed_step_seconds = shed_step_seconds
+        self.reorder_interval = reorder_interval
+        self.smoothing = smoothing
+        # The ranks of the shed severities, in the order they're deferred
+        self._shed_ranks = sorted(
+            _SEVERITY_RANKS[severity]
+            for severity in self.shed_severities
+            if severity in _SEVERITY_RANKS
+        )
+        self._shed_threshold = float("inf")
+        self._costs: Dict[str, _Cost] = {}
+        self._priorities: Dict[str, Tuple[int, float, float]] = {}
+        # The rules of each log type in evaluation order, until the next reorder
+        self._orders: Dict[Optional[str], List[Detection]] = {}
+        self._events_since_reorder = 0
+
+    def estimated_cost(self, detection_id: str) -> Tuple[float, float]:
+        """Returns the average latency in seconds and the match rate observed for a detection"""
+        cost = self._costs.get(detection_id)
+        if cost is None:
+            return 0.0, 0.0
+        return cost.latency / _NANOSECONDS, cost.match_rate
+
+    def priority(self, detection: Detection) -> Tuple[int, float, float]:
+        """Returns the sort key of the detection, lower runs first"""
+        latency, match_rate = self.estimated_cost(detection.detection_id)
+        return -severity_rank(detection), -match_rate, latency
+
+    def reorder(self, detections: Iterable[Detection]) -> None:
+        """Update the evaluation order and the shed threshold from the costs observed so far"""
+        self._priorities = {
+            detection.detection_id: self.priority(detection) for detection in detections
+        }
+        self._orders = {}
+        self._update_shed_threshold()
+        self._events_since_reorder = 0
+
+    def order(self, rules: Sequence[Detection]) -> List[Detection]:
+        """Returns the rules in evaluation order"""
+        priorities = self._priorities
+        missing = [rule for rule in rules if rule.detection_id not in priorities]
+        for rule in missing:
+            priorities[rule.detection_id] = self.priority(rule)
+        return sorted(rules, key=lambda rule: priorities[rule.detection_id])
+
+    def _ordered(self, log_type: Optional[str], rules: Sequence[Detection]) -> List[Detection]:
+        # The rules routed to an event are all or part of the rules of its log type,
+        # so they're taken from the order sorted once per log type
+        all_rules = self.engine.rules_for(log_type)
+        if all_rules is self.engine.rules_for(None):
+            # Unknown log types share the wildcard rules
+            log_type = None
+        order = self._orders.get(log_type)
+        if order is None:
+            order = self._orders[log_type] = self.order(all_rules)
+        if len(rules) == len(all_rules):
+            return order
+        selected = set(rules)
+        return [rule for rule in order if rule in selected]
+
+    def _update_shed_threshold(self) -> None:
+        if self.shed_min_seconds is not None:
+            self._shed_threshold = self.shed_min_seconds * _NANOSECONDS
+            return
+        latencies = sorted(cost.latency for cost in self._costs.values())
+        if not latencies:
+            self._shed_threshold = float("inf")
+            return
+        position = min(len(latencies) - 1, int(self.shed_percentile * len(latencies)))
+        self._shed_threshold = latencies[position]
+
+    def _shed_max_rank(self, now: int, deadline: Optional[float]) -> int:
+        """Returns the rank of the most severe shed severity deferred at this point of the batch"""
+        if deadline is None or now <= deadline or not self._shed_ranks:
+            return _NOT_SHEDDING
+        last_level = len(self._shed_ranks) - 1
+        step = (self.shed_step_seconds or 0.0) * _NANOSECONDS
+        if step <= 0:
+            return self._shed_ranks[last_level]
+        return self._shed_ranks[min(last_level, int((now - deadline) // step))]
+
+    def _sheddable(self, rule: Detection, max_rank: int) -> bool:
+        if rule.detection_severity is None:
+            return False
+        if str(rule.detection_severity).upper() not in self.shed_severities:
+            return False
+        if severity_rank(rule) > max_rank:
+            return False
+        cost = self._costs.get(rule.detection_id)
+        return cost is not None and cost.latency >= self._shed_threshold
+
+    def _observe(self, detection_id: str, latency: int, matched: bool) -> None:
+        cost = self._costs.get(detection_id)
+        if cost is None:
+            self._costs[detection_id] = _Cost(float(latency), 1.0 if matched else 0.0)
+            return
+        smoothing = self.smoothing
+        cost.latency += smoothing * (latency - cost.latency)
+        cost.match_rate += smoothing * ((1.0 if matched else 0.0) - cost.match_rate)
+
+    def evaluate_batch(
+        self,
+        events: Sequence[Mapping],
+        outputs: Union[DestinationResolver, dict],
+        outputs_names: Optional[dict] = None,
+    ) -> ScheduledBatchResult:
+        """Run the rules routed to each event, deferring the low value ones
+        once the batch runs past its latency SLO"""
+        batch_result = ScheduledBatchResult()
+        resolver = as_resolver(outputs, outputs_names)
+        perf_counter_ns = time.perf_counter_ns
+        start = perf_counter_ns()
+        deadline = None if self.slo_seconds is None else start + self.slo_seconds * _NANOSECONDS
+        threshold_updated = False
+
+        for index, event in enumerate(events):
+            if self._events_since_reorder >= self.reorder_interval:
+                self.reorder(self._ordered_rules())
+            self._events_since_reorder += 1
+
+            max_rank = self._shed_max_rank(perf_counter_ns(), deadline)
+            if max_rank != _NOT_SHEDDING and not threshold_updated and self._costs:
+                # Account for the latencies observed since the last reorder
+                self._update_shed_threshold()
+                threshold_updated = True
+            batch_result.results.append(
+                self._evaluate_event(index, event, resolver, max_rank, batch_result.deferred)
+            )
+
+        batch_result.elapsed_seconds = (perf_counter_ns() - start) / _NANOSECONDS
+        return batch_result
+
+    def _evaluate_event(
+        self,
+        index: int,
+        event: Mapping,
+        resolver: DestinationResolver,
+        max_rank: int,
+        deferred: List[DeferredEvaluation],
+    ) -> List[DetectionResult]:
+        perf_counter_ns = time.perf_counter_ns
+        panther_event, rules = self.engine.route(event)
+        if not rules:
+            return []
+        results = []
+        for rule in self._ordered(event.get(LOG_TYPE_FIELD), rules):
+            if max_rank != _NOT_SHEDDING and self._sheddable(rule, max_rank):
+                deferred.append(
+                    DeferredEvaluation(
+                        event_index=index,
+                        detection_id=rule.detection_id,
+                        detection_severity=rule.detection_severity,
+                        estimated_seconds=self.estimated_cost(rule.detection_id)[0],
+                    )
+                )
+                continue
+            rule_start = perf_counter_ns()
+            result = rule.run(panther_event, resolver)
+            self._observe(rule.detection_id, perf_counter_ns() - rule_start, result.trigger_alert)
+            results.append(result)
+        return results
+
+    def _ordered_rules(self) -> List[Detection]:
+        seen = {}
+        for log_type in self.engine.log_types:
+            for rule in self.engine.rules_for(log_type):
+                seen[rule.detection_id] = rule
+        for rule in self.engine.rules_for(None):
+            seen[rule.detection_id] = rule
+        return list(seen.values())
@@ -0,0 +1,284 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, List, Optional
+
+from .exceptions import SizeLimitExceededError
+from .immutable import ImmutableContainerMixin
+
+TRUNCATED_STRING_SUFFIX = "... (truncated)"
+
+_INFINITY = float("inf")
+
+
+def _float_repr(value: float) -> str:
+    # Same representation of the special values as json.dumps
+    if value != value:  # pylint: disable=comparison-with-itself
+        return "NaN"
+    if value == _INFINITY:
+        return "Infinity"
+    if value == -_INFINITY:
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _bool_repr(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def _none_repr(_: None) -> str:
+    return "null"
+
+
+# Encoders of the values without nested elements, by exact type
+_LEAF_ENCODERS: Dict[type, Callable[[Any], str]] = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: _float_repr,
+    bool: _bool_repr,
+    type(None): _none_repr,
+}
+
+
+class BoundedJSONEncoder:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
+    """Serializes an object to the same JSON as json.dumps, stopping as soon as
+    the output grows past max_size characters instead of serializing it all.
+
+    Immutable containers are serialized natively instead of through the default callback.
+    With truncate, strings and containers that don't fit are cut instead:
+    a string keeps the prefix that fits, followed by TRUNCATED_STRING_SUFFIX,
+    and a list or dict keeps the elements that fit. `truncated` tells
+    whether anything was cut from the last output.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        max_size: int,
+        truncate: bool = False,
+        max_string_length: Optional[int] = None,
+        max_items: Optional[int] = None,
+        default: Optional[Callable[[Any], Any]] = None,
+    ):
+        """
+        Args:
+            max_size: The maximum number of characters of the output
+            truncate: Whether to cut what doesn't fit instead of raising SizeLimitExceededError
+            max_string_length: With truncate, the maximum number of characters of a string
+            max_items: With truncate, the maximum number of elements of a list or dict
+            default: Returns a serializable version of the objects JSON doesn't support
+        """
+        self.max_size = max_size
+        self.truncate = truncate
+        self.max_string_length = max_string_length
+        self.max_items = max_items
+        self.default = default
+        self.truncated = False
+        self._chunks: List[str] = []
+        self._size = 0
+        # Characters needed to close the containers being serialized
+        self._reserved = 0
+        self._markers: set = set()
+
+    def encode(self, obj: Any) -> str:
+        """Returns the JSON representation of the object
+
+        Raises:
+            SizeLimitExceededError: If the output is larger than max_size and can't be truncated
+            TypeError: If the object, or one of its elements, can't be serialized
+            ValueError: If the object contains a circular reference
+        """
+        self.truncated = False
+        self._chunks = []
+        self._size = 0
+        self._reserved = 0
+        self._markers = set()
+        try:
+            self._encode(obj)
+            return "".join(self._chunks)
+        finally:
+            self._chunks = []
+            self._markers = set()
+
+    def _write(self, chunk: str) -> None:
+        size = self._size + len(chunk)
+        if size + self._reserved > self.max_size:
+            raise SizeLimitExceededError(
+                f"output is bigger than maximum of [{self.max_size}] characters"
+            )
+        self._chunks.append(chunk)
+        self._size = size
+
+    def _rollback(self, chunks: int, size: int) -> None:
+        del self._chunks[chunks:]
+        self._size = size
+        self.truncated = True
+
+    def _encode(self, obj: Any) -> None:  # pylint: disable=too-many-return-statements
+        if isinstance(obj, str):
+            self._encode_str(obj)
+        elif obj is None:
+            self._write("null")
+        elif obj is True:
+            self._write("true")
+        elif obj is False:
+            self._write("false")
+        elif isinstance(obj, int):
+            self._write(int.__repr__(obj))
+        elif isinstance(obj, float):
+            self._write(_float_repr(obj))
+        elif isinstance(obj, (list, tuple)):
+            self._encode_list(obj)
+        elif isinstance(obj, dict):
+            self._encode_dict(obj)
+        elif isinstance(obj, ImmutableContainerMixin):
+            # The wrapped dict or tuple, without wrapping the nested containers
+            self._encode(obj._container)  # pylint: disable=protected-access
+        elif self.default is not None:
+            self._encode_default(obj)
+        else:
+            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def _encode_str(self, value: str) -> None:
+        max_length = self.max_string_length
+        if self.truncate and max_length is not None and len(value) > max_length:
+            value = value[:max_length] + TRUNCATED_STRING_SUFFIX
+            self.truncated = True
+        encoded = encode_basestring_ascii(value)
+        if not self.truncate:
+            self._write(encoded)
+            return
+        available = self.max_size - self._reserved - self._size
+        if len(encoded) <= available:
+            self._write(encoded)
+            return
+        # Keep the longest prefix whose encoding fits with the suffix
+        keep = min(len(value), available - len(TRUNCATED_STRING_SUFFIX) - 2)
+        while keep >= 0:
+            encoded = encode_basestring_ascii(value[:keep] + TRUNCATED_STRING_SUFFIX)
+            if len(encoded) <= available:
+                self.truncated = True
+                self._write(encoded)
+                return
+            keep -= max(1, (len(encoded) - available) // 6)
+        self._write(encode_basestring_ascii(value))
+
+    def _enter(self, obj: Any, opening: str) -> None:
+        marker = id(obj)
+        if marker in self._markers:
+            raise ValueError("Circular reference detected")
+        self._markers.add(marker)
+        self._write(opening)
+        self._reserved += 1
+
+    def _exit(self, obj: Any, closing: str) -> None:
+        self._reserved -= 1
+        self._write(closing)
+        self._markers.discard(id(obj))
+
+    def _encode_list(self, values: Any) -> None:
+        self._enter(values, "[")
+        for index, value in enumerate(values):
+            if self.truncate and self.max_items is not None and index >= self.max_items:
+                self.truncated = True
+                break
+            separator = ", " if index else ""
+            leaf_encoder = _LEAF_ENCODERS.get(type(value))
+            if leaf_encoder is not None and not (
+                self.truncate and leaf_encoder is encode_basestring_ascii
+            ):
+                # Fast path, a leaf can't be truncated other than as a whole
+                try:
+                    self._write(separator + leaf_encoder(value))
+                except SizeLimitExceededError:
+                    if not self.truncate:
+                        raise
+                    self.truncated = True
+                    break
+                continue
+            chunks, size = len(self._chunks), self._size
+            try:
+                self._write(separator)
+                self._encode(value)
+            except SizeLimitExceededError:
+                if not self.truncate:
+                    raise
+                self._rollback(chunks, size)
+                break
+        self._exit(values, "]")
+
+    def _encode_dict(self, values: dict) -> None:
+        self._enter(values, "{")
+        for index, (key, value) in enumerate(values.items()):
+            if self.truncate and self.max_items is not None and index >= self.max_items:
+                self.truncated = True
+                break
+            prefix = (", " if index else "") + encode_basestring_ascii(_key_string(key)) + ": "
+            leaf_encoder = _LEAF_ENCODERS.get(type(value))
+            if leaf_encoder is not None and not (
+                self.truncate and leaf_encoder is encode_basestring_ascii
+            ):
+                try:
+                    self._write(prefix + leaf_encoder(value))
+                except SizeLimitExceededError:
+                    if not self.truncate:
+                        raise
+                    self.truncated = True
+                    break
+                continue
+            chunks, size = len(self._chunks), self._size
+            try:
+                self._write(prefix)
+                self._encode(value)
+            except SizeLimitExceededError:
+                if not self.truncate:
+                    raise
+                self._rollback(chunks, size)
+                break
+        self._exit(values, "}")
+
+    def _encode_default(self, obj: Any) -> None:
+        marker = id(obj)
+        if marker in self._markers:
+            raise ValueError("Circular reference detected")
+        self._markers.add(marker)
+        self._encode(self.default(obj))  # type: ignore
+        self._markers.discard(marker)
+
+
+def _key_string(key: Any) -> str:
+    # Same key conversions as json.dumps
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, int):
+        return int.__repr__(key)
+    if isinstance(key, float):
+        return _float_repr(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+
+
+def dumps_bounded(obj: Any, max_size: int, **kwargs: Any) -> str:
+    """Returns the JSON representation of the object, see BoundedJSONEncoder"""
+    return BoundedJSONEncoder(max_size, **kwargs).encode(obj)
@@ -0,0 +1,186 @@
+"""
+Panther Core is a Python library for Panther Detections.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import heapq
+import itertools
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .exceptions import DetectionTimeoutError
+
+E_TIMEOUT = "function exceeded its time budget"
+
+_USE_INTERVAL_TIMER = hasattr(signal, "setitimer")
+
+# Description of the function running under the interval timer of the main thread
+_TIMED_FUNCTION: Optional[str] = None
+
+# The result of a call that hasn't returned
+_NO_RESULT = object()
+
+# Delay of a restored timer that expired during a timed call, since 0 disarms it
+_MIN_DELAY = 1e-6
+
+
+def _alarm_handler(signum: int, frame: Any) -> None:  # pylint: disable=unused-argument
+    if _TIMED_FUNCTION is not None:
+        raise DetectionTimeoutError(E_TIMEOUT, _TIMED_FUNCTION)
+
+
+def _call_with_interval_timer(
+    function: Callable[[Any], Any], event: Any, seconds: float, description: str
+) -> Any:
+    global _TIMED_FUNCTION  # pylint: disable=global-statement
+    # The host can have its own handler and timer, which are restored after the call
+    previous_handler = signal.getsignal(signal.SIGALRM)
+    previous_delay, previous_interval = signal.getitimer(signal.ITIMER_REAL)
+    start = time.monotonic()
+    signal.signal(signal.SIGALRM, _alarm_handler)
+    _TIMED_FUNCTION = description
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    result = _NO_RESULT
+    try:
+        try:
+            result = function(event)
+        finally:
+            # The handler is a no-op from here, so only an alarm handled before can raise
+            _TIMED_FUNCTION = None
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            # None means the handler wasn't installed from Python, and can't be restored
+            if previous_handler is not None:
+                signal.signal(signal.SIGALRM, previous_handler)
+            if previous_delay > 0:
+                # A timer that expired during the call fires as soon as possible
+                remaining = max(previous_delay - (time.monotonic() - start), _MIN_DELAY)
+                signal.setitimer(signal.ITIMER_REAL, remaining, previous_interval)
+    except DetectionTimeoutError:
+        if result is _NO_RESULT:
+            raise
+        # The alarm was handled after the function returned
+    return result
+
+
+class _Watchdog:
+    """A thread raising DetectionTimeoutError in the threads
+    whose function call exceeded its deadline"""
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        # deadline, call id, thread id
+        self._deadlines: List[Tuple[float, int, int]] = []
+        # call id -> whether the exception was raised in the thread
+        self._calls: Dict[int, bool] = {}
+        self._call_ids = itertools.count()
+        self._thread = threading.Thread(target=self._run, name="detection-watchdog", daemon=True)
+        self._thread.start()
+
+    def watch(self, seconds: float) -> int:
+        with self._condition:
+            call_id = next(self._call_ids)
+            self._calls[call_id] = False
+            heapq.heappush(
+                self._deadlines, (time.monotonic() + seconds, call_id, threading.get_ident())
+            )
+            self._condition.notify()
+        return call_id
+
+    def unwatch(self, call_id: int) -> None:
+        with self._condition:
+            fired = self._calls.pop(call_id, False)
+        if fired:
+            # The exception may still be pending if the call returned in the meantime
+            _set_async_exc(threading.get_ident(), None)
+
+    def _run(self) -> None:
+        with self._condition:
+            while True:
+                while self._deadlines and self._deadlines[0][1] not in self._calls:
+                    heapq.heappop(self._deadlines)
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+                deadline, call_id, thread_id = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+                self._calls[call_id] = True
+                _set_async_exc(thread_id, DetectionTimeoutError)
+
+
+def _set_async_exc(thread_id: int, exception: Optional[type]) -> None:
+    # Only imported once a timeout is used outside of the main thread
+    import ctypes  # pylint: disable=import-outside-toplevel
+
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id), ctypes.py_object(exception) if exception else None
+    )
+
+
+_WATCHDOG: Optional[_Watchdog] = None
+_WATCHDOG_LOCK = threading.Lock()
+
+
+def _get_watchdog() -> _Watchdog:
+    global _WATCHDOG  # pylint: disable=global-statement
+    if _WATCHDOG is None:
+        with _WATCHDOG_LOCK:
+            if _WATCHDOG is None:
+                _WATCHDOG = _Watchdog()
+    return _WATCHDOG
+
+
+def _call_with_watchdog(
+    function: Callable[[Any], Any], event: Any, seconds: float, description: str
+) -> Any:
+    watchdog = _get_watchdog()
+    call_id = watchdog.watch(seconds)
+    result = _NO_RESULT
+    try:
+        try:
+            result = function(event)
+        finally:
+            watchdog.unwatch(call_id)
+    except DetectionTimeoutError as err:
+        if err.args:
+            raise
+        # Raised by the watchdog, without a message. It may have interrupted unwatch
+        watchdog.unwatch(call_id)
+        if result is _NO_RESULT:
+            raise DetectionTimeoutError(E_TIMEOUT, description) from None
+        # The exception was raised after the function returned
+    return result
+
+
+def call_with_timeout(
+    function: Callable[[Any], Any], event: Any, seconds: float, description: str
+) -> Any:
+    """Call the function, raising DetectionTimeoutError if it runs longer than the given seconds.
+
+    On the main thread, the call is interrupted by an interval timer (SIGALRM),
+    which replaces any other SIGALRM handler. On other threads, e.g. in a thread pool,
+    a watchdog thread raises the exception asynchronously. In both cases the exception
+    is raised between Python bytecodes, long running calls into C code are only
+    interrupted once they return, and it can be caught by the function itself.
+    """
+    if _USE_INTERVAL_TIMER and threading.current_thread() is threading.main_thread():
+        return _call_with_interval_timer(function, event, seconds, description)
+    return _call_with_watchdog(function, event, seconds, description)
@@ -16,10 +16,20 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import linecache
 import os
 from importlib import util as import_util
-from pathlib import Path
-from typing import Any
+from types import CodeType, ModuleType
+from typing import TYPE_CHECKING, Any, Optional
+
+from .bytecode_cache import compile_source
+
+if TYPE_CHECKING:
+    from importlib.abc import Loader
+else:
+    # Importing importlib.abc also imports importlib.resources,
+    # the loader protocol doesn't require the base class at runtime
+    Loader = object
 
 
 def allowed_char(char: str) -> bool:
@@ -46,9 +56,47 @@ def import_file_as_module(path: str, object_id: str) -> Any:
     return mod
 
 
-def store_modules(path: str, body: str) -> None:
-    """Stores modules to disk."""
-    # Create dir if it doesn't exist
-    Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as py_file:
-        py_file.write(body)
+class StringLoader(Loader):
+    """Loader for a Python module whose source code is held in memory.
+
+    Exposing `get_source` allows `linecache` and `inspect` to retrieve
+    the source code, even though no file exists at the module location.
+    """
+
+    def __init__(self, body: str, code: Optional[CodeType] = None):
+        self._body = body
+        # Code already compiled from the body, e.g. in another process
+        self._code = code
+
+    def get_source(self, fullname: str) -> str:  # pylint: disable=unused-argument
+        return self._body
+
+    def create_module(self, spec: Any) -> Optional[ModuleType]:  # pylint: disable=unused-argument
+        # Use the default module creation semantics
+        return None
+
+    def exec_module(self, module: ModuleType) -> None:
+        path: str = module.__file__  # type: ignore
+        # Register the source code, so that tracebacks can show the offending lines.
+        # A missing modification time prevents linecache from invalidating the entry.
+        linecache.cache[path] = (len(self._body), None, self._body.splitlines(True), path)
+        code = self._code
+        if code is None:
+            code = compile_source(self._body, path)
+        exec(code, module.__dict__)  # nosec pylint: disable=exec-used
+
+
+def import_string_as_module(
+    body: str, object_id: str, path: str, code: Optional[CodeType] = None
+) -> Any:
+    """Import Python source code held in memory as a module, without any filesystem I/O.
+
+    The path is only used as the module `__file__`, so that tracebacks
+    and error messages keep referring to a meaningful file name.
+    If given, the code object must have been compiled from the body.
+    """
+    loader = StringLoader(body, code)
+    spec = import_util.spec_from_file_location(object_id, path, loader=loader)
+    mod = import_util.module_from_spec(spec)  # type: ignore
+    loader.exec_module(mod)
+    return mod
@@ -0,0 +1,152 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from typing import Any
+from unittest import TestCase, mock
+
+from panther_core.archive import MANIFEST_NAME, build_archive, load_archive, read_manifest
+from panther_core.bytecode_cache import compile_source
+from panther_core.enriched_event import PantherEvent
+from panther_core.policy import Policy
+from panther_core.rule import Rule
+
+_CONFIGS = [
+    {
+        'id': 'Example.Rule',
+        'versionId': 'version',
+        'analysisType': 'RULE',
+        'severity': 'HIGH',
+        'tags': ['tag2', 'tag1'],
+        'reports': {'MITRE': ['b', 'a']},
+        'dedupPeriodMinutes': 15,
+        'body': 'def rule(event):\n\treturn event.get("match") or 1/0\ndef title(event):\n\treturn 1/0',
+    },
+    {
+        'id': 'Example.Policy',
+        'versionId': 'version',
+        'analysisType': 'POLICY',
+        'body': 'def policy(resource):\n\treturn False',
+    },
+    {
+        'id': 'Invalid.Syntax',
+        'versionId': 'version',
+        'analysisType': 'RULE',
+        'body': 'def rule(event) return True',
+    },
+]
+
+
+class TestArchive(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp(prefix=self.__class__.__name__ + '_')
+        self.path = os.path.join(self.tmp_dir, 'pack.zip')
+
+    def tearDown(self) -> None:
+        if self.tmp_dir.startswith(tempfile.gettempdir()):
+            shutil.rmtree(self.tmp_dir)
+
+    def test_manifest(self) -> None:
+        build_archive(_CONFIGS, self.path)
+        self.assertEqual(['pack.zip'], os.listdir(self.tmp_dir))
+        manifest = read_manifest(self.path)
+        rule_entry = manifest['detections'][0]
+        self.assertEqual('Example.Rule', rule_entry['id'])
+        self.assertEqual('version', rule_entry['versionId'])
+        self.assertEqual('RULE', rule_entry['analysisType'])
+        self.assertEqual('HIGH', rule_entry['severity'])
+        self.assertEqual(['tag1', 'tag2'], rule_entry['tags'])
+        self.assertEqual({'MITRE': ['a', 'b']}, rule_entry['reports'])
+        self.assertEqual(15, rule_entry['dedupPeriodMinutes'])
+        self.assertNotIn('body', rule_entry)
+        self.assertEqual(60, manifest['detections'][1]['dedupPeriodMinutes'])
+        self.assertEqual(sys.flags.optimize, manifest['optimize'])
+        self.assertTrue(rule_entry['functions']['title'])
+        self.assertFalse(rule_entry['functions']['dedup'])
+        self.assertIsNone(manifest['detections'][2]['functions'])
+
+    def test_load_archive(self) -> None:
+        build_archive(_CONFIGS, self.path)
+        with mock.patch('panther_core.util.compile_source') as compile_mock:
+            load_archive(self.path)
+        # only the detection with invalid syntax has no precompiled code
+        compile_mock.assert_called_once_with(_CONFIGS[2]['body'], mock.ANY)
+
+        rule, policy, invalid = load_archive(self.path)
+
+        self.assertIsInstance(rule, Rule)
+        self.assertEqual('HIGH', rule.detection_severity)
+        self.assertEqual(15, rule.detection_dedup_period_mins)
+        result = rule.run(PantherEvent({'match': True}, None), {}, {}, batch_mode=False)
+        self.assertTrue(result.trigger_alert)
+        self.assertIsInstance(result.title_exception, ZeroDivisionError)
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertRegex(  # type: ignore
+            result.error_message, r'^division by zero: Example.Rule.py, line 2, in rule'
+        )
+
+        self.assertIsInstance(policy, Policy)
+        self.assertTrue(policy.run(PantherEvent({}, None), {}, {}).trigger_alert)
+        self.assertIsInstance(invalid.setup_exception, SyntaxError)
+
+    def test_load_archive_lazily(self) -> None:
+        build_archive(_CONFIGS, self.path)
+        detections = load_archive(self.path, lazy=True)
+        self.assertFalse(any(detection.loaded for detection in detections))
+        self.assertTrue(detections[0].defined_functions['title'])
+        self.assertFalse(detections[0].defined_functions['dedup'])
+        self.assertFalse(detections[0].loaded)
+        self.assertTrue(detections[0].run(PantherEvent({'match': True}, None), {}, {}).trigger_alert)
+
+    def _rewrite_manifest(self, **changes: Any) -> None:
+        with zipfile.ZipFile(self.path) as archive:
+            manifest = json.loads(archive.read(MANIFEST_NAME))
+            entries = {name: archive.read(name) for name in archive.namelist() if name != MANIFEST_NAME}
+        manifest.update(changes)
+        with zipfile.ZipFile(self.path, 'w') as archive:
+            for name, data in entries.items():
+                archive.writestr(name, data)
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest))
+
+    def test_load_archive_from_other_interpreter(self) -> None:
+        build_archive(_CONFIGS[:1], self.path)
+        self._rewrite_manifest(magicNumber='00000000')
+        with mock.patch('panther_core.util.compile_source', wraps=compile_source) as compile_mock:
+            rule, = load_archive(self.path)
+        compile_mock.assert_called_once()
+        self.assertTrue(rule.run(PantherEvent({'match': True}, None), {}, {}).trigger_alert)
+
+    def test_load_archive_with_other_optimization_level(self) -> None:
+        build_archive(_CONFIGS[:1], self.path)
+        self._rewrite_manifest(optimize=sys.flags.optimize + 1)
+        with mock.patch('panther_core.util.compile_source', wraps=compile_source) as compile_mock:
+            rule, = load_archive(self.path)
+        compile_mock.assert_called_once()
+        self.assertTrue(rule.run(PantherEvent({'match': True}, None), {}, {}).trigger_alert)
+
+    def test_unsupported_format_version(self) -> None:
+        with zipfile.ZipFile(self.path, 'w') as archive:
+            archive.writestr(MANIFEST_NAME, json.dumps({'formatVersion': 0, 'detections': []}))
+        with self.assertRaises(ValueError):
+            load_archive(self.path)
@@ -0,0 +1,117 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, mock
+
+from panther_core import bytecode_cache
+from panther_core.bytecode_cache import BytecodeCache
+from panther_core.data_model import DataModel
+from panther_core.enriched_event import PantherEvent
+from panther_core.rule import Rule
+
+
+class TestBytecodeCache(TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp(prefix=self.__class__.__name__ + '_')
+
+    def tearDown(self) -> None:
+        bytecode_cache.set_default_cache(None)
+        if self.tmp_dir.startswith(tempfile.gettempdir()):
+            shutil.rmtree(self.tmp_dir)
+
+    def test_compile_reuses_cached_code(self) -> None:
+        cache = BytecodeCache(self.tmp_dir)
+        code = cache.compile('def rule(event):\n\treturn True', '/tmp/rule.py')
+        self.assertEqual(1, len(cache))
+
+        # a fresh instance reads the entry persisted by the first one
+        cache = BytecodeCache(self.tmp_dir)
+        with mock.patch('panther_core.bytecode_cache.compile') as compile_mock:
+            cached_code = cache.compile('def rule(event):\n\treturn True', '/tmp/rule.py')
+        compile_mock.assert_not_called()
+        self.assertEqual(code, cached_code)
+        self.assertEqual('/tmp/rule.py', cached_code.co_filename)
+
+    def test_key_depends_on_body_and_path(self) -> None:
+        key = BytecodeCache.key('def rule(event):\n\treturn True', '/tmp/rule.py')
+        self.assertNotEqual(key, BytecodeCache.key('def rule(event):\n\treturn False', '/tmp/rule.py'))
+        self.assertNotEqual(key, BytecodeCache.key('def rule(event):\n\treturn True', '/tmp/other.py'))
+
+    def test_key_depends_on_optimization_level(self) -> None:
+        key = BytecodeCache.key('assert False', 'module.py')
+        optimized_sys = mock.Mock(flags=mock.Mock(optimize=1))
+        with mock.patch.object(bytecode_cache, 'sys', optimized_sys):
+            self.assertNotEqual(key, BytecodeCache.key('assert False', 'module.py'))
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = BytecodeCache(self.tmp_dir)
+        first = cache.key('x = 1', 'first.py')
+        cache.compile('x = 1', 'first.py')
+        cache.compile('x = 2', 'second.py')
+        # access the first entry, so that the second becomes the least recently used
+        self.assertIsNotNone(cache.get(first))
+
+        cache.max_size = cache.total_size - 1
+        cache.compile('x = 3', 'third.py')
+        self.assertLessEqual(cache.total_size, cache.max_size)
+        self.assertIsNotNone(cache.get(first))
+        self.assertIsNone(cache.get(cache.key('x = 2', 'second.py')))
+
+    def test_invalid_entry_is_ignored(self) -> None:
+        cache = BytecodeCache(self.tmp_dir)
+        key = cache.key('x = 1', 'module.py')
+        with open(os.path.join(self.tmp_dir, key + '.bin'), 'wb') as entry:
+            entry.write(b'not marshalled code')
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(0, len(cache))
+        self.assertIsNotNone(cache.compile('x = 1', 'module.py'))
+        self.assertEqual(1, len(cache))
+
+    def test_syntax_error_is_not_cached(self) -> None:
+        cache = BytecodeCache(self.tmp_dir)
+        with self.assertRaises(SyntaxError):
+            cache.compile('def rule(event) return True', 'module.py')
+        self.assertEqual(0, len(cache))
+
+    def test_default_cache_used_by_rules_and_data_models(self) -> None:
+        cache = BytecodeCache(self.tmp_dir)
+        bytecode_cache.set_default_cache(cache)
+
+        rule = Rule({'id': 'test_default_cache', 'body': 'def rule(event):\n\treturn True', 'versionId': 'version'})
+        self.assertTrue(rule.run(PantherEvent({}, None), {}, {}).trigger_alert)
+        DataModel({
+            'id': 'data.model.id',
+            'versionId': 'version',
+            'body': 'def get_source_ip(event):\n\treturn event.get("ip")',
+            'mappings': [{'name': 'source_ip', 'method': 'get_source_ip'}],
+        })
+        self.assertEqual(2, len(cache))
+
+    def test_hashlib_not_imported_until_used(self) -> None:
+        output = subprocess.run(
+            [sys.executable, '-c', 'import sys, panther_core.rule, panther_core.registry; print("hashlib" in sys.modules)'],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual('False', output.strip())
@@ -17,6 +17,8 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import subprocess
+import sys
 from unittest import TestCase
 from jsonpath_ng import Fields
 
@@ -128,3 +130,8 @@ class TestDataModel(TestCase):  # pylint: disable=too-many-public-methods
         except NameError:
             exception = True
         self.assertTrue(exception)
+
+    def test_jsonpath_is_imported_on_first_use(self) -> None:
+        code = 'import sys, panther_core.rule, panther_core.data_model; print("jsonpath_ng" in sys.modules)'
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual('False', output.stdout.strip())
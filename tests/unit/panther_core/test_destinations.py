@@ -0,0 +1,104 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from panther_core.destinations import DestinationResolver, as_resolver
+from panther_core.enriched_event import PantherEvent
+from panther_core.exceptions import UnknownDestinationError
+from panther_core.rule import Rule
+
+_OUTPUTS = {
+    'id-slack': SimpleNamespace(destination_id='id-slack'),
+    'id-pager': SimpleNamespace(destination_id='id-pager'),
+}
+_OUTPUTS_NAMES = {
+    'Slack': SimpleNamespace(destination_id='id-slack'),
+    'PagerDuty': SimpleNamespace(destination_id='id-pager'),
+    # A display name equal to another destination id
+    'id-pager-old': SimpleNamespace(destination_id='id-pager'),
+}
+
+
+class TestDestinationResolver(TestCase):
+
+    def setUp(self) -> None:
+        self.resolver = DestinationResolver(_OUTPUTS, _OUTPUTS_NAMES)
+
+    def test_resolve(self) -> None:
+        self.assertEqual((['id-pager', 'id-slack'], []), self.resolver.resolve(['PagerDuty', 'id-slack']))
+
+    def test_deduplicates_in_order(self) -> None:
+        self.assertEqual(
+            (['id-slack', 'id-pager'], []),
+            self.resolver.resolve(['Slack', 'id-pager', 'id-slack', 'PagerDuty', 'Slack']),
+        )
+
+    def test_invalid(self) -> None:
+        self.assertEqual((['id-slack'], ['Email', 1]), self.resolver.resolve(['Email', 'Slack', 1]))
+
+    def test_unhashable(self) -> None:
+        with self.assertRaises(TypeError):
+            self.resolver.resolve([['Slack']])
+
+    def test_cache(self) -> None:
+        resolved, _ = self.resolver.resolve(['Slack'])
+        resolved.append('modified')
+        self.assertEqual((['id-slack'], []), self.resolver.resolve(['Slack']))
+        self.assertEqual((['id-slack'], []), self.resolver.resolve(('Slack',)))
+
+    def test_cache_size(self) -> None:
+        resolver = DestinationResolver(_OUTPUTS, _OUTPUTS_NAMES, cache_size=2)
+        for destinations in (['Slack'], ['PagerDuty'], ['Slack', 'PagerDuty']):
+            resolver.resolve(destinations)
+        self.assertEqual(1, len(resolver._cache))  # pylint: disable=protected-access
+
+    def test_empty(self) -> None:
+        self.assertEqual(([], ['Slack']), DestinationResolver().resolve(['Slack']))
+
+    def test_as_resolver(self) -> None:
+        self.assertIs(self.resolver, as_resolver(self.resolver))
+        resolver = as_resolver(_OUTPUTS, _OUTPUTS_NAMES)
+        self.assertEqual((['id-slack'], []), resolver.resolve(['Slack']))
+
+    def test_raw_dicts_are_not_indexed(self) -> None:
+        resolver = as_resolver(_OUTPUTS, _OUTPUTS_NAMES)
+        destinations = ['Slack', 'id-pager', 'id-slack', 'id-pager-old', 'Email', 1]
+        self.assertEqual(self.resolver.resolve(destinations), resolver.resolve(destinations))
+        self.assertIsNone(resolver._index)  # pylint: disable=protected-access
+        with self.assertRaises(TypeError):
+            resolver.resolve([['Slack']])
+
+    def test_rule_destinations(self) -> None:
+        rule_body = 'def rule(event):\n\treturn True\ndef destinations(event):\n\treturn list(event.get("destinations"))'
+        rule = Rule({'id': 'test_rule_destinations', 'body': rule_body, 'versionId': 'versionId'})
+
+        result = rule.run(PantherEvent({'destinations': ['Slack', 'id-pager', 'id-slack']}, None), self.resolver)
+        self.assertEqual(['id-slack', 'id-pager'], result.destinations_output)
+        # The raw dicts are still accepted
+        result = rule.run(PantherEvent({'destinations': ['PagerDuty']}, None), _OUTPUTS, _OUTPUTS_NAMES)
+        self.assertEqual(['id-pager'], result.destinations_output)
+
+        result = rule.run(PantherEvent({'destinations': ['Slack', 'Email']}, None), self.resolver)
+        self.assertIsNone(result.destinations_output)
+        self.assertIsNone(result.destinations_exception)
+        result = rule.run(PantherEvent({'destinations': ['Slack', 'Email']}, None), self.resolver, batch_mode=False)
+        self.assertEqual(UnknownDestinationError('Invalid Destinations', ['Email']).args,
+                         result.destinations_exception.args)  # type: ignore
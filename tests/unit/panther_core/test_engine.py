@@ -0,0 +1,103 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from typing import Any, Dict, List
+from unittest import TestCase
+
+from panther_core.data_model import DataModel
+from panther_core.engine import DetectionEngine
+from panther_core.loader import load_detections
+
+
+def _config(detection_id: str, analysis_type: str, body: str, **kwargs: List[str]) -> Dict[str, Any]:
+    config = {'id': detection_id, 'versionId': 'v1', 'analysisType': analysis_type, 'body': body}
+    config.update(kwargs)
+    return config
+
+
+_CONFIGS = [
+    _config('rule.aws', 'RULE', 'def rule(event):\n\treturn event.udm("user") == "root"',
+            LogTypes=['AWS.CloudTrail', 'AWS.S3ServerAccess']),
+    _config('rule.okta', 'RULE', 'def rule(event):\n\treturn True', LogTypes=['Okta.SystemLog']),
+    _config('rule.any', 'RULE', 'def rule(event):\n\treturn False'),
+    _config('policy.bucket', 'POLICY', 'def policy(resource):\n\treturn resource["encrypted"]',
+            ResourceTypes=['AWS.S3.Bucket']),
+    _config('policy.any', 'POLICY', 'def policy(resource):\n\treturn True'),
+]
+
+
+class TestDetectionEngine(TestCase):
+    def setUp(self) -> None:
+        data_model = DataModel({'id': 'aws', 'versionId': 'v1', 'mappings': [{'name': 'user', 'path': 'userName'}]})
+        self.engine = DetectionEngine(load_detections(_CONFIGS), {'AWS.CloudTrail': data_model})
+
+    def test_index(self) -> None:
+        self.assertEqual(['AWS.CloudTrail', 'AWS.S3ServerAccess', 'Okta.SystemLog'], self.engine.log_types)
+        self.assertEqual(['AWS.S3.Bucket'], self.engine.resource_types)
+        self.assertEqual(['rule.aws', 'rule.any'],
+                         [rule.detection_id for rule in self.engine.rules_for('AWS.CloudTrail')])
+        self.assertEqual(['rule.any'], [rule.detection_id for rule in self.engine.rules_for('GCP.AuditLog')])
+        self.assertEqual(['policy.any'], [policy.detection_id for policy in self.engine.policies_for('AWS.EC2')])
+
+    def test_evaluate(self) -> None:
+        results = self.engine.evaluate({'p_log_type': 'AWS.CloudTrail', 'userName': 'root'}, {}, {})
+        self.assertEqual(['rule.aws', 'rule.any'], [result.detection_id for result in results])
+        self.assertEqual([True, False], [result.trigger_alert for result in results])
+
+        results = self.engine.evaluate({'p_log_type': 'Okta.SystemLog'}, {}, {})
+        self.assertEqual(['rule.okta', 'rule.any'], [result.detection_id for result in results])
+
+    def test_evaluate_without_data_model(self) -> None:
+        results = self.engine.evaluate({'p_log_type': 'AWS.S3ServerAccess'}, {}, {})
+        self.assertEqual('PantherError', results[0].error_type)
+
+    def test_evaluate_resource(self) -> None:
+        results = self.engine.evaluate_resource({'encrypted': False}, 'AWS.S3.Bucket', {}, {})
+        self.assertEqual(['policy.bucket', 'policy.any'], [result.detection_id for result in results])
+        self.assertEqual([True, False], [result.trigger_alert for result in results])
+
+    def test_no_subscribed_detections(self) -> None:
+        engine = DetectionEngine(load_detections(_CONFIGS[:2]))
+        self.assertEqual([], engine.evaluate({'p_log_type': 'GCP.AuditLog'}, {}, {}))
+        self.assertEqual([], engine.evaluate_resource({}, 'AWS.S3.Bucket', {}, {}))
+
+    def test_prefilter(self) -> None:
+        configs = [
+            _config('rule.console_login', 'RULE', 'def rule(event):\n\treturn event.get("eventName") == "ConsoleLogin"',
+                    LogTypes=['AWS.CloudTrail']),
+            _config('rule.other', 'RULE', 'def rule(event):\n\treturn False', LogTypes=['AWS.CloudTrail']),
+        ]
+        event = {'p_log_type': 'AWS.CloudTrail', 'eventName': 'GetObject'}
+        engine = DetectionEngine(load_detections(configs))
+        self.assertEqual(['rule.other'], [result.detection_id for result in engine.evaluate(event, {}, {})])
+        engine = DetectionEngine(load_detections(configs), prefilter=False)
+        self.assertEqual(['rule.console_login', 'rule.other'],
+                         [result.detection_id for result in engine.evaluate(event, {}, {})])
+
+    def test_prefilter_does_not_load_lazy_detections(self) -> None:
+        configs = [
+            _config('rule.console_login', 'RULE', 'def rule(event):\n\treturn event.get("eventName") == "ConsoleLogin"',
+                    LogTypes=['AWS.CloudTrail']),
+            _config('rule.other', 'RULE', 'def rule(event):\n\treturn False'),
+        ]
+        detections = load_detections(configs, lazy=True)
+        engine = DetectionEngine(detections)
+        self.assertFalse(any(detection.loaded for detection in detections))
+        event = {'p_log_type': 'AWS.CloudTrail', 'eventName': 'GetObject'}
+        self.assertEqual(['rule.other'], [result.detection_id for result in engine.evaluate(event, {}, {})])
@@ -0,0 +1,82 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+from unittest import TestCase
+
+from panther_core import error_log
+from panther_core.enriched_event import PantherEvent
+from panther_core.error_log import ErrorCount, ErrorLogSampler
+from panther_core.rule import Rule
+
+
+class TestErrorLogSampler(TestCase):
+
+    def setUp(self) -> None:
+        self.logger = logging.getLogger('test_error_log')
+
+    def test_samples_occurrences(self) -> None:
+        sampler = ErrorLogSampler(first_occurrences=3, sample_interval=10, logger=self.logger)
+        with self.assertLogs(self.logger, logging.INFO) as logs:
+            logged = [
+                sampler.log(self.logger, 'rule.id', 'title', 'KeyError', 'title raised %s', 'err')
+                for _ in range(25)
+            ]
+        self.assertEqual([1, 2, 3, 10, 20], [index + 1 for index, value in enumerate(logged) if value])
+        self.assertEqual('title raised err (occurrence 10)', logs.records[3].getMessage())
+        self.assertEqual([ErrorCount('rule.id', 'title', 'KeyError', 25, 5)], sampler.counts())
+
+    def test_counts_per_error(self) -> None:
+        sampler = ErrorLogSampler(first_occurrences=1, logger=self.logger)
+        with self.assertLogs(self.logger, logging.INFO):
+            for key in [('a', 'title', 'KeyError'), ('a', 'title', 'TypeError'), ('b', 'title', 'KeyError')] * 2:
+                sampler.log(self.logger, *key, 'error')
+        self.assertEqual([2, 2, 2], [error.count for error in sampler.counts()])
+        self.assertEqual([1, 1, 1], [error.logged for error in sampler.counts()])
+
+    def test_flush(self) -> None:
+        sampler = ErrorLogSampler(first_occurrences=1, logger=self.logger)
+        with self.assertLogs(self.logger, logging.INFO):
+            sampler.log(self.logger, 'a', 'title', 'KeyError', 'error')
+            sampler.log(self.logger, 'a', 'title', 'KeyError', 'error')
+            sampler.log(self.logger, 'b', 'dedup', 'KeyError', 'error')
+        with self.assertLogs(self.logger, logging.INFO) as logs:
+            counts = sampler.flush()
+        self.assertEqual(2, len(counts))
+        # Only the errors that were not all logged are summarized
+        self.assertEqual(
+            ['title method for detection with id [a] reported [KeyError] 2 times, 1 of them logged'],
+            [record.getMessage() for record in logs.records],
+        )
+        self.assertEqual([], sampler.counts())
+
+    def test_rule_title_errors(self) -> None:
+        sampler = ErrorLogSampler(first_occurrences=2, sample_interval=50, logger=self.logger)
+        previous = error_log.set_sampler(sampler)
+        try:
+            rule_body = 'def rule(event):\n\treturn True\ndef title(event):\n\treturn event["missing"]'
+            rule = Rule({'id': 'test_rule_title_errors', 'body': rule_body, 'versionId': 'versionId'})
+            rule.logger = self.logger
+            with self.assertLogs(self.logger, logging.INFO) as logs:
+                for _ in range(100):
+                    self.assertEqual('test_rule_title_errors', rule.run(PantherEvent({}, None), {}, {}).title_output)
+        finally:
+            error_log.set_sampler(previous)
+        self.assertEqual(4, len(logs.records))
+        self.assertEqual([ErrorCount('test_rule_title_errors', 'title', 'KeyError', 100, 4)], sampler.counts())
@@ -0,0 +1,117 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+from typing import Any, Dict
+from unittest import TestCase
+
+from panther_core.enriched_event import PantherEvent
+from panther_core.global_helpers import GlobalHelperRegistry, imported_modules
+from panther_core.registry import DetectionRegistry
+
+
+def _helper(global_id: str, body: str) -> Dict[str, Any]:
+    return {'id': global_id, 'body': body}
+
+
+def _rule(detection_id: str, body: str) -> Dict[str, Any]:
+    return {'id': detection_id, 'versionId': 'v1', 'body': body}
+
+
+_BASE_HELPER = _helper('test_base_helpers', 'PREFIX = "base"\ndef prefix(value):\n\treturn PREFIX + value')
+_AWS_HELPER = _helper(
+    'test_aws_helpers', 'from test_base_helpers import prefix\ndef aws(value):\n\treturn prefix("aws" + value)'
+)
+_OTHER_HELPER = _helper('test_other_helpers', 'VALUE = 1')
+
+
+class TestGlobalHelperRegistry(TestCase):
+    def setUp(self) -> None:
+        self.helpers = GlobalHelperRegistry()
+        self.registry = DetectionRegistry(helpers=self.helpers)
+
+    def tearDown(self) -> None:
+        self.helpers.uninstall()
+
+    def test_imported_modules(self) -> None:
+        body = 'import json, test_a.sub as a\nfrom test_b import c\ndef rule(event):\n    import test_c\n'
+        self.assertEqual({'json', 'test_a', 'test_b', 'test_c'}, imported_modules(body))
+
+    def test_globals_are_imported_once(self) -> None:
+        self.helpers.update([_BASE_HELPER, _AWS_HELPER])
+        self.assertIn('test_base_helpers', sys.modules)
+        self.assertIs(sys.modules['test_base_helpers'].prefix, sys.modules['test_aws_helpers'].prefix)
+        self.assertEqual({}, self.helpers.errors)
+
+    def test_dependencies(self) -> None:
+        self.registry.update(
+            [
+                _rule('rule.base', 'import test_base_helpers\ndef rule(event):\n\treturn True'),
+                _rule('rule.aws', 'from test_aws_helpers import aws\ndef rule(event):\n\treturn True'),
+                _rule('rule.other', 'import test_other_helpers\ndef rule(event):\n\treturn True'),
+            ],
+            [_BASE_HELPER, _AWS_HELPER, _OTHER_HELPER],
+        )
+        self.assertEqual({'test_aws_helpers'}, self.helpers.dependencies('rule.aws'))
+        self.assertEqual({'rule.base', 'rule.aws'}, self.helpers.dependents('test_base_helpers'))
+        self.assertEqual({'rule.aws'}, self.helpers.dependents('test_aws_helpers'))
+
+    def test_reload_changed_global_and_dependents(self) -> None:
+        rules = [
+            _rule('rule.aws', 'from test_aws_helpers import aws\ndef rule(event):\n\treturn aws("") == "baseaws"'),
+            _rule('rule.other', 'import test_other_helpers\ndef rule(event):\n\treturn True'),
+        ]
+        self.registry.update(rules, [_BASE_HELPER, _AWS_HELPER, _OTHER_HELPER])
+        other_module = sys.modules['test_other_helpers']
+        other_rule = self.registry['rule.other']
+        self.assertTrue(self.registry['rule.aws'].run(PantherEvent({}, None), {}, {}).trigger_alert)
+
+        changed_base = _helper('test_base_helpers', 'def prefix(value):\n\treturn "changed" + value')
+        update = self.registry.update(rules, [changed_base, _AWS_HELPER, _OTHER_HELPER])
+
+        self.assertEqual(['rule.aws'], update.updated)
+        self.assertIs(other_module, sys.modules['test_other_helpers'])
+        self.assertIs(other_rule, self.registry['rule.other'])
+        self.assertFalse(self.registry['rule.aws'].run(PantherEvent({}, None), {}, {}).trigger_alert)
+
+    def test_removed_global(self) -> None:
+        rules = [_rule('rule.other', 'import test_other_helpers\ndef rule(event):\n\treturn True')]
+        self.registry.update(rules, [_OTHER_HELPER])
+        update = self.registry.update(rules, [])
+        self.assertEqual(['rule.other'], update.updated)
+        self.assertNotIn('test_other_helpers', sys.modules)
+        self.assertIsInstance(self.registry['rule.other'].setup_exception, ModuleNotFoundError)
+
+    def test_global_import_error(self) -> None:
+        self.helpers.update([_helper('test_broken_helpers', 'raise ValueError("broken")')])
+        self.assertIsInstance(self.helpers.errors['test_broken_helpers'], ValueError)
+
+    def test_global_shadowing_installed_module(self) -> None:
+        json_module = sys.modules['json']
+        self.helpers.update([_helper('json', 'VALUE = 1')])
+        self.assertIsInstance(self.helpers.errors['json'], ImportError)
+        self.assertIs(json_module, sys.modules['json'])
+        self.assertNotIn(self.helpers._finder, sys.meta_path[:1])  # pylint: disable=protected-access
+
+    def test_invalid_configs_leave_globals_untouched(self) -> None:
+        self.registry.update([], [_OTHER_HELPER])
+        with self.assertRaises(AssertionError):
+            self.registry.update([{'body': 'def rule(event):\n\treturn True'}], [])
+        self.assertIn('test_other_helpers', self.helpers)
+        self.assertIn('test_other_helpers', sys.modules)
@@ -0,0 +1,137 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from unittest import TestCase, skipUnless
+
+from panther_core import json_backend
+from panther_core.enriched_event import PantherEvent
+from panther_core.exec.common import ClientOptions, ExecutionMode
+from panther_core.exec.task import ExecutionTaskInput
+
+try:
+    import orjson  # pylint: disable=unused-import
+    ORJSON_INSTALLED = True
+except ImportError:
+    ORJSON_INSTALLED = False
+
+_VALUES = [
+    {'string': 'é\n"quoted"', 'int': 1, 'float': 2.5, 'list': [None, True, False], 'nested': {'a': []}},
+    {1: 'int', None: 'none', True: 'bool'},
+    [2 ** 70, ExecutionMode.INLINE],
+    'string', 3, None, [], {},
+]
+
+
+class TestJSONBackend(TestCase):
+
+    def test_stdlib_output(self) -> None:
+        backend = json_backend.load_backend(json_backend.BACKEND_STDLIB)
+        for value in _VALUES:
+            self.assertEqual(json.dumps(value), backend.dumps(value))
+            self.assertEqual(json.dumps(value).encode('utf-8'), backend.dumps_bytes(value))
+            self.assertEqual(json.loads(json.dumps(value)), backend.loads(backend.dumps(value)))
+
+    @skipUnless(ORJSON_INSTALLED, 'orjson is not installed')
+    def test_orjson_compatibility(self) -> None:
+        backend = json_backend.load_backend(json_backend.BACKEND_ORJSON)
+        for value in _VALUES:
+            self.assertEqual(json.loads(json.dumps(value)), json.loads(backend.dumps(value)))
+            self.assertEqual(backend.dumps(value).encode('utf-8'), backend.dumps_bytes(value))
+
+    @skipUnless(ORJSON_INSTALLED, 'orjson is not installed')
+    def test_orjson_immutable_containers(self) -> None:
+        backend = json_backend.load_backend(json_backend.BACKEND_ORJSON)
+        event = PantherEvent({'headers': {'User-Agent': 'Chrome'}, 'args': [{'a': '1'}]}, None)
+        value = {'headers': event['headers'], 'args': event['args']}
+        self.assertEqual(
+            json.loads(json.dumps(value, default=PantherEvent.json_encoder)),
+            json.loads(backend.dumps(value, default=PantherEvent.json_encoder)),
+        )
+
+    @skipUnless(ORJSON_INSTALLED, 'orjson is not installed')
+    def test_orjson_rejects_what_stdlib_rejects(self) -> None:
+        backend = json_backend.load_backend(json_backend.BACKEND_ORJSON)
+        for value in ({'date': datetime(2022, 1, 1)}, {(1, 2): 'tuple key'}, {'set': {1}}):
+            with self.assertRaises(TypeError):
+                backend.dumps(value)
+        self.assertEqual('{"set":[1]}', backend.dumps({'set': {1}}, default=list))
+
+    @skipUnless(ORJSON_INSTALLED, 'orjson is not installed')
+    def test_orjson_loads_fallback(self) -> None:
+        backend = json_backend.load_backend(json_backend.BACKEND_ORJSON)
+        value = backend.loads('{"a": NaN, "b": 1}')
+        self.assertNotEqual(value['a'], value['a'])
+        self.assertEqual(1, value['b'])
+        with self.assertRaises(ValueError):
+            backend.loads('{')
+
+    def test_unknown_backend(self) -> None:
+        with self.assertRaises(ValueError):
+            json_backend.load_backend('simplejson')
+
+    def test_set_backend(self) -> None:
+        previous = json_backend.set_backend(json_backend.BACKEND_STDLIB)
+        try:
+            self.assertEqual(json_backend.BACKEND_STDLIB, json_backend.get_backend().name)
+            self.assertEqual('{"a": 1}', json_backend.dumps({'a': 1}))
+            self.assertEqual(b'{"a": 1}', json_backend.dumps_bytes({'a': 1}))
+            self.assertEqual({'a': 1}, json_backend.loads(b'{"a": 1}'))
+        finally:
+            json_backend.set_backend(previous.name)
+
+    def test_environment_variable(self) -> None:
+        output = subprocess.run(
+            [sys.executable, '-c', 'from panther_core import json_backend; print(json_backend.get_backend().name)'],
+            env=dict(os.environ, **{json_backend.BACKEND_ENV_VARIABLE: json_backend.BACKEND_STDLIB}),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual(json_backend.BACKEND_STDLIB, output.strip())
+
+    def test_not_imported_until_used(self) -> None:
+        output = subprocess.run(
+            [sys.executable, '-c', 'import sys, panther_core.rule; print("orjson" in sys.modules)'],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual('False', output.strip())
+
+    def test_data_object_round_trip(self) -> None:
+        obj = ExecutionTaskInput(mode=ExecutionMode.INLINE, data=[{'xyz': 1}], input_id_field='xyz')
+        self.assertEqual(json.loads(obj.to_json()), json.loads(obj.to_bytes_fast()))
+        self.assertEqual(obj, ExecutionTaskInput.from_bytes(obj.to_bytes_fast()))
+        self.assertEqual(obj, ExecutionTaskInput.from_bytes(obj.to_bytes()))
+        self.assertEqual(obj, ExecutionTaskInput.from_bytes(obj.to_json()))
+
+    def test_to_bytes_matches_to_json(self) -> None:
+        obj = ClientOptions(lambda_name='\u00e9')
+        previous = json_backend.get_backend()
+        for name in (json_backend.BACKEND_ORJSON, json_backend.BACKEND_UJSON, json_backend.BACKEND_STDLIB):
+            try:
+                json_backend.set_backend(name)
+            except ImportError:
+                continue
+            try:
+                self.assertEqual(b'{"lambda_name": "\\u00e9"}', obj.to_bytes())
+            finally:
+                json_backend.set_backend(previous.name)
+        self.assertFalse(hasattr(ClientOptions, 'from_bytes'))
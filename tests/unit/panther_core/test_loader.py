@@ -0,0 +1,71 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from typing import Any, Dict, List
+from unittest import TestCase
+
+from panther_core.enriched_event import PantherEvent
+from panther_core.loader import MIN_PARALLEL_DETECTIONS, compile_detection, load_detections
+from panther_core.policy import Policy
+from panther_core.rule import Rule
+
+
+def _configs(count: int) -> List[Dict[str, Any]]:
+    configs: List[Dict[str, Any]] = [
+        {'id': f'rule.{i}', 'versionId': 'version', 'analysisType': 'RULE',
+         'body': f'def rule(event):\n\treturn event.get("id") == {i}'}
+        for i in range(count)
+    ]
+    configs.append({'id': 'policy', 'versionId': 'version', 'analysisType': 'POLICY',
+                    'body': 'def policy(resource):\n\treturn False'})
+    configs.append({'id': 'invalid.syntax', 'versionId': 'version', 'analysisType': 'RULE',
+                    'body': 'def rule(event) return True'})
+    configs.append({'id': 'raises.on.import', 'versionId': 'version', 'analysisType': 'RULE',
+                    'body': 'x = 1/0\ndef rule(event):\n\treturn True'})
+    return configs
+
+
+class TestLoader(TestCase):
+
+    def _assert_loaded(self, configs: List[Dict[str, Any]], detections: List[Any]) -> None:
+        self.assertEqual([config['id'] for config in configs], [d.detection_id for d in detections])
+        self.assertIsInstance(detections[0], Rule)
+        self.assertTrue(detections[3].run(PantherEvent({'id': 3}, None), {}, {}).trigger_alert)
+        self.assertFalse(detections[4].run(PantherEvent({'id': 3}, None), {}, {}).trigger_alert)
+        self.assertIsInstance(detections[-3], Policy)
+        self.assertTrue(detections[-3].run(PantherEvent({}, None), {}, {}).trigger_alert)
+        self.assertIsInstance(detections[-2].setup_exception, SyntaxError)
+        self.assertIsInstance(detections[-1].setup_exception, ZeroDivisionError)
+        self.assertRegex(  # type: ignore
+            detections[-1].run(PantherEvent({}, None), {}, {}).error_message,
+            r'^division by zero: raises.on.import.py, line 1'
+        )
+
+    def test_load_detections_serially(self) -> None:
+        configs = _configs(10)
+        self._assert_loaded(configs, load_detections(configs))
+
+    def test_load_detections_in_parallel(self) -> None:
+        configs = _configs(MIN_PARALLEL_DETECTIONS)
+        self._assert_loaded(configs, load_detections(configs, max_workers=2))
+
+    def test_compile_detection(self) -> None:
+        self.assertIsInstance(compile_detection(_configs(1)[0]), bytes)
+        self.assertIsNone(compile_detection({'id': 'invalid.syntax', 'body': 'def rule(event) return'}))
+        self.assertIsNone(compile_detection({'id': 'from.path', 'path': '/rules/rule.py'}))
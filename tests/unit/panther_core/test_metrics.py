@@ -0,0 +1,108 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from unittest import TestCase
+
+from panther_core.enriched_event import PantherEvent
+from panther_core.metrics import LatencyHistogram, MetricsRecorder
+from panther_core.rule import Rule
+
+_RULE_BODY = '''
+def rule(event):
+    return event.get("match") or 1 / event.get("divisor")
+
+def title(event):
+    return event.get("title")
+'''
+
+
+class TestLatencyHistogram(TestCase):
+    def test_buckets(self) -> None:
+        for value in (0, 1, 127, 128, 129, 1000, 123456, 10 ** 9):
+            bucket = LatencyHistogram.bucket(value)
+            self.assertGreaterEqual(LatencyHistogram.highest_value(bucket), value)
+            self.assertLessEqual(LatencyHistogram.highest_value(bucket), value * (1 + 1 / 64))
+            if bucket:
+                self.assertLess(LatencyHistogram.highest_value(bucket - 1), value)
+
+    def test_percentiles(self) -> None:
+        histogram = LatencyHistogram()
+        for value in range(1, 1001):
+            histogram.record(value * 1000)
+        self.assertEqual(1000, histogram.count)
+        self.assertEqual(1000000, histogram.max)
+        self.assertAlmostEqual(500000, histogram.value_at_percentile(50), delta=500000 / 64)
+        self.assertAlmostEqual(990000, histogram.value_at_percentile(99), delta=990000 / 64)
+        self.assertEqual(1000000, histogram.value_at_percentile(100))
+        self.assertEqual(0, LatencyHistogram().value_at_percentile(50))
+
+
+class TestMetricsRecorder(TestCase):
+    def setUp(self) -> None:
+        self.rule = Rule({'id': 'metrics.rule', 'versionId': 'v1', 'body': _RULE_BODY})
+        self.events = [
+            PantherEvent({'match': True, 'title': 'title'}, None),
+            PantherEvent({'match': False, 'divisor': 0}, None),
+            PantherEvent({'match': True, 'title': 1}, None),
+            PantherEvent({'match': False, 'divisor': 2}, None),
+        ]
+
+    def test_snapshot(self) -> None:
+        with MetricsRecorder() as recorder:
+            for event in self.events:
+                self.rule.run(event, {}, {})
+        metrics = recorder.snapshot()['metrics.rule']
+        self.assertEqual(4, metrics.events)
+        self.assertEqual(2, metrics.matches)
+        self.assertEqual(0.5, metrics.match_rate)
+        self.assertEqual(4, metrics.functions['rule'].calls)
+        self.assertEqual({'ZeroDivisionError': 1, 'FunctionReturnTypeError': 1}, metrics.functions['rule'].exceptions)
+        self.assertEqual(2, metrics.functions['title'].calls)
+        self.assertEqual({'FunctionReturnTypeError': 1}, metrics.functions['title'].exceptions)
+        self.assertGreater(metrics.functions['rule'].total_seconds, 0)
+        self.assertLessEqual(metrics.functions['rule'].p50_seconds, metrics.functions['rule'].max_seconds)
+
+    def test_run_batch(self) -> None:
+        with MetricsRecorder() as recorder:
+            self.rule.run_batch(self.events, {}, {})
+        metrics = recorder.snapshot()['metrics.rule']
+        self.assertEqual((4, 2), (metrics.events, metrics.matches))
+        self.assertEqual(4, metrics.functions['rule'].calls)
+
+    def test_reset(self) -> None:
+        with MetricsRecorder() as recorder:
+            self.rule.run(self.events[0], {}, {})
+            self.assertEqual(1, recorder.snapshot(reset=True)['metrics.rule'].events)
+            self.assertEqual({}, recorder.snapshot())
+            self.rule.run(self.events[0], {}, {})
+            self.assertEqual(1, recorder.snapshot()['metrics.rule'].functions['rule'].calls)
+
+    def test_disabled(self) -> None:
+        recorder = MetricsRecorder()
+        with recorder:
+            self.rule.run(self.events[0], {}, {})
+        instrumented_matcher = self.rule._matcher  # pylint: disable=protected-access
+        self.rule.run(self.events[0], {}, {})
+        self.assertIsNot(instrumented_matcher, self.rule._matcher)  # pylint: disable=protected-access
+        self.assertEqual(1, recorder.snapshot()['metrics.rule'].events)
+
+    def test_single_active_recorder(self) -> None:
+        with MetricsRecorder():
+            with self.assertRaises(RuntimeError):
+                MetricsRecorder().start()
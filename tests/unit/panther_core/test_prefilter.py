@@ -0,0 +1,202 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from types import ModuleType
+from unittest import TestCase
+
+from panther_core.enriched_event import PantherEvent
+from panther_core.global_helpers import GlobalHelperRegistry
+from panther_core.policy import Policy
+from panther_core.prefilter import (
+    KIND_PRESENT,
+    KIND_TRUTHY,
+    KIND_VALUES,
+    FieldRequirement,
+    PrefilterIndex,
+    pending_requirements,
+    rule_requirements,
+    source_requirements,
+)
+from panther_core.rule import Rule
+
+
+def _rule(detection_id: str, body: str, lazy: bool = False) -> Rule:
+    return Rule({'id': detection_id, 'versionId': 'v1', 'body': body}, lazy=lazy)
+
+
+class TestSourceRequirements(TestCase):
+    def test_guards(self) -> None:
+        body = (
+            'def rule(event):\n'
+            '    """docstring"""\n'
+            '    if event.get("eventName") != "X":\n'
+            '        return False\n'
+            '    if not event.get("userName"):\n'
+            '        return False\n'
+            '    if "region" not in event:\n'
+            '        return False\n'
+            '    return event["eventSource"] in {"s3", "ec2"} and helper(event)\n'
+        )
+        self.assertEqual(
+            [
+                FieldRequirement('eventName', KIND_VALUES, frozenset(['X'])),
+                FieldRequirement('userName', KIND_TRUTHY),
+                FieldRequirement('region', KIND_PRESENT),
+                FieldRequirement('eventSource', KIND_VALUES, frozenset(['s3', 'ec2']), uses_get=False),
+            ],
+            source_requirements(body),
+        )
+
+    def test_return_comparison(self) -> None:
+        self.assertEqual(
+            [FieldRequirement('eventName', KIND_VALUES, frozenset(['A', 'B']), default='')],
+            source_requirements('def rule(e):\n    return e.get("eventName", "") in ("A", "B")'),
+        )
+        self.assertEqual(
+            [FieldRequirement('eventName', KIND_VALUES, frozenset(['A']))],
+            source_requirements('def rule(e):\n    return "A" == e.get("eventName")'),
+        )
+
+    def test_guards_stop_at_other_statements(self) -> None:
+        bodies = [
+            'def rule(event):\n    log(event)\n    return event.get("a") == 1',
+            'def rule(event):\n    if event.get("a") == 1:\n        return False\n    return True',
+            'def rule(event):\n    if event.get("a") != 1:\n        return None\n    return True',
+            'def rule(event):\n    return event.get("a") == VALUE',
+            'def rule(event):\n    return helper(event) and event.get("a") == 1',
+            'def rule(event):\n    return event.get("a") in "abc"',
+            'def rule(event):\n    return other.get("a") == 1',
+            '@decorator\ndef rule(event):\n    return event.get("a") == 1',
+            'def rule(event):\n    return True\ndef rule(event):\n    return event.get("a") == 1',
+            'def rule(event) return',
+        ]
+        for body in bodies:
+            self.assertEqual([], source_requirements(body), body)
+
+    def test_guards_after_possible_errors(self) -> None:
+        body = (
+            'def rule(event):\n'
+            '    if event.get("a") != 1 or helper(event):\n'
+            '        return False\n'
+            '    if event.get("b") != 2:\n'
+            '        return False\n'
+        )
+        self.assertEqual([FieldRequirement('a', KIND_VALUES, frozenset([1]))], source_requirements(body))
+        body = body.replace('event.get("a") != 1 or helper(event)', 'event["a"] != 1')
+        self.assertEqual([FieldRequirement('a', KIND_VALUES, frozenset([1]), uses_get=False)],
+                         source_requirements(body))
+
+
+class TestRuleRequirements(TestCase):
+    def test_loaded_rule(self) -> None:
+        rule = _rule('prefilter.loaded', 'def rule(event):\n\treturn event.get("a") == 1')
+        self.assertEqual([FieldRequirement('a', KIND_VALUES, frozenset([1]))], rule_requirements(rule))
+
+    def test_replaced_module(self) -> None:
+        rule = _rule('prefilter.replaced', 'def rule(event):\n\treturn event.get("a") == 1')
+        module = ModuleType('mocked')
+        setattr(module, 'rule', lambda event: True)
+        rule.module = module
+        self.assertEqual([], rule_requirements(rule))
+
+    def test_function_from_other_file(self) -> None:
+        helpers = GlobalHelperRegistry()
+        helpers.update([{'id': 'test_prefilter_helpers', 'body': 'def rule(event):\n\treturn True'}])
+        try:
+            rule = _rule('prefilter.imported',
+                         'def rule(event):\n\treturn event.get("a") == 1\nfrom test_prefilter_helpers import rule')
+            self.assertEqual(1, rule.module.rule.__code__.co_firstlineno)
+            self.assertEqual([], rule_requirements(rule))
+        finally:
+            helpers.uninstall()
+
+    def test_pending_rule(self) -> None:
+        rule = _rule('prefilter.pending', 'def rule(event):\n\treturn event.get("a") == 1', lazy=True)
+        self.assertEqual([FieldRequirement('a', KIND_VALUES, frozenset([1]))], pending_requirements(rule))
+        self.assertFalse(rule.loaded)
+        rule.prewarm()
+        self.assertEqual([], pending_requirements(rule))
+
+    def test_policy(self) -> None:
+        policy = Policy({'id': 'prefilter.policy', 'versionId': 'v1',
+                         'body': 'def policy(resource):\n\treturn resource.get("a") == 1'})
+        self.assertEqual([], rule_requirements(policy))
+
+
+class TestPrefilterIndex(TestCase):
+    def setUp(self) -> None:
+        self.rules = [
+            _rule('prefilter.create', 'def rule(event):\n\treturn event.get("eventName") == "Create"'),
+            _rule('prefilter.any', 'def rule(event):\n\treturn True'),
+            _rule('prefilter.delete',
+                  'def rule(event):\n\tif event.get("eventName") not in ["Delete", "Remove"]:\n\t\treturn False\n'
+                  '\tif not event.get("user"):\n\t\treturn False\n\treturn True'),
+            _rule('prefilter.subscript', 'def rule(event):\n\treturn event["eventName"] == "Create"'),
+        ]
+        self.index = PrefilterIndex(self.rules)
+
+    def _candidates(self, event: dict) -> list:
+        return [rule.detection_id for rule in self.index.candidates(PantherEvent(event, None))]
+
+    def test_candidates(self) -> None:
+        self.assertEqual(3, self.index.indexed_rules)
+        self.assertEqual(['prefilter.create', 'prefilter.any', 'prefilter.subscript'],
+                         self._candidates({'eventName': 'Create'}))
+        self.assertEqual(['prefilter.any'], self._candidates({'eventName': 'Remove', 'eventname': 'Other'}))
+        self.assertEqual(['prefilter.any', 'prefilter.delete'], self._candidates({'EVENTNAME': 'Remove', 'user': 'a'}))
+
+    def test_missing_field_is_not_hidden(self) -> None:
+        self.assertEqual(['prefilter.any', 'prefilter.subscript'], self._candidates({}))
+
+    def test_unhashable_value(self) -> None:
+        self.assertEqual(['prefilter.create', 'prefilter.any', 'prefilter.subscript'],
+                         self._candidates({'eventName': ['Create']}))
+
+    def test_candidates_match_rule_results(self) -> None:
+        events = [{}, {'eventName': 'Create'}, {'eventName': 'Delete'}, {'eventName': 'Delete', 'user': 'a'},
+                  {'eventName': ['Create']}, {'eventName': None}, {'eventName': 'Other', 'user': 'a'}]
+        for event in events:
+            panther_event = PantherEvent(event, None)
+            candidates = self.index.candidates(panther_event)
+            for rule in self.rules:
+                result = rule.run(panther_event, {}, {})
+                if result.trigger_alert or result.errored:
+                    self.assertIn(rule, candidates, (rule.detection_id, event))
+
+    def test_lazy_rules_are_not_loaded(self) -> None:
+        rules = [
+            _rule('prefilter.lazy', 'def rule(event):\n\treturn event.get("eventName") == "Create"', lazy=True),
+            _rule('prefilter.lazy_any', 'def rule(event):\n\treturn True', lazy=True),
+        ]
+        index = PrefilterIndex(rules)
+        self.assertEqual(1, index.indexed_rules)
+        self.assertFalse(any(rule.loaded for rule in rules))
+        self.assertEqual(['prefilter.lazy_any'],
+                         [rule.detection_id for rule in index.candidates(PantherEvent({'eventName': 'Delete'}, None))])
+        # The rules indexed from their source code are loaded to check their module
+        self.assertTrue(rules[0].loaded)
+
+    def test_lazy_rule_replacing_its_function(self) -> None:
+        rule = _rule('prefilter.lazy_replaced',
+                     'def rule(event):\n\treturn event.get("eventName") == "Create"\nrule = lambda event: True',
+                     lazy=True)
+        index = PrefilterIndex([rule])
+        self.assertEqual(1, index.indexed_rules)
+        self.assertEqual([rule], index.candidates(PantherEvent({'eventName': 'Delete'}, None)))
+        self.assertEqual(0, index.indexed_rules)
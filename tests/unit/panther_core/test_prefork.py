@@ -0,0 +1,87 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gc
+from unittest import TestCase
+
+from panther_core.data_model import DataModel
+from panther_core.exceptions import PantherError
+from panther_core.loader import load_detections
+from panther_core.prefork import PreforkPool
+
+
+_CONFIGS = [
+    {'id': 'rule.match', 'versionId': 'v1', 'body': 'def rule(event):\n\treturn event.udm("name") == "match"'},
+    {'id': 'rule.error', 'versionId': 'v1',
+     'body': 'class LocalError(Exception):\n\tpass\n'
+             'def rule(event):\n\tif event.get("raise"):\n\t\traise LocalError("custom")\n\treturn False'},
+    {'id': 'rule.lazy', 'versionId': 'v1', 'body': 'def rule(event):\n\treturn event.get("id") == 3'},
+]
+
+_DATA_MODEL = DataModel({
+    'id': 'data.model', 'versionId': 'v1', 'mappings': [{'name': 'name', 'path': 'username'}],
+})
+
+
+class TestPreforkPool(TestCase):
+    def setUp(self) -> None:
+        self.detections = load_detections(_CONFIGS, lazy=True)
+        self.events = [
+            {'id': i, 'p_log_type': 'Test.Log', 'username': 'match' if i == 1 else 'other',
+             'raise': i == 2}
+            for i in range(10)
+        ]
+
+    def test_evaluate(self) -> None:
+        with PreforkPool(self.detections, {'Test.Log': _DATA_MODEL}, processes=2, shard_size=3) as pool:
+            self.assertTrue(all(detection.loaded for detection in self.detections))
+            self.assertGreater(gc.get_freeze_count(), 0)
+            results = pool.evaluate(self.events)
+        self.assertEqual(0, gc.get_freeze_count())
+
+        self.assertEqual(len(self.events), len(results))
+        self.assertEqual([['rule.match'], ['rule.error'], ['rule.lazy']],
+                         [[result.detection_id for result in each] for each in results[1:4]])
+        self.assertEqual([], results[0])
+        self.assertEqual([], results[4])
+        self.assertTrue(results[1][0].trigger_alert)
+
+    def test_unpicklable_exception(self) -> None:
+        with PreforkPool(self.detections, {'Test.Log': _DATA_MODEL}, processes=1) as pool:
+            results = pool.evaluate(self.events[2:3])
+        result = results[0][0]
+        self.assertTrue(result.errored)
+        self.assertIsInstance(result.detection_exception, PantherError)
+        self.assertEqual('LocalError: custom', result.error_message)
+
+    def test_evaluate_before_start(self) -> None:
+        with self.assertRaises(RuntimeError):
+            PreforkPool(self.detections).evaluate(self.events)
+
+    def test_single_running_pool(self) -> None:
+        with PreforkPool(self.detections, processes=1):
+            with self.assertRaises(RuntimeError):
+                PreforkPool(self.detections, processes=1).start()
+
+    def test_policies_are_not_loaded(self) -> None:
+        policy, = load_detections([{'id': 'policy.any', 'versionId': 'v1', 'analysisType': 'POLICY',
+                                    'body': 'def policy(resource):\n\treturn False'}], lazy=True)
+        with PreforkPool(self.detections + [policy], processes=1) as pool:
+            self.assertNotIn(policy, pool.detections)
+            self.assertFalse(policy.loaded)
@@ -0,0 +1,95 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from panther_core.data_model import DataModel
+from panther_core.profiler import KIND_DATA_MODEL, KIND_DETECTION, ImportProfiler
+from panther_core.rule import Rule
+
+
+class TestImportProfiler(TestCase):
+
+    def test_records_detection_and_data_model_costs(self) -> None:
+        with ImportProfiler() as profiler:
+            Rule({'id': 'cheap.rule', 'versionId': 'version', 'body': 'def rule(event):\n\treturn True'})
+            Rule({
+                'id': 'heavy.rule',
+                'versionId': 'version',
+                'body': 'import colorsys\nDATA = [str(i) for i in range(10000)]\ndef rule(event):\n\treturn True',
+            })
+            Rule({'id': 'failing.rule', 'versionId': 'version', 'body': 'import unknown_module'})
+            DataModel({
+                'id': 'data.model',
+                'versionId': 'version',
+                'mappings': [{'name': 'source_ip', 'path': 'ip'}],
+            })
+
+        costs = {cost.identifier: cost for cost in profiler.costs}
+        self.assertEqual({'cheap.rule', 'heavy.rule', 'failing.rule', 'data.model'}, set(costs))
+        self.assertEqual(KIND_DETECTION, costs['heavy.rule'].kind)
+        self.assertEqual(KIND_DATA_MODEL, costs['data.model'].kind)
+        self.assertIn('colorsys', costs['heavy.rule'].imported_modules)
+        self.assertGreater(costs['heavy.rule'].allocated_bytes, costs['cheap.rule'].allocated_bytes)
+        self.assertGreaterEqual(costs['heavy.rule'].peak_allocated_bytes, costs['heavy.rule'].allocated_bytes)
+        self.assertIn('unknown_module', costs['failing.rule'].error)
+
+        report = profiler.report(sort_by='allocated_bytes', limit=1)
+        self.assertEqual(['heavy.rule'], [cost.identifier for cost in report])
+
+    def test_inactive_profiler_records_nothing(self) -> None:
+        profiler = ImportProfiler()
+        Rule({'id': 'cheap.rule', 'versionId': 'version', 'body': 'def rule(event):\n\treturn True'})
+        self.assertEqual([], profiler.costs)
+
+    def test_tracemalloc_not_imported_until_profiling(self) -> None:
+        output = subprocess.run(
+            [sys.executable, '-c', 'import sys, panther_core.rule; print("tracemalloc" in sys.modules)'],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual('False', output.strip())
+
+    def test_single_active_profiler(self) -> None:
+        with ImportProfiler():
+            with self.assertRaises(RuntimeError):
+                ImportProfiler().start()
+
+    def test_dump(self) -> None:
+        tmp_dir = tempfile.mkdtemp(prefix=self.__class__.__name__ + '_')
+        try:
+            with ImportProfiler() as profiler:
+                Rule({'id': 'cheap.rule', 'versionId': 'version', 'body': 'def rule(event):\n\treturn True'})
+            path = os.path.join(tmp_dir, 'report.json')
+            profiler.dump(path)
+            with open(path) as report:
+                costs = json.load(report)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual('cheap.rule', costs[0]['identifier'])
+        self.assertEqual(
+            {'kind', 'identifier', 'wall_time_seconds', 'allocated_bytes',
+             'peak_allocated_bytes', 'imported_modules', 'error'},
+            set(costs[0]),
+        )
@@ -0,0 +1,95 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gc
+import weakref
+from typing import Any, Dict
+from unittest import TestCase
+
+from panther_core.enriched_event import PantherEvent
+from panther_core.policy import Policy
+from panther_core.registry import DetectionRegistry, RegistryUpdate
+
+
+def _config(detection_id: str, version: str = 'v1', body: str = 'def rule(event):\n\treturn True',
+            analysis_type: str = 'RULE') -> Dict[str, Any]:
+    return {'id': detection_id, 'versionId': version, 'body': body, 'analysisType': analysis_type}
+
+
+class TestDetectionRegistry(TestCase):
+
+    def test_initial_load(self) -> None:
+        registry = DetectionRegistry()
+        update = registry.update([
+            _config('rule.one'),
+            _config('policy.one', body='def policy(resource):\n\treturn True', analysis_type='POLICY'),
+        ])
+        self.assertEqual(RegistryUpdate(added=['rule.one', 'policy.one']), update)
+        self.assertTrue(update.changed)
+        self.assertEqual(2, len(registry))
+        self.assertIn('rule.one', registry)
+        self.assertIsInstance(registry['policy.one'], Policy)
+        self.assertEqual(['rule.one', 'policy.one'], [d.detection_id for d in registry])
+
+    def test_rebuilds_only_changed_detections(self) -> None:
+        registry = DetectionRegistry()
+        registry.update([_config('unchanged'), _config('new.version'), _config('new.body'), _config('removed')])
+        unchanged = registry['unchanged']
+        superseded_module = weakref.ref(registry['new.body'].module)
+
+        update = registry.update([
+            _config('unchanged'),
+            _config('new.version', version='v2'),
+            _config('new.body', body='def rule(event):\n\treturn False'),
+            _config('added'),
+        ])
+        self.assertEqual(
+            RegistryUpdate(
+                added=['added'],
+                updated=['new.version', 'new.body'],
+                removed=['removed'],
+                unchanged=['unchanged'],
+            ),
+            update,
+        )
+        self.assertIs(unchanged, registry['unchanged'])
+        self.assertIsNone(registry.get('removed'))
+        self.assertFalse(registry['new.body'].run(PantherEvent({}, None), {}, {}).trigger_alert)
+
+        gc.collect()
+        self.assertIsNone(superseded_module())
+
+    def test_no_changes(self) -> None:
+        registry = DetectionRegistry()
+        registry.update([_config('rule.one')])
+        update = registry.update([_config('rule.one')])
+        self.assertFalse(update.changed)
+        self.assertEqual(['rule.one'], update.unchanged)
+
+    def test_failed_update_leaves_registry_untouched(self) -> None:
+        registry = DetectionRegistry()
+        registry.update([_config('rule.one')])
+        with self.assertRaises(AssertionError):
+            registry.update([_config('rule.two'), {'id': 'missing.version', 'body': 'def rule(event): pass'}])
+        self.assertEqual(['rule.one'], [d.detection_id for d in registry])
+
+    def test_lazy_registry(self) -> None:
+        registry = DetectionRegistry(lazy=True)
+        registry.update([_config('rule.one')])
+        self.assertFalse(registry['rule.one'].loaded)
@@ -18,20 +18,26 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import dataclasses
+import gc
 import json
 import inspect
 import os
+import pickle
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional, Any
 from unittest import TestCase
 import tempfile
+import weakref
 from types import ModuleType
 
-from panther_core.detection import DetectionResult, FilesystemImporter, RawStringImporter
-from panther_core.rule import Rule, MAX_DEDUP_STRING_SIZE, \
+from panther_core.detection import DetectionResult, FilesystemImporter, LazyDetectionResult, RawStringImporter, \
+    compact_exception
+from panther_core.rule import Rule, MAX_ALERT_CONTEXT_SIZE, MAX_DEDUP_STRING_SIZE, \
     MAX_GENERATED_FIELD_SIZE, TRUNCATED_STRING_SUFFIX, TYPE_RULE
 from panther_core.enriched_event import PantherEvent
-from panther_core.exceptions import FunctionReturnTypeError, UnknownDestinationError
+from panther_core.exceptions import DetectionTimeoutError, FunctionReturnTypeError, UnknownDestinationError
 
 
 class TestRule(TestCase):  # pylint: disable=too-many-public-methods
@@ -433,7 +439,7 @@ class TestRule(TestCase):  # pylint: disable=too-many-public-methods
         rule_body = 'def rule(event):\n\treturn True\n{}'.format(alert_context_function)
         rule = Rule({'id': 'test_alert_context_too_big', 'body': rule_body, 'versionId': 'versionId', 'severity': 'INFO'})
         expected_alert_context = json.dumps(
-            {'_error': 'alert_context size is [5588890] characters, bigger than maximum of [204800] characters'}
+            {'_error': 'alert_context size is bigger than maximum of [204800] characters'}
         )
         expected_result = DetectionResult(
             detection_id='test_alert_context_too_big',
@@ -447,6 +453,32 @@ class TestRule(TestCase):  # pylint: disable=too-many-public-methods
         )
         self.assertEqual(expected_result, rule.run(PantherEvent({}, None), {}, {}))
 
+    def test_alert_context_too_big_is_not_fully_serialized(self) -> None:
+        # The unserializable value after the limit would raise a TypeError if it was serialized
+        alert_context_function = 'def alert_context(event):\n' \
+                                 '\treturn {"big": "x" * 300000, "after": [object()]}'
+        rule_body = 'def rule(event):\n\treturn True\n{}'.format(alert_context_function)
+        rule = Rule({'id': 'test_alert_context_too_big_is_not_fully_serialized', 'body': rule_body,
+                     'versionId': 'versionId'})
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertEqual(
+            json.dumps({'_error': 'alert_context size is bigger than maximum of [204800] characters'}),
+            result.alert_context_output,
+        )
+
+    def test_alert_context_truncated(self) -> None:
+        alert_context_function = 'def alert_context(event):\n' \
+                                 '\treturn {"user": "alice", "values": list(range(300000))}'
+        rule_body = 'def rule(event):\n\treturn True\n{}'.format(alert_context_function)
+        rule = Rule({'id': 'test_alert_context_truncated', 'body': rule_body, 'versionId': 'versionId'},
+                    truncate_alert_context=True)
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertLessEqual(len(result.alert_context_output), MAX_ALERT_CONTEXT_SIZE)
+        alert_context = json.loads(result.alert_context_output)
+        self.assertEqual('alice', alert_context['user'])
+        self.assertEqual(list(range(len(alert_context['values']))), alert_context['values'])
+        self.assertGreater(len(alert_context['values']), 1000)
+
     def test_alert_context_immutable_event(self) -> None:
         alert_context_function = 'def alert_context(event):\n' \
                                  '\treturn {"headers": event["headers"],\n' \
@@ -682,6 +714,219 @@ class TestRule(TestCase):  # pylint: disable=too-many-public-methods
         self.assertEqual(str(expected_result), str(result))
 
 
+    def test_lazy_rule_loads_on_first_run(self) -> None:
+        rule_body = 'def rule(event):\n\treturn True\ndef title(event):\n\treturn "title"'
+        rule = Rule({'id': 'test_lazy_rule_loads_on_first_run', 'body': rule_body, 'versionId': 'versionId',
+                     'tags': ['tag2', 'tag1'], 'severity': 'INFO'}, lazy=True)
+        self.assertFalse(rule.loaded)
+        self.assertEqual(['tag1', 'tag2'], rule.detection_tags)
+
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertTrue(rule.loaded)
+        self.assertTrue(result.trigger_alert)
+        self.assertEqual('title', result.title_output)
+
+    def test_lazy_rule_prewarm(self) -> None:
+        rule = Rule({'id': 'test_lazy_rule_prewarm', 'body': 'def rule(event):\n\treturn True',
+                     'versionId': 'versionId'}, lazy=True)
+        rule.prewarm()
+        self.assertTrue(rule.loaded)
+        self.assertTrue(hasattr(rule.module, 'rule'))
+
+    def test_lazy_rule_setup_exception(self) -> None:
+        rule = Rule({'id': 'test_lazy_rule_setup_exception', 'body': 'def rule(test):this is invalid python syntax',
+                     'versionId': 'versionId'}, lazy=True)
+        self.assertFalse(rule.loaded)
+        self.assertIsInstance(rule.setup_exception, SyntaxError)
+        self.assertTrue(rule.loaded)
+        rule_result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertEqual(rule_result.error_type, 'SyntaxError')
+
+    def test_lazy_rule_validates_metadata(self) -> None:
+        with self.assertRaises(AssertionError):
+            Rule({'id': 'test_lazy_rule_validates_metadata', 'body': 'def rule(event):\n\treturn True'}, lazy=True)
+
+    def test_replaced_module_functions_are_bound(self) -> None:
+        rule = Rule({'id': 'test_replaced_module_functions_are_bound', 'versionId': 'versionId',
+                     'body': 'def rule(event):\n\treturn True\ndef title(event):\n\treturn "original"'})
+        self.assertEqual('original', rule.run(PantherEvent({}, None), {}, {}).title_output)
+
+        mocked_module = ModuleType('mocked')
+        setattr(mocked_module, 'rule', lambda event: True)
+        setattr(mocked_module, 'title', lambda event: 'mocked')
+        rule.module = mocked_module
+        self.assertEqual('mocked', rule.run(PantherEvent({}, None), {}, {}).title_output)
+
+        rule._module = ModuleType('other')  # pylint: disable=protected-access
+        rule._module.rule = lambda event: 'not a bool'  # type: ignore # pylint: disable=protected-access
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertIsInstance(result.detection_exception, FunctionReturnTypeError)
+        self.assertFalse(result.title_defined)
+
+    def test_lazy_auxiliary_functions(self) -> None:
+        rule_body = ('CALLS = []\n'
+                     'def rule(event):\n\treturn True\n'
+                     'def title(event):\n\tCALLS.append("title")\n\treturn "title"\n'
+                     'def severity(event):\n\tCALLS.append("severity")\n\treturn "high"\n'
+                     'def alert_context(event):\n\tCALLS.append("alert_context")\n\treturn {"a": 1}')
+        rule = Rule({'id': 'test_lazy_auxiliary_functions', 'body': rule_body, 'versionId': 'versionId'})
+        result = rule.run(PantherEvent({}, None), {}, {}, lazy_auxiliary=True)
+        self.assertIsInstance(result, LazyDetectionResult)
+        self.assertTrue(result.trigger_alert)
+        self.assertEqual([], rule.module.CALLS)
+
+        # dedup falls back to the title
+        self.assertEqual('title', result.dedup_output)
+        self.assertEqual(['title'], rule.module.CALLS)
+        self.assertEqual('title', result.title_output)
+        self.assertEqual(['title'], rule.module.CALLS)
+
+        self.assertDataclassEqual(result, rule.run(PantherEvent({}, None), {}, {}))
+        # each function ran once for each result
+        self.assertEqual(['alert_context', 'alert_context', 'severity', 'severity', 'title', 'title'],
+                         sorted(rule.module.CALLS))
+        self.assertEqual(set(), result.pending_functions)
+
+    def test_lazy_auxiliary_functions_exceptions(self) -> None:
+        rule_body = 'def rule(event):\n\treturn True\ndef title(event):\n\treturn 1\ndef runbook(event):\n\treturn 1/0'
+        rule = Rule({'id': 'test_lazy_auxiliary_functions_exceptions', 'body': rule_body, 'versionId': 'versionId'})
+        result = rule.run(PantherEvent({}, None), {}, {}, batch_mode=False, lazy_auxiliary=True)
+        self.assertIsInstance(result.title_exception, FunctionReturnTypeError)
+        self.assertIsNone(result.title_output)
+        self.assertTrue(result.errored)
+        self.assertIsInstance(result.runbook_exception, ZeroDivisionError)
+
+        result = rule.run(PantherEvent({}, None), {}, {}, batch_mode=False, lazy_auxiliary=True).resolve()
+        self.assertDataclassEqual(result, rule.run(PantherEvent({}, None), {}, {}, batch_mode=False),
+                                  fields_as_string=('title_exception', 'runbook_exception'))
+
+    def test_lazy_auxiliary_functions_not_alerting(self) -> None:
+        rule = Rule({'id': 'test_lazy_auxiliary_functions_not_alerting', 'versionId': 'versionId',
+                     'body': 'def rule(event):\n\treturn False\ndef title(event):\n\treturn "title"'})
+        result = rule.run(PantherEvent({}, None), {}, {}, lazy_auxiliary=True)
+        self.assertFalse(result.trigger_alert)
+        self.assertIsNone(result.title_output)
+        self.assertFalse(result.title_defined)
+
+    def test_timeout(self) -> None:
+        rule_body = 'def rule(event):\n\twhile event.get("loop"):\n\t\tpass\n\treturn True\n' \
+                    'def title(event):\n\twhile True:\n\t\tpass'
+        rule = Rule({'id': 'test_timeout', 'body': rule_body, 'versionId': 'versionId'}, timeout=0.05)
+
+        result = rule.run(PantherEvent({'loop': True}, None), {}, {})
+        self.assertIsInstance(result.detection_exception, DetectionTimeoutError)
+        self.assertEqual('DetectionTimeoutError', result.error_type)
+        self.assertIn('function [rule]', str(result.detection_exception))
+
+        result = rule.run(PantherEvent({}, None), {}, {}, batch_mode=False)
+        self.assertTrue(result.trigger_alert)
+        self.assertIsInstance(result.title_exception, DetectionTimeoutError)
+
+        rule.timeout = 1
+        result = rule.run(PantherEvent({}, None), {}, {}, batch_mode=False)
+        self.assertIn('after [1] seconds', str(result.title_exception))
+
+    def test_timeout_not_exceeded(self) -> None:
+        rule = Rule({'id': 'test_timeout_not_exceeded', 'body': 'def rule(event):\n\treturn True',
+                     'versionId': 'versionId'}, timeout=0.05)
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertFalse(result.errored)
+        self.assertTrue(result.trigger_alert)
+        self.assertTrue(result.detection_output)
+        # the timer is disarmed once the function returns
+        time.sleep(0.1)
+        result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertFalse(result.errored)
+        self.assertTrue(result.trigger_alert)
+
+    def test_timeout_in_thread(self) -> None:
+        rule = Rule({'id': 'test_timeout_in_thread', 'versionId': 'versionId',
+                     'body': 'def rule(event):\n\twhile event.get("loop"):\n\t\tpass\n\treturn True'},
+                    timeout=0.05)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda event: rule.run(PantherEvent(event, None), {}, {}),
+                                        [{'loop': True}, {}, {'loop': True}]))
+        self.assertEqual(['DetectionTimeoutError', None, 'DetectionTimeoutError'],
+                         [result.error_type for result in results])
+        self.assertIn('function [rule]', str(results[0].detection_exception))
+        self.assertTrue(results[1].trigger_alert)
+
+    def test_run_batch(self) -> None:
+        rule_body = 'def rule(event):\n\treturn 1 / event.get("value") > 1\ndef title(event):\n\treturn "title"'
+        rule = Rule({'id': 'test_run_batch', 'body': rule_body, 'versionId': 'versionId', 'severity': 'INFO'})
+        events = [PantherEvent({'value': value}, None) for value in (0.1, 1, 0, 2, 0.5)]
+
+        batch_result = rule.run_batch(events, {}, {})
+        self.assertEqual(5, batch_result.events_evaluated)
+        self.assertEqual([0, 2, 4], list(batch_result.results))
+        self.assertEqual([0, 4], list(batch_result.alerts))
+        self.assertEqual([2], list(batch_result.errors))
+        for index, result in batch_result.results.items():
+            self.assertDataclassEqual(rule.run(events[index], {}, {}), result,
+                                      fields_as_string=('detection_exception',))
+        self.assertEqual('title', batch_result.alerts[0].title_output)
+        self.assertEqual('title', batch_result.alerts[0].dedup_output)
+
+    def test_run_batch_setup_exception(self) -> None:
+        rule = Rule({'id': 'test_run_batch_setup_exception', 'body': 'def rule(test):this is invalid python syntax',
+                     'versionId': 'versionId'}, lazy=True)
+        batch_result = rule.run_batch([PantherEvent({}, None)], {}, {})
+        self.assertIsInstance(batch_result.setup_exception, SyntaxError)
+        self.assertEqual(0, batch_result.events_evaluated)
+        self.assertEqual({}, batch_result.results)
+
+    def test_run_batch_group_duplicates(self) -> None:
+        rule_body = ('def rule(event):\n\treturn event.get("user") is not None\n'
+                     'def title(event):\n\treturn event.get("user")\n'
+                     'def alert_context(event):\n\treturn {"index": event.get("index")}')
+        rule = Rule({'id': 'test_run_batch_group_duplicates', 'body': rule_body, 'versionId': 'versionId'})
+        users = ['alice', 'bob', 'alice', None, 'alice', 'alice']
+        events = [PantherEvent({'user': user, 'index': index}, None) for index, user in enumerate(users)]
+
+        batch_result = rule.run_batch(events, {}, {}, group_duplicates=True, max_samples=2)
+        self.assertEqual(6, batch_result.events_evaluated)
+        self.assertEqual([0, 1], list(batch_result.results))
+        self.assertEqual(['alice', 'bob'], list(batch_result.groups))
+        group = batch_result.groups['alice']
+        self.assertIs(batch_result.results[0], group.result)
+        self.assertEqual(4, group.count)
+        self.assertEqual((0, 5), (group.first_index, group.last_index))
+        self.assertIs(events[0], group.first_event)
+        self.assertIs(events[5], group.last_event)
+        self.assertEqual([events[0], events[2]], group.samples)
+        self.assertEqual('{"index": 0}', group.result.alert_context_output)
+        self.assertEqual(1, batch_result.groups['bob'].count)
+
+    def test_run_batch_skip_duplicate_auxiliary(self) -> None:
+        rule_body = ('CALLS = []\n'
+                     'def rule(event):\n\treturn True\n'
+                     'def dedup(event):\n\treturn event.get("user")\n'
+                     'def title(event):\n\tCALLS.append("title")\n\treturn "title"\n'
+                     'def alert_context(event):\n\tCALLS.append("alert_context")\n\treturn {}')
+        rule = Rule({'id': 'test_run_batch_skip_duplicate_auxiliary', 'body': rule_body, 'versionId': 'versionId'})
+        events = [PantherEvent({'user': user}, None) for user in ('alice', 'alice', 'bob', 'alice')]
+
+        batch_result = rule.run_batch(events, {}, {}, group_duplicates=True, skip_duplicate_auxiliary=True)
+        self.assertEqual([0, 2], list(batch_result.results))
+        self.assertEqual(3, batch_result.groups['alice'].count)
+        self.assertEqual(['title', 'alert_context'] * 2, rule.module.CALLS)
+        self.assertEqual('title', batch_result.results[2].title_output)
+        self.assertEqual('bob', batch_result.results[2].dedup_output)
+
+    def test_run_batch_skip_duplicate_auxiliary_title_dedup(self) -> None:
+        rule_body = ('CALLS = []\n'
+                     'def rule(event):\n\treturn True\n'
+                     'def title(event):\n\treturn event.get("user")\n'
+                     'def description(event):\n\tCALLS.append("description")\n\treturn "description"')
+        rule = Rule({'id': 'test_run_batch_skip_duplicate_auxiliary_title_dedup', 'body': rule_body,
+                     'versionId': 'versionId'})
+        events = [PantherEvent({'user': user}, None) for user in ('alice', 'alice', 'bob')]
+
+        batch_result = rule.run_batch(events, {}, {}, group_duplicates=True, skip_duplicate_auxiliary=True)
+        self.assertEqual(['alice', 'bob'], list(batch_result.groups))
+        self.assertEqual(['description'] * 2, rule.module.CALLS)
+
+
 class TestDetectionResult(TestCase):
 
     def test_fatal_error(self) -> None:
@@ -701,6 +946,16 @@ class TestDetectionResult(TestCase):
             result = DetectionResult(**params)  # type: ignore
             self.assertIs(result.fatal_error, exc)
 
+    def test_slots(self) -> None:
+        result = DetectionResult(detection_id='rule.id', detection_severity='INFO', detection_type=TYPE_RULE,
+                                 trigger_alert=True, title_output='title')
+        self.assertFalse(hasattr(result, '__dict__'))
+        with self.assertRaises(AttributeError):
+            result.unknown_field = True  # type: ignore  # pylint: disable=assigning-non-slot
+        self.assertEqual(result, pickle.loads(pickle.dumps(result)))
+        self.assertEqual(result, dataclasses.replace(result))
+        self.assertEqual('title', dataclasses.asdict(result)['title_output'])
+
     def test_error_type(self) -> None:
         result = DetectionResult(detection_id='failed.rule', detection_severity='INFO', detection_type=TYPE_RULE, trigger_alert=False)
         self.assertIsNone(result.error_type)
@@ -738,6 +993,46 @@ class TestDetectionResult(TestCase):
         result = DetectionResult(detection_id='failed.rule', detection_severity='INFO', detection_type=TYPE_RULE, trigger_alert=False)
         self.assertIsNone(result.error_message)
 
+    def test_error_message_releases_traceback(self) -> None:
+        rule_body = 'def rule(event):\n\tvalue = event["value"]\n\treturn 1 / value'
+        rule = Rule({'id': 'test_error_message_releases_traceback', 'body': rule_body, 'versionId': 'versionId'})
+        event = PantherEvent({'value': 0}, None)
+        event_ref = weakref.ref(event)
+
+        result = rule.run(event, {}, {})
+        del event
+        gc.collect()
+        self.assertIsNone(result.detection_exception.__traceback__)  # type: ignore
+        self.assertIsNone(event_ref())
+        self.assertEqual(
+            'division by zero: test_error_message_releases_traceback.py, line 3, in rule    return 1 / value',
+            result.error_message,
+        )
+        self.assertIs(result.error_message, result.error_message)
+
+    def test_error_message_pickled(self) -> None:
+        rule_body = 'def rule(event):\n\treturn 1 / 0'
+        rule = Rule({'id': 'test_error_message_pickled', 'body': rule_body, 'versionId': 'versionId'})
+        result = pickle.loads(pickle.dumps(rule.run(PantherEvent({}, None), {}, {})))
+        self.assertEqual('division by zero: test_error_message_pickled.py, line 2, in rule    return 1 / 0',
+                         result.error_message)
+
+    def test_compact_exception_chain(self) -> None:
+        try:
+            try:
+                raise KeyError('inner')
+            except KeyError as inner:
+                raise ValueError('outer') from inner
+        except ValueError as exception:
+            exc = exception
+
+        self.assertIs(exc, compact_exception(exc))
+        self.assertIsNone(exc.__traceback__)
+        self.assertIsNone(exc.__cause__.__traceback__)  # type: ignore
+        result = DetectionResult(detection_exception=exc, detection_id='failed.rule', detection_severity='INFO',
+                                 detection_type=TYPE_RULE, trigger_alert=False)
+        self.assertRegex(result.error_message, r"outer: test_rule.py, line [0-9]+, in test_compact_exception_chain")  # type: ignore
+
     def test_errored(self) -> None:
         result = DetectionResult(detection_id='failed.rule', detection_severity='INFO', detection_type=TYPE_RULE, detection_exception=TypeError(), trigger_alert=False)
         self.assertTrue(result.errored)
@@ -828,6 +1123,23 @@ class TestRawStringImporter(TestCase):
         with self.assertRaisesRegex(ModuleNotFoundError, "No module named 'unknown_module'"):
             _ = RawStringImporter(self.tmp_dir).get_module("identifier1", code)
 
+    def test_load_module_without_writing_to_disk(self) -> None:
+        code = 'def rule(event):\n\treturn True'
+        module = RawStringImporter(self.tmp_dir).get_module("identifier2", code)
+        self.assertEqual(module.__file__, os.path.join(self.tmp_dir, 'identifier2.py'))
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+        self.assertEqual(inspect.getsource(module), code)
+
+    def test_error_message_references_module_file(self) -> None:
+        rule_body = 'def rule(event):\n\tvalue = 1\n\treturn value / 0'
+        rule = Rule({'id': 'test_error_message_references_module_file', 'body': rule_body, 'versionId': 'versionId'})
+        rule_result = rule.run(PantherEvent({}, None), {}, {})
+        self.assertRegex(  # type: ignore
+            rule_result.error_message,
+            r"^division by zero: test_error_message_references_module_file.py, line 3, "
+            r"in rule\s+return value / 0"
+        )
+
 
 class TestFilesystemImporter(TestCase):
     def setUp(self) -> None:
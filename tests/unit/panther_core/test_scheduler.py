@@ -0,0 +1,163 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from typing import Any, Dict
+from unittest import TestCase
+
+from panther_core.engine import DetectionEngine
+from panther_core.loader import load_detections
+from panther_core.scheduler import DetectionScheduler, severity_rank
+
+
+def _config(detection_id: str, severity: str, body: str) -> Dict[str, Any]:
+    return {
+        'id': detection_id,
+        'versionId': 'v1',
+        'analysisType': 'RULE',
+        'body': body,
+        'severity': severity,
+        'LogTypes': ['AWS.CloudTrail'],
+    }
+
+
+_CONFIGS = [
+    _config('rule.info', 'INFO', 'def rule(event):\n\treturn True'),
+    _config('rule.critical', 'CRITICAL', 'def rule(event):\n\treturn False'),
+    _config('rule.low', 'LOW', 'def rule(event):\n\treturn False'),
+    _config('rule.high', 'HIGH', 'def rule(event):\n\treturn True'),
+]
+
+_EVENTS = [{'p_log_type': 'AWS.CloudTrail', 'index': index} for index in range(3)]
+
+
+class TestDetectionScheduler(TestCase):  # pylint: disable=too-many-public-methods
+
+    def setUp(self) -> None:
+        self.detections = load_detections(_CONFIGS)
+        self.engine = DetectionEngine(self.detections)
+
+    def test_severity_rank(self) -> None:
+        ranks = {detection.detection_id: severity_rank(detection) for detection in self.detections}
+        self.assertEqual({'rule.info': 0, 'rule.low': 1, 'rule.high': 3, 'rule.critical': 4}, ranks)
+
+    def test_orders_by_severity(self) -> None:
+        scheduler = DetectionScheduler(self.engine)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertEqual(3, len(batch.results))
+        self.assertFalse(batch.overloaded)
+        for results in batch.results:
+            self.assertEqual(
+                ['rule.critical', 'rule.high', 'rule.low', 'rule.info'],
+                [result.detection_id for result in results],
+            )
+
+    def test_orders_by_match_rate_within_severity(self) -> None:
+        configs = [
+            _config('rule.quiet', 'LOW', 'def rule(event):\n\treturn False'),
+            _config('rule.noisy', 'LOW', 'def rule(event):\n\treturn True'),
+        ]
+        scheduler = DetectionScheduler(DetectionEngine(load_detections(configs)), reorder_interval=1)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertEqual(['rule.quiet', 'rule.noisy'], [result.detection_id for result in batch.results[0]])
+        self.assertEqual(['rule.noisy', 'rule.quiet'], [result.detection_id for result in batch.results[-1]])
+
+    def test_tracks_costs(self) -> None:
+        scheduler = DetectionScheduler(self.engine)
+        scheduler.evaluate_batch(_EVENTS, {}, {})
+        latency, match_rate = scheduler.estimated_cost('rule.info')
+        self.assertGreater(latency, 0)
+        self.assertEqual(1.0, match_rate)
+        self.assertEqual(0.0, scheduler.estimated_cost('rule.low')[1])
+        self.assertEqual((0.0, 0.0), scheduler.estimated_cost('rule.unknown'))
+
+    def test_sheds_low_severity_rules_when_overloaded(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=0, shed_min_seconds=0)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertTrue(batch.overloaded)
+        # Nothing is deferred before the rules are observed
+        self.assertEqual(4, len(batch.results[0]))
+        for results in batch.results[1:]:
+            self.assertEqual(['rule.critical', 'rule.high'], [result.detection_id for result in results])
+        self.assertEqual(
+            [(index, detection_id) for index in (1, 2) for detection_id in ('rule.low', 'rule.info')],
+            [(deferred.event_index, deferred.detection_id) for deferred in batch.deferred],
+        )
+        self.assertEqual('INFO', batch.deferred[1].detection_severity)
+
+    def test_never_sheds_unobserved_rules(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=0, shed_min_seconds=0)
+        batch = scheduler.evaluate_batch(_EVENTS[:1], {}, {})
+        self.assertFalse(batch.overloaded)
+        self.assertEqual(4, len(batch.results[0]))
+
+    def test_sheds_info_before_low(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=0, shed_min_seconds=0, shed_step_seconds=3600)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertEqual(
+            [(1, 'rule.info'), (2, 'rule.info')],
+            [(deferred.event_index, deferred.detection_id) for deferred in batch.deferred],
+        )
+        self.assertEqual(['rule.critical', 'rule.high', 'rule.low'], [result.detection_id for result in batch.results[2]])
+
+    def test_sheds_only_expensive_rules(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=0, shed_min_seconds=3600)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertFalse(batch.overloaded)
+        self.assertEqual([4, 4, 4], [len(results) for results in batch.results])
+
+    def test_sheds_rules_above_latency_percentile(self) -> None:
+        configs = _CONFIGS + [_config('rule.slow', 'LOW', 'def rule(event):\n\treturn sum(range(200000)) < 0')]
+        scheduler = DetectionScheduler(
+            DetectionEngine(load_detections(configs)), slo_seconds=0, shed_percentile=0.8
+        )
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertEqual({'rule.slow'}, {deferred.detection_id for deferred in batch.deferred})
+        self.assertEqual([5, 4, 4], [len(results) for results in batch.results])
+
+    def test_custom_shed_severities(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=0, shed_severities=['high'], shed_min_seconds=0)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertEqual({'rule.high'}, {deferred.detection_id for deferred in batch.deferred})
+
+    def test_orders_prefiltered_rules(self) -> None:
+        configs = _CONFIGS + [
+            _config('rule.medium', 'MEDIUM', 'def rule(event):\n\treturn event.get("index") == 1'),
+        ]
+        scheduler = DetectionScheduler(DetectionEngine(load_detections(configs)))
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertEqual(
+            ['rule.critical', 'rule.high', 'rule.medium', 'rule.low', 'rule.info'],
+            [result.detection_id for result in batch.results[1]],
+        )
+        self.assertEqual(
+            ['rule.critical', 'rule.high', 'rule.low', 'rule.info'],
+            [result.detection_id for result in batch.results[2]],
+        )
+
+    def test_within_slo(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=3600)
+        batch = scheduler.evaluate_batch(_EVENTS, {}, {})
+        self.assertFalse(batch.overloaded)
+        self.assertGreater(batch.elapsed_seconds, 0)
+
+    def test_unrouted_events(self) -> None:
+        scheduler = DetectionScheduler(self.engine, slo_seconds=0)
+        batch = scheduler.evaluate_batch([{'p_log_type': 'Okta.SystemLog'}], {}, {})
+        self.assertEqual([[]], batch.results)
+        self.assertEqual([], batch.deferred)
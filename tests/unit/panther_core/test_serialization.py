@@ -0,0 +1,103 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+from unittest import TestCase
+
+from panther_core.enriched_event import PantherEvent
+from panther_core.exceptions import SizeLimitExceededError
+from panther_core.immutable import ImmutableCaseInsensitiveDict, ImmutableList, json_encoder
+from panther_core.serialization import TRUNCATED_STRING_SUFFIX, BoundedJSONEncoder, dumps_bounded
+
+
+class TestBoundedJSONEncoder(TestCase):
+
+    def test_same_output_as_json(self) -> None:
+        values = [
+            {'string': 'é\n"quoted"', 'int': 1, 'float': 2.5, 'list': [None, True, False], 'tuple': (1, 2)},
+            {1: 'int', 2.5: 'float', None: 'none', True: 'bool'},
+            [float('inf'), -float('inf'), float('nan')],
+            [], {}, 'string', 3, None,
+        ]
+        for value in values:
+            self.assertEqual(json.dumps(value), dumps_bounded(value, 1000))
+
+    def test_immutable_containers(self) -> None:
+        value = {
+            'event': PantherEvent({'Headers': {'User-Agent': 'Chrome'}, 'args': [{'a': '1'}]}, None),
+            'list': ImmutableList([1, [2]]),
+            'dict': ImmutableCaseInsensitiveDict({'a': 'b'}),
+        }
+        self.assertEqual(json.dumps(value, default=json_encoder), dumps_bounded(value, 1000))
+
+    def test_default(self) -> None:
+        self.assertEqual('{"set": [1]}', dumps_bounded({'set': {1}}, 1000, default=list))
+        with self.assertRaises(TypeError):
+            dumps_bounded({'set': {1}}, 1000)
+
+    def test_invalid_key(self) -> None:
+        with self.assertRaises(TypeError):
+            dumps_bounded({(1, 2): 'tuple'}, 1000)
+
+    def test_circular_reference(self) -> None:
+        value: list = []
+        value.append(value)
+        with self.assertRaises(ValueError):
+            dumps_bounded(value, 1000)
+
+    def test_size_limit(self) -> None:
+        value = {'a': 'x' * 10}
+        self.assertEqual(json.dumps(value), dumps_bounded(value, len(json.dumps(value))))
+        with self.assertRaises(SizeLimitExceededError):
+            dumps_bounded(value, len(json.dumps(value)) - 1)
+
+    def test_stops_at_size_limit(self) -> None:
+        def generate():  # type: ignore
+            for index in range(1000):
+                yielded.append(index)
+                yield index
+
+        yielded: list = []
+        with self.assertRaises(SizeLimitExceededError):
+            dumps_bounded([1, ['x' * 100], object()], 50, default=lambda _: list(generate()))
+        self.assertEqual([], yielded)
+
+    def test_truncate_list(self) -> None:
+        encoder = BoundedJSONEncoder(30, truncate=True)
+        self.assertEqual('{"a": [0, 1, 2, 3, 4, 5, 6]}', encoder.encode({'a': list(range(100)), 'b': 1}))
+        self.assertTrue(encoder.truncated)
+
+    def test_truncate_string(self) -> None:
+        encoder = BoundedJSONEncoder(40, truncate=True)
+        output = encoder.encode({'a': 'x' * 100})
+        self.assertEqual(40, len(output))
+        self.assertEqual({'a': 'x' * 16 + TRUNCATED_STRING_SUFFIX}, json.loads(output))
+        self.assertTrue(encoder.truncated)
+
+    def test_truncate_limits(self) -> None:
+        encoder = BoundedJSONEncoder(1000, truncate=True, max_items=2, max_string_length=3)
+        self.assertEqual(
+            {'a': [0, 1], 'b': 'abc' + TRUNCATED_STRING_SUFFIX},
+            json.loads(encoder.encode({'a': list(range(100)), 'b': 'abcdef', 'c': 1})),
+        )
+
+    def test_not_truncated(self) -> None:
+        encoder = BoundedJSONEncoder(1000, truncate=True)
+        self.assertEqual('{"a": [1]}', encoder.encode({'a': [1]}))
+        self.assertFalse(encoder.truncated)
@@ -0,0 +1,90 @@
+"""
+Panther Core is a command line interface for writing,
+testing, and packaging policies/rules.
+Copyright (C) 2020 Panther Labs Inc
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest import TestCase
+
+from panther_core.exceptions import DetectionTimeoutError
+from panther_core.timeout import call_with_timeout
+
+
+def _sleep_then_compute(seconds: float) -> Any:
+    # time.sleep isn't interrupted by the watchdog, its exception is raised once sleep returns
+    try:
+        outcome = call_with_timeout(time.sleep, seconds, 0.02, 'sleep')
+    except DetectionTimeoutError as err:
+        outcome = str(err)
+    # Nothing is left pending once call_with_timeout returned
+    return outcome, sum(range(1000))
+
+
+class TestCallWithTimeout(TestCase):
+
+    def test_returns_result(self) -> None:
+        self.assertEqual(2, call_with_timeout(lambda value: value * 2, 1, 0.05, 'double'))
+        # the timer is disarmed once the function returns
+        time.sleep(0.1)
+        self.assertEqual(4, call_with_timeout(lambda value: value * 2, 2, 0.05, 'double'))
+
+    def test_timeout(self) -> None:
+        def loop(_: Any) -> None:
+            while True:
+                pass
+
+        with self.assertRaises(DetectionTimeoutError):
+            call_with_timeout(loop, None, 0.02, 'loop')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with self.assertRaises(DetectionTimeoutError):
+                executor.submit(call_with_timeout, loop, None, 0.02, 'loop').result()
+
+    def test_timeout_raised_after_c_call_in_thread(self) -> None:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for _ in range(5):
+                outcome, total = executor.submit(_sleep_then_compute, 0.05).result()
+                self.assertEqual(sum(range(1000)), total)
+                self.assertIn(outcome, (None, 'function exceeded its time budget: sleep'))
+
+    def test_host_alarm_is_restored(self) -> None:
+        alarms = []
+        previous_handler = signal.signal(signal.SIGALRM, lambda signum, frame: alarms.append(signum))
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 10)
+            self.assertEqual(2, call_with_timeout(lambda value: value * 2, 1, 0.05, 'double'))
+            delay, _ = signal.getitimer(signal.ITIMER_REAL)
+            self.assertTrue(0 < delay < 10)
+            # a host timer expiring during the call fires once the call returns
+            signal.setitimer(signal.ITIMER_REAL, 0.01)
+            call_with_timeout(time.sleep, 0.05, 1, 'sleep')
+            time.sleep(0.05)
+            self.assertEqual([signal.SIGALRM], alarms)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+    def test_ctypes_not_imported_until_used(self) -> None:
+        output = subprocess.run(
+            [sys.executable, '-c', 'import sys, panther_core.rule; print("ctypes" in sys.modules)'],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual('False', output.strip())